@@ -1,6 +1,10 @@
 import argparse
+import json
+import time
 from pathlib import Path
 
+import numpy as np
+
 from estimate import Estimator
 from normalize import base_content, normalize_readcount
 from filter import (
@@ -9,8 +13,11 @@ from filter import (
     filter_base,
     filter_import,
 )
-from plot import Plotter
-from segment import cbs
+from instrument import TRACE_FORMATS, Tracer
+from plot import plot_sample
+from scheduler import Ref, TaskGraph
+from segment import cbs, segment_statistics
+from mosaic import estimate_mosaicism
 from smooth import mean_smooth, median_smooth, bilateral_smooth
 
 CHROMOSOME_LENGTHS_GRCh37 = {
@@ -23,11 +30,21 @@ CHROMOSOME_LENGTHS_GRCh37 = {
 }
 
 class CNV:
-    def __init__(self, work_directory, bin_size = 400000, filter_ratio = 0.8, smooth: int = 1):
+    def __init__(self, work_directory, bin_size = 400000, filter_ratio = 0.8, smooth: int = 1, bootstrap: int = 0, mosaic_calibration = None, plot_dpi: int = 150, plot_format = 'png', plot_workers: int = 1, plot = True, workers: int = 1, trace_file = None, trace_format = 'jsonl', reference_only = False):
         self.work_directory = Path(work_directory)
         self.bin_size = bin_size
         self.filter_ratio = filter_ratio
         self.smooth = int(smooth) if smooth is not None else 1
+        self.bootstrap = int(bootstrap) if bootstrap is not None else 0
+        self.mosaic_calibration = mosaic_calibration
+        self.plot_dpi = plot_dpi
+        self.plot_format = plot_format
+        self.plot_workers = max(1, int(plot_workers)) if plot_workers is not None else 1
+        self.plot = plot
+        self.workers = max(1, int(workers)) if workers is not None else 1
+        self.trace_file = trace_file
+        self.trace_format = trace_format
+        self.reference_only = reference_only
 
         self.create_directories()
 
@@ -52,102 +69,108 @@ class CNV:
         for directory in directory_list:
             directory.mkdir(parents = True, exist_ok = True)
 
-    def run_pipeline(self):
-
-        print("=== START CNV DETECTION PIPELINE ===")
-
-        # Precompute base content caches and base filter
-        print("\n0. Precompute base content and filters...")
+    def prepare(self):
+        """Precompute base content caches and combined filter; returns (gc_file, combined_filter_file)."""
         gc_file, n_file = base_content(self, self.work_directory / "Input" / "hg19.fa")
-        base_filter_file = filter_base(gc_file, n_file)
-        _ = filter_import(self.work_directory / "Input" / "consensusBlacklist.bed", self)
+        filter_base(gc_file, n_file)
+        filter_import(self.work_directory / "Input" / "consensusBlacklist.bed", self)
         combined_filter_file = combine_filters(self.work_directory / "Prepare")
-
-        print("\n1. Count reads train samples...")
-        train_bam_list = list((self.work_directory / "Input" / "Train").glob('*.bam'))
-        train_raw_list = []
+        return gc_file, combined_filter_file
+
+    def segment_sample(self, log2_ratio_file, proportion_file, reference_noise):
+        """CBS segmentation of one sample followed by segment statistics and mosaicism."""
+        output_dir = self.work_directory / "Output"
+        segments_file = cbs(log2_ratio_file, output_dir, self.bin_size, self.chromosome_list)
+        gender = str(np.load(proportion_file, allow_pickle=True)['gender'])
+        segments_file = segment_statistics(log2_ratio_file, segments_file, self.bin_size, self.chromosome_list, reference_noise, self.bootstrap, gender=gender)
+        return estimate_mosaicism(log2_ratio_file, segments_file, self.bin_size, self.chromosome_list, reference_noise, gender, self.mosaic_calibration)
+
+    def build_graph(self):
+        """
+        Task graph of the pipeline: prepare -> count -> normalize -> frequency -> blacklist ->
+        proportion -> reference -> ratio -> recalculate -> smooth -> segment -> plot.
+        Only blacklist and reference wait for all train samples; each test sample is independent.
+        """
+        train_dir = self.work_directory / "Temporary" / "Train"
+        test_dir = self.work_directory / "Temporary" / "Test"
+        output_dir = self.work_directory / "Output"
+
+        train_bam_list = sorted((self.work_directory / "Input" / "Train").glob('*.bam'))
+        # Reference-only runs build the shared train artifacts (filters, blacklist, reference) and stop
+        test_bam_list = [] if self.reference_only else sorted((self.work_directory / "Input" / "Test").glob('*.bam'))
+
+        graph = TaskGraph()
+        prepare = graph.add("prepare", self.prepare, stage = 0)
+        gc_file, combined_filter_file = Ref("prepare", 0), Ref("prepare", 1)
+
+        train_normalized, frequency_keys = [], []
         for bam_file in train_bam_list:
-            raw_file = self.estimator.count_read(str(bam_file), self.work_directory / "Temporary" / "Train")
-            train_raw_list.append(raw_file)
+            name = f"train:{bam_file.stem}"
+            raw_file = graph.add(f"count:{name}", self.estimator.count_read, str(bam_file), train_dir, stage = 1)
+            normalized_file = graph.add(f"normalize:{name}", normalize_readcount, gc_file, raw_file, train_dir, combined_filter_file, stage = 2)
+            graph.add(f"frequency:{name}", self.estimator.calculate_frequency, normalized_file, train_dir, stage = 3)
+            train_normalized.append((name, normalized_file))
+            frequency_keys.append(f"frequency:{name}")
+
+        blacklist = graph.add("blacklist", create_blacklist, train_dir, combined_filter_file, after = frequency_keys, stage = 4)
+
+        proportion_keys = []
+        for name, normalized_file in train_normalized:
+            graph.add(f"proportion:{name}", self.estimator.calculate_proportion, normalized_file, train_dir, blacklist, stage = 5)
+            proportion_keys.append(f"proportion:{name}")
+
+        reference = graph.add("reference", self.estimator.create_reference, train_dir, self.work_directory / "Temporary", after = proportion_keys, stage = 6)
+        reference_noise = graph.add("reference_noise", self.estimator.create_reference_noise, train_dir, reference, self.work_directory / "Temporary", stage = 7)
 
-        print("\n2. Count reads for test samples...")
-        test_bam_list = list((self.work_directory / "Input" / "Test").glob('*.bam'))
-        test_raw_list = []
         for bam_file in test_bam_list:
-            raw_file = self.estimator.count_read(str(bam_file), self.work_directory / "Temporary" / "Test")
-            test_raw_list.append(raw_file)
-
-        print("\n3. Normalized and calculate frequency for train samples...")
-        train_normalized_list = []
-        for raw_file in train_raw_list:
-            normalized_file = normalize_readcount(gc_file, raw_file, self.work_directory / "Temporary" / "Train", combined_filter_file)
-            train_normalized_list.append(normalized_file)
-            control_frequency_file = self.estimator.calculate_frequency(normalized_file, self.work_directory / "Temporary" / "Train")
-
-        print("\n4. Create blacklist...")
-        blacklist = create_blacklist(self.work_directory / "Temporary" / "Train", combined_filter_file)
-
-        print("\n5. Calculate proportion for train samples...")
-        for normalized_file in train_normalized_list:
-            control_proportion_file = self.estimator.calculate_proportion(
-                normalized_file,
-                self.work_directory / "Temporary" / "Train",
-                blacklist,
-            )
-
-        print("\n6. Normalize test and calculate proportion for samples...")
-        test_normalized_list = []
-        test_proportion_list = []
-        for raw_file in test_raw_list:
-            normalized_file = normalize_readcount(gc_file, raw_file, self.work_directory / "Temporary" / "Test", combined_filter_file)
-            test_normalized_list.append(normalized_file)
-            test_proportion_file = self.estimator.calculate_proportion(
-                normalized_file,
-                self.work_directory / "Temporary" / "Test",
-                blacklist,
-            )
-            test_proportion_list.append(test_proportion_file)
-
-        print("\n7. Calculate reference from train samples")
-        reference = self.estimator.create_reference(self.work_directory / "Temporary" / "Train", self.work_directory / "Temporary")
-
-        print("\n8. Calculate ratio for test samples ...")
-        ratio_list = []
-        for test_proportion_file in test_proportion_list:
-            ratio_file = self.estimator.calculate_ratio(test_proportion_file, reference, self.work_directory / "Temporary" / "Test")
-            ratio_list.append(ratio_file)
-
-        print("\n9. Recalculate ratio using aberration masking and scaling...")
-        recalculated_ratio_list = []
-        for i, ratio_file in enumerate(ratio_list):
-            normalized_file = test_normalized_list[i]
-            refined_ratio_file = self.estimator.recalculate_ratio(normalized_file, ratio_file, reference, self.work_directory / "Output", 0.35)
-            recalculated_ratio_list.append(refined_ratio_file)
-
-        # Optional bilateral smoothing before segmentation
-        log2_ratio_list = recalculated_ratio_list
-        if self.smooth > 1:
-            print(f"\n9b. Bilateral smoothing log2 ratios with window = {self.smooth} ...")
-            smoothed_list = []
-            for refined_ratio_file in recalculated_ratio_list:
-                smoothed_file = bilateral_smooth(refined_ratio_file, self.work_directory / "Output", self.smooth)
-                smoothed_list.append(smoothed_file)
-            log2_ratio_list = smoothed_list
-
-        print("\n10. Performing CBS segmentation...")
-        segments_list = []
-        for ratio_file_for_seg in log2_ratio_list:
-            segments_file = cbs(ratio_file_for_seg, self.work_directory / "Output", self.bin_size, self.chromosome_list)
-            segments_list.append(segments_file)
-
-        print("\n11. Create chart with segments ...")
-
-        for i, ratio_file_for_plot in enumerate(log2_ratio_list):
-            segments_file = segments_list[i]
-            plotter = Plotter(self.chromosome_list, self.bin_size, self.work_directory / "Output")
-            plot_file = plotter.plot(ratio_file_for_plot, segments_file)
+            name = f"test:{bam_file.stem}"
+            raw_file = graph.add(f"count:{name}", self.estimator.count_read, str(bam_file), test_dir, stage = 1)
+            normalized_file = graph.add(f"normalize:{name}", normalize_readcount, gc_file, raw_file, test_dir, combined_filter_file, stage = 2)
+            proportion_file = graph.add(f"proportion:{name}", self.estimator.calculate_proportion, normalized_file, test_dir, blacklist, stage = 5)
+            ratio_file = graph.add(f"ratio:{name}", self.estimator.calculate_ratio, proportion_file, reference, test_dir, stage = 8)
+            log2_ratio_file = graph.add(f"recalculate:{name}", self.estimator.recalculate_ratio, normalized_file, ratio_file, reference, output_dir, 0.35, stage = 9)
+            if self.smooth > 1:
+                log2_ratio_file = graph.add(f"smooth:{name}", bilateral_smooth, log2_ratio_file, output_dir, self.smooth, stage = 10)
+            segments_file = graph.add(f"segment:{name}", self.segment_sample, log2_ratio_file, proportion_file, reference_noise, stage = 11)
+            if self.plot:
+                graph.add(f"plot:{name}", plot_sample, self.chromosome_list, self.bin_size, output_dir,
+                          log2_ratio_file, segments_file, self.plot_dpi, self.plot_format, stage = 12, pool = "plot")
+
+        return graph
+
+    def write_run_metadata(self):
+        """Run settings for consumers of Output/ (wrappers, exporters)."""
+        metadata_file = self.work_directory / "Output" / "run_metadata.json"
+        metadata = {
+            "algorithm": "baseline",
+            "reference_genome": "GRCh37",
+            "bin_size": int(self.bin_size),
+            "filter_ratio": self.filter_ratio,
+            "smooth": self.smooth,
+            "bootstrap": self.bootstrap,
+            "plot": self.plot,
+            "plot_format": self.plot_format,
+            "chromosome_list": self.chromosome_list,
+        }
+        with open(metadata_file, "w") as f:
+            json.dump(metadata, f, indent = 2)
+        return str(metadata_file)
+
+    def run_pipeline(self):
+
+        print("=== START CNV DETECTION PIPELINE ===")
+        self.write_run_metadata()
+        print(f"Workers: {self.workers}, plot workers: {self.plot_workers if self.plot else 0}")
+
+        tracer = Tracer(self.trace_file, self.trace_format) if self.trace_file else None
+        started = time.perf_counter()
+
+        graph = self.build_graph()
+        graph.run({"default": self.workers, "plot": self.plot_workers}, tracer)
 
         print(f"\n=== COMPLETED PIPELINE ===")
+        if tracer is not None:
+            tracer.close(round(time.perf_counter() - started, 6))
 
 
 def main():
@@ -156,10 +179,20 @@ def main():
     parser.add_argument('--bin-size', type = int, default = 400000, help = 'Size of bin')
     parser.add_argument('--filter-ratio', type = float, default = 0.9, help = 'Filter ratio')
     parser.add_argument('--smooth', type = int, default = 1, help = 'Bilateral smoothing window (1 to disable)')
+    parser.add_argument('--bootstrap', type = int, default = 0, help = 'Bootstrap resamples for segment mean CI (0 to disable)')
+    parser.add_argument('--mosaic-calibration', default = None, help = 'Mosaic fraction calibration JSON (from mosaic.py)')
+    parser.add_argument('--plot-dpi', type = int, default = 150, help = 'Resolution of the scatter chart PNG')
+    parser.add_argument('--plot-format', choices = ['png', 'json'], default = 'png', help = 'Scatter chart as PNG image or JSON payload for the viewer')
+    parser.add_argument('-j', '--workers', type = int, default = 1, help = 'Processes running pipeline tasks (1 to run serially)')
+    parser.add_argument('--plot-workers', type = int, default = 1, help = 'Processes used to draw charts (1 to plot in the main process)')
+    parser.add_argument('--trace', default = None, help = 'Write per-task timing, CPU, peak RSS, IO and throughput to this file')
+    parser.add_argument('--trace-format', choices = TRACE_FORMATS, default = 'jsonl', help = 'Trace as JSON lines or Chrome trace (chrome://tracing, Perfetto)')
+    parser.add_argument('--reference-only', action = 'store_true', help = 'Only build filters, blacklist and reference from the train samples')
+    parser.add_argument('--no-plot', dest = 'plot', action = 'store_false', help = 'Skip chart generation (headless batch runs)')
 
     args = parser.parse_args()
 
-    pipeline = CNV(args.work_directory, args.bin_size, args.filter_ratio, args.smooth)
+    pipeline = CNV(args.work_directory, args.bin_size, args.filter_ratio, args.smooth, args.bootstrap, args.mosaic_calibration, args.plot_dpi, args.plot_format, args.plot_workers, args.plot, args.workers, args.trace, args.trace_format, args.reference_only)
 
     pipeline.run_pipeline()
 
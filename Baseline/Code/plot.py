@@ -1,6 +1,11 @@
+import json
 import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba_array
 from pathlib import Path
 import glob
 import shutil
@@ -8,17 +13,28 @@ import argparse
 
 plt.rcParams['font.family'] = ['DejaVu Sans', 'sans-serif']
 
+# Bảng màu điểm: 0 = bình thường, 1 = gain, 2 = loss
+POINT_PALETTE = np.array(['#888888', '#F97E7E', '#65C3E3'])
+LINE_PALETTE = np.array(['#000000', '#FF0000', '#0000FF'])
+LINE_WIDTHS = np.array([3, 4, 4])
+LINE_ALPHAS = np.array([0.7, 0.9, 0.9])
+PLOT_FORMATS = ('png', 'json')
+
+
 class Plotter:
-    def __init__(self, chromosome_list, bin_size, output_dir):
+    def __init__(self, chromosome_list, bin_size, output_dir, dpi=150, output_format='png'):
+        if output_format not in PLOT_FORMATS:
+            raise ValueError(f"output_format must be one of {PLOT_FORMATS}, got '{output_format}'")
         self.chromosome_list = chromosome_list
         self.bin_size = bin_size
         self.output_dir = Path(output_dir)
+        self.dpi = dpi
+        self.output_format = output_format
 
     def _prepare_ratio_data(self, ratio_data):
-        """Chuẩn bị dữ liệu ratio: positions, copy numbers, colors, chrom mapping"""
-        all_positions = []
-        all_copy_numbers = []
-        all_colors = []
+        """Chuẩn bị dữ liệu ratio: positions, copy numbers, chrom mapping"""
+        position_list = []
+        copy_number_list = []
         chromosome_boundaries = []
         chromosome_centers = []
         chromosome_labels = []
@@ -29,23 +45,16 @@ class Plotter:
             if chrom in ratio_data.files:
                 ratios = ratio_data[chrom]
                 num_bins = len(ratios)
-                bin_positions = np.arange(num_bins) + current_pos
-                
+
                 chrom_bin_mapping[chrom] = {
                     'start_bin': current_pos,
                     'end_bin': current_pos + num_bins - 1,
                     'num_bins': num_bins
                 }
 
-                valid_mask = ratios > -10
-                if np.any(valid_mask):
-                    valid_positions = bin_positions[valid_mask]
-                    valid_ratios = ratios[valid_mask]
-                    valid_copy_numbers = np.power(2.0, valid_ratios + 1.0)
-
-                    all_positions.extend(valid_positions)
-                    all_copy_numbers.extend(valid_copy_numbers)
-                    all_colors.extend(['#888888'] * len(valid_positions))
+                valid_index = np.flatnonzero(ratios > -10)
+                position_list.append(valid_index + current_pos)
+                copy_number_list.append(np.power(2.0, ratios[valid_index] + 1.0))
 
                 if current_pos > 0:
                     chromosome_boundaries.append(current_pos)
@@ -55,9 +64,8 @@ class Plotter:
                 current_pos += num_bins
 
         return {
-            'positions': np.array(all_positions),
-            'copy_numbers': np.array(all_copy_numbers),
-            'colors': np.array(all_colors),
+            'positions': np.concatenate(position_list) if position_list else np.array([], dtype=int),
+            'copy_numbers': np.concatenate(copy_number_list) if copy_number_list else np.array([]),
             'chrom_bin_mapping': chrom_bin_mapping,
             'boundaries': chromosome_boundaries,
             'centers': chromosome_centers,
@@ -65,85 +73,75 @@ class Plotter:
             'max_pos': current_pos
         }
 
-    def _calculate_segment_info(self, segment, chrom_bin_mapping, gender='female'):
-        """Tính toán thông tin vị trí và màu sắc cho một segment"""
-        chrom = str(segment['chrom_original']) if 'chrom_original' in segment.index else str(segment['chrom'])
-        if chrom not in chrom_bin_mapping:
-            return None
-        chrom_info = chrom_bin_mapping[chrom]
-        
-        start_maploc = segment['loc.start'] if 'loc.start' in segment.index else 0
-        end_maploc = segment['loc.end'] if 'loc.end' in segment.index else self.bin_size
-        start_bin_idx, end_bin_idx = int(start_maploc // self.bin_size), int(end_maploc // self.bin_size)
-        plot_start = chrom_info['start_bin'] + max(start_bin_idx, 0)
-        plot_end = chrom_info['start_bin'] + min(end_bin_idx, chrom_info['num_bins'] - 1)
-        seg_value = float(np.power(2.0, segment['seg.mean'] + 1.0))
-        
-        # Thresholds: male X/Y uses 0.55-1.45, others use 1.55-2.45
-        high_thresh, low_thresh = (1.45, 0.55) if (gender == 'male' and chrom in ['X', 'Y']) else (2.45, 1.55)
-        
-        if seg_value > high_thresh:
-            point_color, line_color, linewidth, alpha = "#F97E7E", '#FF0000', 4, 0.9
-        elif seg_value < low_thresh:
-            point_color, line_color, linewidth, alpha = "#65C3E3", '#0000FF', 4, 0.9
-        else:
-            point_color, line_color, linewidth, alpha = '#888888', '#000000', 3, 0.7
-        
-        return {
-            'plot_start': plot_start, 'plot_end': plot_end, 'seg_value': seg_value,
-            'point_color': point_color, 'line_color': line_color, 'linewidth': linewidth, 'alpha': alpha
-        }
-
     def _prepare_segment_data(self, segments_df, chrom_bin_mapping, gender='female'):
-        """Chuẩn bị dữ liệu segment: parse và tính toán vị trí, màu sắc"""
-        if segments_df is None:
-            return []
-        
-        segment_infos = []
-        for _, segment in segments_df.iterrows():
-            info = self._calculate_segment_info(segment, chrom_bin_mapping, gender)
-            if info:
-                segment_infos.append(info)
-        
-        return segment_infos
-
-    def _plot_ratio_points(self, ax, ratio_data_dict, segment_infos):
-        """Vẽ các điểm ratio với màu được áp dụng từ segments"""
-        positions = ratio_data_dict['positions']
-        copy_numbers = ratio_data_dict['copy_numbers']
-        colors = ratio_data_dict['colors'].copy()
-        
-        # Áp dụng màu segment cho các điểm
-        segment_bin_colors = {}
-        for info in segment_infos:
-            for bin_pos in range(int(info['plot_start']), int(info['plot_end']) + 1):
-                segment_bin_colors[bin_pos] = info['point_color']
-        
-        for i, pos in enumerate(positions):
-            if int(pos) in segment_bin_colors:
-                colors[i] = segment_bin_colors[int(pos)]
-        
-        ax.scatter(positions, copy_numbers, c=colors, alpha=0.7, s=15, edgecolors='none')
-
-    def _plot_segment_lines(self, ax, segment_infos):
-        """Vẽ đường segments"""
-        for info in segment_infos:
-            ax.plot([info['plot_start'], info['plot_end']], 
-                   [info['seg_value'], info['seg_value']],
-                   color=info['line_color'], 
-                   linewidth=info['linewidth'], 
-                   alpha=info['alpha'], 
-                   solid_capstyle='round')
+        """Chuẩn bị dữ liệu segment dạng mảng: vị trí bin trên trục, giá trị và mã màu"""
+        empty = {
+            'plot_start': np.array([], dtype=int), 'plot_end': np.array([], dtype=int),
+            'seg_value': np.array([]), 'color_code': np.array([], dtype=int),
+        }
+        if segments_df is None or segments_df.empty:
+            return empty
+
+        chrom_col = segments_df['chrom_original'] if 'chrom_original' in segments_df.columns else segments_df['chrom']
+        chroms = chrom_col.astype(str).to_numpy()
+        known = np.isin(chroms, list(chrom_bin_mapping))
+        if not np.any(known):
+            return empty
+        chroms = chroms[known]
+        start_bin = np.array([chrom_bin_mapping[c]['start_bin'] for c in chroms], dtype=int)
+        num_bins = np.array([chrom_bin_mapping[c]['num_bins'] for c in chroms], dtype=int)
+
+        start_maploc = segments_df['loc.start'].to_numpy()[known] if 'loc.start' in segments_df.columns else np.zeros(len(chroms))
+        end_maploc = segments_df['loc.end'].to_numpy()[known] if 'loc.end' in segments_df.columns else np.full(len(chroms), self.bin_size)
+        plot_start = start_bin + np.maximum(start_maploc // self.bin_size, 0).astype(int)
+        plot_end = start_bin + np.minimum(end_maploc // self.bin_size, num_bins - 1).astype(int)
+        seg_value = np.power(2.0, segments_df['seg.mean'].to_numpy(dtype=float)[known] + 1.0)
 
-    def plot(self, log2_ratio_file, segments_csv=None):
-        """
-        Tạo biểu đồ CNV từ dữ liệu log2 ratio với segments
-        """
-        ratio_data = np.load(log2_ratio_file)
-        segments_df = pd.read_csv(segments_csv) if segments_csv else None
-        ratio_name = Path(log2_ratio_file).stem.replace('_log2Ratio', '')
-        
-        # Detect gender from proportion.npz in Temporary/Test
+        # Thresholds: male X/Y uses 0.55-1.45, others use 1.55-2.45
+        haploid = (gender == 'male') & np.isin(chroms, ['X', 'Y'])
+        high_thresh = np.where(haploid, 1.45, 2.45)
+        low_thresh = np.where(haploid, 0.55, 1.55)
+        color_code = np.where(seg_value > high_thresh, 1, np.where(seg_value < low_thresh, 2, 0))
+
+        return {'plot_start': plot_start, 'plot_end': plot_end, 'seg_value': seg_value, 'color_code': color_code}
+
+    def _point_color_codes(self, positions, segment_data):
+        """Gán mã màu cho từng điểm bằng tìm kiếm khoảng segment chứa bin (segments không chồng lấn)"""
+        color_code = np.zeros(len(positions), dtype=int)
+        if len(segment_data['plot_start']) == 0 or len(positions) == 0:
+            return color_code
+
+        order = np.argsort(segment_data['plot_start'], kind='mergesort')
+        starts = segment_data['plot_start'][order]
+        ends = segment_data['plot_end'][order]
+        codes = segment_data['color_code'][order]
+
+        segment_index = np.searchsorted(starts, positions, side='right') - 1
+        inside = segment_index >= 0
+        inside[inside] = positions[inside] <= ends[segment_index[inside]]
+        color_code[inside] = codes[segment_index[inside]]
+        return color_code
+
+    def _plot_ratio_points(self, ax, ratio_data_dict, color_code):
+        """Vẽ các điểm ratio với màu được áp dụng từ segments (rasterized để giảm kích thước ảnh)"""
+        ax.scatter(ratio_data_dict['positions'], ratio_data_dict['copy_numbers'], c=POINT_PALETTE[color_code],
+                   alpha=0.7, s=15, edgecolors='none', rasterized=True)
+
+    def _plot_segment_lines(self, ax, segment_data):
+        """Vẽ đường segments trong một LineCollection"""
+        if len(segment_data['plot_start']) == 0:
+            return
+        lines = np.stack([
+            np.column_stack([segment_data['plot_start'], segment_data['seg_value']]),
+            np.column_stack([segment_data['plot_end'], segment_data['seg_value']]),
+        ], axis=1)
+        codes = segment_data['color_code']
+        colors = to_rgba_array(LINE_PALETTE[codes])
+        colors[:, 3] = LINE_ALPHAS[codes]
+        ax.add_collection(LineCollection(lines, colors=colors, linewidths=LINE_WIDTHS[codes], capstyle='round'))
+
+    def _detect_gender(self, ratio_name):
+        """Detect gender from proportion.npz in Temporary/Test"""
         gender = 'female'  # default
         proportion_file = self.output_dir.parent / 'Temporary' / 'Test' / f"{ratio_name}_proportion.npz"
         if proportion_file.exists():
@@ -154,19 +152,33 @@ class Plotter:
                     print(f"Detected gender: {gender} for {ratio_name}")
             except Exception as e:
                 print(f"Warning: Could not read gender from {proportion_file}: {e}")
-        
-        plot_file = self.output_dir / f"{ratio_name}_scatterChart.png"
+        return gender
 
-        fig, ax1 = plt.subplots(1, 1, figsize=(20, 10))
+    def plot(self, log2_ratio_file, segments_csv=None):
+        """
+        Tạo biểu đồ CNV từ dữ liệu log2 ratio với segments (PNG hoặc payload JSON cho viewer)
+        """
+        ratio_data = np.load(log2_ratio_file)
+        segments_df = pd.read_csv(segments_csv) if segments_csv else None
+        ratio_name = Path(log2_ratio_file).stem.replace('_log2Ratio', '')
+        gender = self._detect_gender(ratio_name)
 
         ratio_data_dict = self._prepare_ratio_data(ratio_data)
-        segment_infos = self._prepare_segment_data(segments_df, ratio_data_dict['chrom_bin_mapping'], gender)
+        segment_data = self._prepare_segment_data(segments_df, ratio_data_dict['chrom_bin_mapping'], gender)
+        color_code = self._point_color_codes(ratio_data_dict['positions'], segment_data)
+
+        if self.output_format == 'json':
+            return self._write_payload(ratio_name, gender, ratio_data_dict, segment_data, color_code)
+
+        plot_file = self.output_dir / f"{ratio_name}_scatterChart.png"
+
+        fig, ax1 = plt.subplots(1, 1, figsize=(20, 10))
 
         if len(ratio_data_dict['positions']) == 0:
             print("Cảnh báo: Không có dữ liệu hợp lệ để vẽ biểu đồ!")
             ax1.text(0.5, 0.5, 'Không có dữ liệu hợp lệ', transform=ax1.transAxes, ha='center', va='center', fontsize=14)
         else:
-            self._plot_ratio_points(ax1, ratio_data_dict, segment_infos)
+            self._plot_ratio_points(ax1, ratio_data_dict, color_code)
 
             ax1.axhline(y=3.0, color='lightcoral', linestyle='--', alpha=0.8, linewidth=1.5)
             ax1.axhline(y=1.0, color='lightblue', linestyle='--', alpha=0.8, linewidth=1.5)
@@ -175,7 +187,7 @@ class Plotter:
             for boundary in ratio_data_dict['boundaries']:
                 ax1.axvline(x=boundary, color='darkgray', linestyle='-', alpha=0.5, linewidth=0.8)
 
-            self._plot_segment_lines(ax1, segment_infos)
+            self._plot_segment_lines(ax1, segment_data)
 
         # Định dạng trục
         ax1.set_title(f'{ratio_name}', fontsize=14, fontweight='bold')
@@ -192,9 +204,45 @@ class Plotter:
             ax1.set_xticks(ratio_data_dict['centers'])
             ax1.set_xticklabels(ratio_data_dict['labels'], fontsize=10)
 
-        plt.tight_layout()
-        plt.savefig(plot_file, dpi=300, bbox_inches='tight')
-        plt.close()
+        fig.tight_layout()
+        fig.savefig(plot_file, dpi=self.dpi, bbox_inches='tight')
+        plt.close(fig)
 
         print(f"Đã lưu biểu đồ vào: {plot_file}")
-        return str(plot_file)
\ No newline at end of file
+        return str(plot_file)
+
+    def _write_payload(self, ratio_name, gender, ratio_data_dict, segment_data, color_code):
+        """Ghi payload JSON gọn (mảng song song) để viewer tự vẽ thay vì ảnh PNG"""
+        payload_file = self.output_dir / f"{ratio_name}_scatterChart.json"
+        payload = {
+            'sample': ratio_name,
+            'gender': gender,
+            'bin_size': int(self.bin_size),
+            'chromosomes': [
+                {'name': chrom, 'start_bin': int(info['start_bin']), 'num_bins': int(info['num_bins'])}
+                for chrom, info in ratio_data_dict['chrom_bin_mapping'].items()
+            ],
+            'palette': POINT_PALETTE.tolist(),
+            'points': {
+                'x': ratio_data_dict['positions'].astype(int).tolist(),
+                'copy_number': np.round(ratio_data_dict['copy_numbers'], 3).tolist(),
+                'color': color_code.tolist(),
+            },
+            'segments': {
+                'start': segment_data['plot_start'].astype(int).tolist(),
+                'end': segment_data['plot_end'].astype(int).tolist(),
+                'copy_number': np.round(segment_data['seg_value'], 3).tolist(),
+                'color': segment_data['color_code'].astype(int).tolist(),
+            },
+        }
+        with open(payload_file, 'w') as f:
+            json.dump(payload, f, separators=(',', ':'))
+
+        print(f"Đã lưu payload biểu đồ vào: {payload_file}")
+        return str(payload_file)
+
+
+def plot_sample(chromosome_list, bin_size, output_dir, log2_ratio_file, segments_csv=None, dpi=150, output_format='png'):
+    """Vẽ một mẫu; hàm top-level để có thể gửi sang process pool (mỗi worker dùng Agg riêng)"""
+    plotter = Plotter(chromosome_list, bin_size, output_dir, dpi, output_format)
+    return plotter.plot(log2_ratio_file, segments_csv)
@@ -0,0 +1,147 @@
+import heapq
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from instrument import measure
+
+
+class Ref:
+    """Placeholder for the result of another task (optionally one item of a tuple result)."""
+
+    def __init__(self, key, item=None):
+        self.key = key
+        self.item = item
+
+
+class Task:
+    def __init__(self, key, func, args, deps, stage, pool):
+        self.key = key
+        self.func = func
+        self.args = args
+        self.deps = deps
+        self.stage = stage
+        self.pool = pool
+
+
+class TaskGraph:
+    """
+    Small dependency graph executor for the pipeline.
+
+    Each task runs as soon as all of its dependencies are finished. Ready tasks of later
+    stages are started first so samples flow through to the end instead of waiting at
+    stage barriers. A pool of size 1 runs its tasks inline in the main process, one at a
+    time in the same priority (later stage first, then the order they were added); every
+    task still runs after its dependencies, so the outputs match the serial pipeline
+    although tasks of different samples may interleave.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self.results = {}
+
+    def add(self, key, func, *args, after=None, stage=0, pool="default"):
+        """Add a task; dependencies are the Ref arguments plus the keys listed in `after`."""
+        if key in self.tasks:
+            raise ValueError(f"Task '{key}' already exists")
+        deps = {arg.key for arg in args if isinstance(arg, Ref)} | set(after or [])
+        missing = deps - set(self.tasks)
+        if missing:
+            raise ValueError(f"Task '{key}' depends on unknown tasks: {sorted(missing)}")
+        self.tasks[key] = Task(key, func, args, deps, stage, pool)
+        return Ref(key)
+
+    def _resolve(self, args):
+        resolved = []
+        for arg in args:
+            if isinstance(arg, Ref):
+                value = self.results[arg.key]
+                resolved.append(value if arg.item is None else value[arg.item])
+            else:
+                resolved.append(arg)
+        return resolved
+
+    def run(self, pool_sizes=None, tracer=None):
+        """
+        Execute every task; pool_sizes maps pool name -> number of worker processes.
+        With a tracer, each task is measured in the process that runs it (instrument.measure).
+        """
+        pool_sizes = pool_sizes or {}
+        order = {key: index for index, key in enumerate(self.tasks)}
+        waiting = {key: set(task.deps) for key, task in self.tasks.items()}
+        dependents = {key: [] for key in self.tasks}
+        for key, task in self.tasks.items():
+            for dep in task.deps:
+                dependents[dep].append(key)
+
+        ready = []
+
+        def release(key):
+            for child in dependents[key]:
+                waiting[child].discard(key)
+                if not waiting[child]:
+                    heapq.heappush(ready, (-self.tasks[child].stage, order[child], child))
+
+        for key, deps in waiting.items():
+            if not deps:
+                heapq.heappush(ready, (-self.tasks[key].stage, order[key], key))
+
+        executors = {
+            name: ProcessPoolExecutor(max_workers=size)
+            for name, size in pool_sizes.items() if size and size > 1
+        }
+        running = {}
+        try:
+            while ready or running:
+                # Dispatch everything that is ready; inline pools run immediately
+                inline_done = False
+                while ready:
+                    _, _, key = heapq.heappop(ready)
+                    task = self.tasks[key]
+                    args = self._resolve(task.args)
+                    print(f"\n[{task.stage}] {key}")
+                    executor = executors.get(task.pool)
+                    if executor is None:
+                        self.results[key] = self._collect(self._run_inline(task, args, tracer), tracer)
+                        release(key)
+                        inline_done = True
+                        break
+                    if tracer is None:
+                        running[executor.submit(task.func, *args)] = key
+                    else:
+                        running[executor.submit(measure, key, task.func, *args)] = key
+
+                if inline_done or not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = running.pop(future)
+                    try:
+                        self.results[key] = self._collect(future.result(), tracer)
+                    except Exception as e:
+                        raise RuntimeError(f"Task '{key}' failed: {e}") from e
+                    release(key)
+        finally:
+            # Drop queued tasks after a failure (shutdown(cancel_futures=...) needs Python 3.9)
+            for future in running:
+                future.cancel()
+            for executor in executors.values():
+                executor.shutdown()
+
+        return self.results
+
+    @staticmethod
+    def _collect(output, tracer):
+        if tracer is None:
+            return output
+        result, record = output
+        tracer.record(record)
+        return result
+
+    @staticmethod
+    def _run_inline(task, args, tracer=None):
+        try:
+            if tracer is not None:
+                return measure(task.key, task.func, *args)
+            return task.func(*args)
+        except Exception as e:
+            raise RuntimeError(f"Task '{task.key}' failed: {e}") from e
@@ -2,6 +2,12 @@ import subprocess
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from scipy.special import erf
+
+# Sort key spacing between chromosomes when flattening bins genome-wide
+CHROMOSOME_KEY_OFFSET = 10 ** 10
+# Upper bound on bootstrap draws held in memory at once (replicates x bins)
+BOOTSTRAP_CHUNK_ELEMENTS = 2 ** 22
 
 
 def cbs(ratio_file, temp_dir, bin_size, chromosome_list):
@@ -53,4 +59,151 @@ def prepare_cbs_data(ratio_file, sample_name, temp_dir, bin_size, chromosome_lis
     df = df.sort_values(['chrom_numeric', 'maploc']).reset_index(drop=True)
     temp_csv = Path(temp_dir) / f"{sample_name}_cbs_input.csv"
     df.to_csv(temp_csv, index=False)
-    return str(temp_csv)
\ No newline at end of file
+    return str(temp_csv)
+
+def baseline_copy_number(chromosome, gender):
+    """Copy number expected for a normal sample: 2 on autosomes, sex-dependent on X and Y."""
+    chromosome = str(chromosome).replace('chr', '')
+    if chromosome in ('X', '23'):
+        return 1.0 if gender == 'male' else 2.0
+    if chromosome in ('Y', '24'):
+        return 1.0 if gender == 'male' else 0.0
+    return 2.0
+
+
+def segment_statistics(ratio_file, segments_file, bin_size, chromosome_list, noise_file=None, bootstrap=0, seed=0, gender='female'):
+    """
+    Add per-segment statistics computed from the bins used for segmentation to the CBS output.
+
+    Columns written next to seg.mean: num.bins, bin.mean, bin.sd, bin.sem, z.score, confidence
+    and, when bootstrap > 0, ci.lower/ci.upper (95% percentile interval of the segment mean).
+    The z-score tests the segment mean against the log2 ratio of a normal chromosome,
+    log2(baseline CN / 2) for the sample's gender, using the reference panel variance from
+    noise_file when available and the segment's own SEM otherwise. Y in a female sample has
+    no expected level and gets no z-score.
+    """
+    if segments_file is None or not Path(segments_file).exists():
+        return segments_file
+
+    segments_df = pd.read_csv(segments_file)
+    if segments_df.empty:
+        return str(segments_file)
+
+    data = np.load(ratio_file)
+    noise_data = np.load(noise_file) if noise_file and Path(noise_file).exists() else None
+
+    # Flatten valid bins in the same order as prepare_cbs_data (chrom_numeric, maploc)
+    key_list, value_list, variance_list = [], [], []
+    for chromosome in chromosome_list:
+        if chromosome not in data.files:
+            continue
+        ratios = data[chromosome]
+        valid = ratios > -10
+        maploc = np.arange(len(ratios), dtype=np.int64) * bin_size + bin_size // 2
+        chrom_numeric = _chromosome_numeric(chromosome)
+        key_list.append(chrom_numeric * CHROMOSOME_KEY_OFFSET + maploc[valid])
+        value_list.append(ratios[valid].astype(float))
+        if noise_data is not None and chromosome in noise_data.files and len(noise_data[chromosome]) == len(ratios):
+            variance_list.append(np.square(noise_data[chromosome][valid]))
+        else:
+            variance_list.append(np.full(np.count_nonzero(valid), np.nan))
+
+    keys = np.concatenate(key_list)
+    values = np.concatenate(value_list)
+    variances = np.concatenate(variance_list)
+    order = np.argsort(keys, kind="mergesort")
+    keys, values, variances = keys[order], values[order], variances[order]
+
+    # Index range [low, high) of every segment in the flattened bins
+    chrom_col = segments_df['chrom_original'] if 'chrom_original' in segments_df.columns else segments_df['chrom']
+    seg_chrom = np.array([_chromosome_numeric(c) for c in chrom_col], dtype=np.int64)
+    low = np.searchsorted(keys, seg_chrom * CHROMOSOME_KEY_OFFSET + segments_df['loc.start'].to_numpy(dtype=np.int64), side="left")
+    high = np.searchsorted(keys, seg_chrom * CHROMOSOME_KEY_OFFSET + segments_df['loc.end'].to_numpy(dtype=np.int64), side="right")
+    num_bins = high - low
+
+    # Prefix sums give all segment moments in one pass
+    has_variance = ~np.isnan(variances)
+    sum_1 = np.concatenate(([0.0], np.cumsum(values)))
+    sum_2 = np.concatenate(([0.0], np.cumsum(values * values)))
+    sum_variance = np.concatenate(([0.0], np.cumsum(np.where(has_variance, variances, 0.0))))
+    count_variance = np.concatenate(([0], np.cumsum(has_variance)))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = (sum_1[high] - sum_1[low]) / num_bins
+        sum_square = np.maximum(sum_2[high] - sum_2[low] - num_bins * mean * mean, 0.0)
+        sd = np.where(num_bins > 1, np.sqrt(sum_square / (num_bins - 1)), np.nan)
+        sem = sd / np.sqrt(num_bins)
+
+        # Expected SEM of the segment mean under the reference noise (mean bin variance / n)
+        covered = count_variance[high] - count_variance[low]
+        reference_sem = np.sqrt((sum_variance[high] - sum_variance[low]) / covered / num_bins)
+        null_sem = np.where((covered > 0) & (reference_sem > 0), reference_sem, sem)
+        baseline = np.array([baseline_copy_number(c, gender) for c in chrom_col], dtype=float)
+        expected = np.where(baseline > 0, np.log2(baseline / 2.0), np.nan)
+        z_score = (mean - expected) / null_sem
+
+    confidence = np.where(np.isnan(z_score), np.nan, _two_sided_confidence(z_score))
+
+    statistics = {
+        'num.bins': num_bins,
+        'bin.mean': np.round(mean, 6),
+        'bin.sd': np.round(sd, 6),
+        'bin.sem': np.round(sem, 6),
+        'z.score': np.round(z_score, 4),
+        'confidence': np.round(confidence, 6),
+    }
+    if bootstrap and bootstrap > 0:
+        ci_lower, ci_upper = bootstrap_ci(values, low, high, bootstrap, seed)
+        statistics['ci.lower'] = np.round(ci_lower, 6)
+        statistics['ci.upper'] = np.round(ci_upper, 6)
+
+    stale = [c for c in list(statistics) + ['ci.lower', 'ci.upper'] if c in segments_df.columns]
+    segments_df = segments_df.drop(columns=stale)
+    position = segments_df.columns.get_loc('seg.mean') + 1
+    for offset, (column, value) in enumerate(statistics.items()):
+        segments_df.insert(position + offset, column, value)
+
+    segments_df.to_csv(segments_file, index=False)
+    return str(segments_file)
+
+
+def bootstrap_ci(values, low, high, num_resample, seed=0, level=0.95):
+    """
+    Percentile bootstrap interval of each segment mean by resampling bins within the segment.
+
+    All segments are resampled together over the flattened bins, in chunks of replicates so that
+    a chunk holds at most BOOTSTRAP_CHUNK_ELEMENTS draws; only the per-segment means are kept.
+    """
+    rng = np.random.default_rng(seed)
+    ci_lower = np.full(len(low), np.nan)
+    ci_upper = np.full(len(low), np.nan)
+    num_bins = high - low
+    selected = np.flatnonzero(num_bins >= 2)
+    if selected.size == 0:
+        return ci_lower, ci_upper
+
+    counts = num_bins[selected]
+    total = int(counts.sum())
+    first = np.repeat(low[selected], counts)
+    size = np.repeat(counts, counts)
+    starts = np.cumsum(counts) - counts
+    means = np.empty((num_resample, len(selected)))
+    chunk = max(1, BOOTSTRAP_CHUNK_ELEMENTS // total)
+    for begin in range(0, num_resample, chunk):
+        end = min(begin + chunk, num_resample)
+        draws = first + (rng.random((end - begin, total)) * size).astype(np.int64)
+        means[begin:end] = np.add.reduceat(values[draws], starts, axis=1) / counts
+
+    tail = 100.0 * (1.0 - level) / 2.0
+    ci_lower[selected], ci_upper[selected] = np.percentile(means, [tail, 100.0 - tail], axis=0)
+    return ci_lower, ci_upper
+
+
+def _chromosome_numeric(chromosome):
+    chromosome = str(chromosome).replace('chr', '')
+    return 23 if chromosome == 'X' else (24 if chromosome == 'Y' else int(chromosome))
+
+
+def _two_sided_confidence(z_score):
+    """1 - two-sided p-value of a standard normal z-score."""
+    return erf(np.abs(np.nan_to_num(z_score)) / np.sqrt(2.0))
@@ -1,7 +1,7 @@
 import uuid
-from collections import Counter
+from collections import Counter, defaultdict
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 import subprocess
 import os
 import csv
@@ -9,8 +9,11 @@ from pathlib import Path
 
 from result.models import SampleSegment
 from aberration.models import Aberration, AberrationSegment, AberrationType, AssessmentType
-from common.models import Chromosome
+from common.models import Chromosome, ReferenceGenome
+from config import AnnotationConfig
+from annotation.engine import LocalAnnotationEngine
 from sample.models import Sample
+from result.report import ReportCache
 
 
 DEFAULT_MOSAICISM_THRESHOLD = 0.3
@@ -88,6 +91,7 @@ class AberrationService:
         # Save to database
         db.add(aberration)
         db.commit()
+        ReportCache.invalidate([result_id])
         
         return aberration
 
@@ -134,11 +138,6 @@ class AberrationService:
 
     @staticmethod
     def annotate_result(result_id: str, db: Session) -> Aberration:
-        # Ensure aberration exists
-        aberration = db.query(Aberration).filter(Aberration.result_id == result_id).first()
-        if not aberration:
-            aberration = AberrationService.generate_and_save_aberrations(result_id, db)
-
         # Load result/sample
         from result.models import Result
 
@@ -150,52 +149,174 @@ class AberrationService:
         if not sample:
             raise ValueError(f"Sample {result.sample_id} not found")
 
-        # Query segments for this aberration
-        segments = (
-            db.query(AberrationSegment)
-            .filter(AberrationSegment.aberration_id == aberration.id)
-            .order_by(AberrationSegment.chromosome, AberrationSegment.start)
+        aberration = AberrationService.annotate_results([result_id], db)[result_id]
+        db.refresh(aberration)
+        return aberration
+
+    @staticmethod
+    def annotate_results(
+        result_ids: List[str], db: Session, raise_errors: bool = False
+    ) -> dict[str, Aberration]:
+        """
+        Annotate mọi segment chưa có annotation của các result (một result hoặc cả cycle report):
+        mỗi genome build chạy AnnotSV một lần trên một BED chung, rồi cập nhật tất cả segment
+        trong một transaction. Segment đã annotate mà không có OMIM được lưu [] để không chạy lại.
+        raise_errors=True: sau khi lưu phần thành công, báo lỗi nếu có nhóm annotate thất bại.
+        """
+        from result.models import Result
+
+        rows = (
+            db.query(Result.id, Sample.reference_genome)
+            .join(Sample, Sample.id == Result.sample_id)
+            .filter(Result.id.in_(result_ids))
             .all()
         )
+        aberrations = {
+            ab.result_id: ab
+            for ab in db.query(Aberration)
+            .options(selectinload(Aberration.aberration_segments))
+            .filter(Aberration.result_id.in_([row.id for row in rows]))
+            .all()
+        }
+
+        # Gom segment cần annotate theo genome build
+        pending: dict[str, list[AberrationSegment]] = defaultdict(list)
+        for result_id, reference_genome in rows:
+            if result_id not in aberrations:
+                aberrations[result_id] = AberrationService.generate_and_save_aberrations(result_id, db)
+            genome_build = AberrationService._genome_build(reference_genome)
+            pending[genome_build].extend(
+                seg
+                for seg in aberrations[result_id].aberration_segments
+                if seg.annotation_for_segment is None
+            )
 
-        for seg in segments:
+        updates = []
+        errors = []
+        for genome_build, segments in pending.items():
+            if not segments:
+                continue
+            try:
+                annotations = AberrationService.annotate_segments(segments, genome_build, db)
+            except Exception as e:
+                print(f"Error annotating {len(segments)} segments ({genome_build}): {e}")
+                errors.append(f"{genome_build}: {e}")
+                continue
+            # Segment không có trong kết quả giữ annotation None để được annotate lại
+            for seg in segments:
+                if seg.id in annotations:
+                    updates.append((seg, *annotations[seg.id]))
+
+        if updates:
             try:
-                annotation, assessment = AberrationService.annotate_aberration_segment(seg, sample)
-                seg.annotation_for_segment = annotation
-                seg.assessment = assessment
-                db.add(seg)
+                for seg, omim_annotations, assessment in updates:
+                    seg.annotation_for_segment = omim_annotations
+                    seg.assessment = assessment
                 db.commit()
+                ReportCache.invalidate(result_ids)
             except Exception as e:
-                print(f"Error annotating segment {seg.id}: {e}")
+                print(f"Error saving annotations: {e}")
                 db.rollback()
+                errors.append(f"saving annotations: {e}")
 
-        db.refresh(aberration)
-        return aberration
+        if raise_errors and errors:
+            raise RuntimeError("; ".join(errors))
+        return aberrations
+
+    @staticmethod
+    def _genome_build(reference_genome: ReferenceGenome) -> str:
+        return "GRCh37" if "hg19" in reference_genome.value else "GRCh38"
+
+    @staticmethod
+    def _sv_type(segment: AberrationSegment) -> str:
+        return "DUP" if segment.type == AberrationType.GAIN else "DEL"
 
     @staticmethod
-    def annotate_aberration_segment(segment: AberrationSegment, sample: Sample) -> tuple[list[dict] | None, AssessmentType]:
-        # Setup workspace path
+    def annotate_segments(
+        segments: List[AberrationSegment], genome_build: str, db: Session | None = None
+    ) -> dict[str, tuple[list[dict], AssessmentType]]:
+        """
+        {segment.id: (danh sách OMIM, assessment)}. Với engine local: tra bảng gene/OMIM trong tiến
+        trình. Với AnnotSV: có db thì tra cache annotation trước, chỉ chạy AnnotSV (một lần, mỗi
+        khoảng một dòng) cho các khoảng chưa có rồi ghi chúng vào cache. Segment không có dòng nào
+        trong output của AnnotSV không nằm trong kết quả (không cache, để lần sau annotate lại).
+        """
+        from annotation.service import AnnotationCacheService
+
+        if AnnotationConfig.ENGINE == "local":
+            engine = LocalAnnotationEngine.for_build(genome_build)
+            annotations = {
+                seg.id: engine.annotate(seg.chromosome.value, seg.start, seg.end)
+                for seg in segments
+            }
+            return {
+                seg_id: (omim, AberrationService._map_acmg_to_assessment(acmg_class))
+                for seg_id, (omim, acmg_class) in annotations.items()
+            }
+
+        keys = {
+            seg.id: (seg.chromosome, seg.start, seg.end, AberrationService._sv_type(seg))
+            for seg in segments
+        }
+        cached = AnnotationCacheService.lookup(db, genome_build, list(set(keys.values()))) if db else {}
+
+        # Mỗi khoảng chưa có trong cache chạy một lần, dù nhiều segment (nhiều result) trùng tọa độ
+        missing = {}
+        for seg in segments:
+            if keys[seg.id] not in cached:
+                missing.setdefault(keys[seg.id], seg)
+        if missing:
+            output = AberrationService.run_annotsv(list(missing.values()), genome_build)
+            annotated = {key: output[seg.id] for key, seg in missing.items() if seg.id in output}
+            if db:
+                AnnotationCacheService.store(db, genome_build, annotated)
+            cached = {**cached, **annotated}
+
+        return {
+            seg.id: (
+                list(cached[keys[seg.id]][0]),
+                AberrationService._map_acmg_to_assessment(cached[keys[seg.id]][1]),
+            )
+            for seg in segments
+            if keys[seg.id] in cached
+        }
+
+    @staticmethod
+    def annotate_aberration_segment(
+        segment: AberrationSegment, sample: Sample, db: Session | None = None
+    ) -> tuple[list[dict] | None, AssessmentType]:
+        genome_build = AberrationService._genome_build(sample.reference_genome)
+        annotations = AberrationService.annotate_segments([segment], genome_build, db)
+        if segment.id not in annotations:
+            raise RuntimeError(f"AnnotSV returned no annotation for segment {segment.id}")
+        omim_annotations, assessment = annotations[segment.id]
+        return (omim_annotations if omim_annotations else None, assessment)
+
+    @staticmethod
+    def run_annotsv(
+        segments: List[AberrationSegment], genome_build: str
+    ) -> dict[str, tuple[list[dict], str]]:
+        """
+        Chạy AnnotSV một lần cho nhiều segment (một dòng BED mỗi segment, Sample_ID = segment.id).
+        Trả về {segment.id: (danh sách OMIM, ACMG_class của dòng đầu tiên)}; segment không có dòng nào
+        trong output thì không có trong kết quả. Báo lỗi nếu AnnotSV không ghi tệp output.
+        """
+        # Setup workspace path; tên tệp riêng cho mỗi lần chạy để các lần chạy không ghi đè nhau
         workspace_dir = Path(__file__).parent.parent / "annotsv_workspace"
-        bed_file = workspace_dir / "aberration.bed"
-        tsv_output = workspace_dir / "aberration.annotated.tsv"
+        run_name = f"aberration-{uuid.uuid4().hex}"
+        bed_file = workspace_dir / f"{run_name}.bed"
+        tsv_output = workspace_dir / f"{run_name}.annotated.tsv"
         annotations_dir = workspace_dir / "AnnotSV_annotations"
-        
+
         try:
-            # Clean up old files
-            bed_file.unlink(missing_ok=True)
-            tsv_output.unlink(missing_ok=True)
-            
             # Create BED file
-            sv_type = "DUP" if segment.type == AberrationType.GAIN else "DEL"
-            chrom = str(segment.chromosome.value)
-            
             with open(bed_file, "w") as f:
                 f.write("chrom\tstart\tend\tSV_type\tSample_ID\n")
-                f.write(f"{chrom}\t{segment.start}\t{segment.end}\t{sv_type}\t{segment.id}\n")
-            
-            # Determine genome build
-            genome_build = "GRCh37" if "hg19" in sample.reference_genome.value else "GRCh38"
-            
+                for segment in segments:
+                    sv_type = AberrationService._sv_type(segment)
+                    chrom = str(segment.chromosome.value)
+                    f.write(f"{chrom}\t{segment.start}\t{segment.end}\t{sv_type}\t{segment.id}\n")
+
             # Run AnnotSV
             cmd = [
                 "micromamba", "run", "-n", "cnv_annotsv",
@@ -207,39 +328,37 @@ class AberrationService:
                 "-samplesidBEDcol", "5",
                 "-outputFile", str(tsv_output)
             ]
-            
-            result = subprocess.run(cmd, cwd=str(workspace_dir), check=True, capture_output=True, text=True)
-            
-            # Parse AnnotSV output
-            omim_annotations: list[dict] = []
-            assessment = AssessmentType.UNKNOWN
 
-            if tsv_output.exists():
-                with open(tsv_output, "r") as f:
-                    reader = csv.DictReader(f, delimiter="\t")
+            subprocess.run(cmd, cwd=str(workspace_dir), check=True, capture_output=True, text=True)
 
-                    for idx, row in enumerate(reader):
-                        omim_id = row.get("OMIM_ID", "")
-                        omim_phenotype = row.get("OMIM_phenotype", "")
+            # Parse AnnotSV output, theo Sample_ID
+            if not tsv_output.exists():
+                raise RuntimeError(f"AnnotSV did not write {tsv_output.name}")
+            annotations: dict[str, tuple[list[dict], str]] = {}
+            with open(tsv_output, "r") as f:
+                reader = csv.DictReader(f, delimiter="\t")
 
-                        if omim_id and omim_phenotype:
-                            omim_annotations.append({
-                                "OMIM_ID": omim_id,
-                                "OMIM_phenotype": omim_phenotype,
-                            })
+                for row in reader:
+                    segment_id = row.get("Samples_ID") or row.get("Sample_ID", "")
+                    if segment_id not in annotations:
+                        annotations[segment_id] = ([], row.get("ACMG_class", "NA"))
 
-                        if idx == 0:
-                            acmg_class = row.get("ACMG_class", "NA")
-                            assessment = AberrationService._map_acmg_to_assessment(acmg_class)
+                    omim_id = row.get("OMIM_ID", "")
+                    omim_phenotype = row.get("OMIM_phenotype", "")
+                    if omim_id and omim_phenotype:
+                        annotations[segment_id][0].append({
+                            "OMIM_ID": omim_id,
+                            "OMIM_phenotype": omim_phenotype,
+                        })
+
+            return annotations
 
-            return (omim_annotations if omim_annotations else None, assessment)
-            
         except subprocess.CalledProcessError as e:
             print(f"Error running AnnotSV: {e.stderr}")
             raise
-        except Exception as e:
-            print(f"Error annotating segment {segment.id}: {e}")
-            raise
+        finally:
+            bed_file.unlink(missing_ok=True)
+            tsv_output.unlink(missing_ok=True)
     
     @staticmethod
     def _map_acmg_to_assessment(acmg_class: str) -> AssessmentType:
@@ -0,0 +1,99 @@
+"""
+Annotate trong tiến trình bằng bảng gene/OMIM cục bộ, thay cho AnnotSV khi chỉ cần OMIM + class thô.
+
+Bảng TSV có header: chrom, start, end, gene, OMIM_ID, OMIM_phenotype và cột tùy chọn ACMG_class
+(class khi gene bị thay đổi số bản sao). Bảng được nạp một lần cho mỗi đường dẫn vào chỉ mục interval
+theo NST (start đã sắp + max tích lũy của end), mỗi truy vấn overlap là hai lần searchsorted.
+
+Class của segment: ACMG_class lớn nhất của các gene overlap nếu bảng có cột này; nếu không, "3"
+(chưa rõ ý nghĩa) khi overlap ít nhất một gene có OMIM_phenotype, ngược lại "" (Unknown).
+"""
+import csv
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from config import AnnotationConfig
+
+TABLE_COLUMNS = {"chrom", "start", "end", "gene", "OMIM_ID", "OMIM_phenotype"}
+
+
+def _normalize_chrom(value: str) -> str:
+    v = str(value).strip().removeprefix("chr").removeprefix("CHR")
+    return {"23": "X", "24": "Y", "M": "MT"}.get(v, v)
+
+
+class LocalAnnotationEngine:
+    def __init__(self, table_path: str | Path):
+        self.table_path = Path(table_path)
+        self.has_class = False
+        self._records: list[tuple[str, str, str]] = []  # (OMIM_ID, OMIM_phenotype, ACMG_class)
+        self._index: dict[str, tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        by_chrom: dict[str, list[tuple[int, int, int]]] = {}
+        with open(self.table_path, newline="") as f:
+            reader = csv.DictReader((line for line in f if not line.startswith("#")), delimiter="\t")
+            headers = set(reader.fieldnames or [])
+            if not TABLE_COLUMNS.issubset(headers):
+                raise ValueError(f"{self.table_path}: missing columns {TABLE_COLUMNS - headers}")
+            self.has_class = "ACMG_class" in headers
+            for idx, row in enumerate(reader, start=1):
+                try:
+                    start, end = int(row["start"]), int(row["end"])
+                except (TypeError, ValueError) as e:
+                    raise ValueError(f"{self.table_path} line {idx}: {e}")
+                record = len(self._records)
+                self._records.append((
+                    row["OMIM_ID"].strip(),
+                    row["OMIM_phenotype"].strip(),
+                    (row.get("ACMG_class") or "").strip(),
+                ))
+                by_chrom.setdefault(_normalize_chrom(row["chrom"]), []).append((start, end, record))
+
+        for chrom, intervals in by_chrom.items():
+            starts, ends, records = (np.array(values, dtype=np.int64) for values in zip(*sorted(intervals)))
+            self._index[chrom] = (starts, ends, np.maximum.accumulate(ends), records)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def load(table_path: str) -> "LocalAnnotationEngine":
+        """Engine cho một bảng, nạp một lần cho mỗi tiến trình."""
+        return LocalAnnotationEngine(table_path)
+
+    @staticmethod
+    def for_build(genome_build: str) -> "LocalAnnotationEngine":
+        return LocalAnnotationEngine.load(AnnotationConfig.LOCAL_TABLE.format(build=genome_build))
+
+    def overlapping(self, chrom: str, start: int, end: int) -> list[int]:
+        """Chỉ số các bản ghi có khoảng giao [start, end), theo thứ tự start."""
+        entry = self._index.get(_normalize_chrom(chrom))
+        if entry is None:
+            return []
+        starts, ends, max_ends, records = entry
+        # Trước lo: mọi gene kết thúc trước start; từ hi: mọi gene bắt đầu sau end
+        lo = np.searchsorted(max_ends, start, side="right")
+        hi = np.searchsorted(starts, end, side="left")
+        candidates = np.arange(lo, hi)
+        return records[candidates[ends[candidates] > start]].tolist()
+
+    def annotate(self, chrom: str, start: int, end: int) -> tuple[list[dict], str]:
+        """(danh sách OMIM không trùng, ACMG class thô) cho một khoảng."""
+        omim_annotations = []
+        seen = set()
+        classes = []
+        for record in self.overlapping(chrom, start, end):
+            omim_id, omim_phenotype, acmg_class = self._records[record]
+            if acmg_class.isdigit():
+                classes.append(acmg_class)
+            if omim_id and omim_phenotype and (omim_id, omim_phenotype) not in seen:
+                seen.add((omim_id, omim_phenotype))
+                omim_annotations.append({"OMIM_ID": omim_id, "OMIM_phenotype": omim_phenotype})
+
+        if self.has_class:
+            acmg_class = max(classes, default="")
+        else:
+            acmg_class = "3" if omim_annotations else ""
+        return omim_annotations, acmg_class
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, String, Enum, Date, Integer
+from sqlalchemy import Column, String, Enum, Date, DateTime, Integer, JSON, Index, UniqueConstraint
 from database import Base
 from common.models import Chromosome, ReferenceGenome
-from datetime import date
+from datetime import date, datetime
+from enum import Enum as PyEnum
 
 
 class Annotation(Base):
@@ -25,3 +26,46 @@ class AnnotationDatabase(Base):
     reference_genome = Column(Enum(ReferenceGenome), nullable=False)
     description = Column(String(2048), nullable=True)
     annotation_url = Column(String(512), nullable=False)
+
+
+class AnnotationCache(Base):
+    """Kết quả annotate (OMIM + ACMG class) theo khoảng, dùng lại cho các segment cùng tọa độ."""
+
+    __tablename__ = "annotation_cache"
+    __table_args__ = (
+        UniqueConstraint("genome_build", "chromosome", "start", "end", "sv_type", name="uq_annotation_cache_key"),
+        Index("ix_annotation_cache_lookup", "genome_build", "chromosome", "sv_type", "start"),
+    )
+
+    id = Column(String(64), primary_key=True, index=True)
+    genome_build = Column(String(16), nullable=False)
+    chromosome = Column(Enum(Chromosome), nullable=False)
+    start = Column(Integer, nullable=False)
+    end = Column(Integer, nullable=False)
+    sv_type = Column(String(8), nullable=False)
+    omim = Column(JSON, nullable=False)  # [{"OMIM_ID": ..., "OMIM_phenotype": ...}]
+    acmg_class = Column(String(32), nullable=False, default="")
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+
+
+class AnnotationJobStatus(PyEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+
+class AnnotationJob(Base):
+    """Job annotate nền cho một hoặc nhiều result (xem AnnotationJobService)."""
+
+    __tablename__ = "annotation_jobs"
+
+    id = Column(String(64), primary_key=True, index=True)
+    # sha256 của danh sách result_id đã sắp (việc gộp yêu cầu trùng so theo từng result_id)
+    dedup_key = Column(String(64), index=True, nullable=False)
+    result_ids = Column(JSON, nullable=False)
+    status = Column(Enum(AnnotationJobStatus), nullable=False, default=AnnotationJobStatus.QUEUED)
+    error = Column(String(2048), nullable=True)
+    created_at = Column(DateTime, default=datetime.now, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,16 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from .models import AnnotationJobStatus
+
+
+class AnnotationJobResponse(BaseModel):
+    job_id: str
+    status: AnnotationJobStatus
+    result_ids: List[str]
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
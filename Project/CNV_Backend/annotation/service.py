@@ -1,5 +1,205 @@
+import hashlib
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import List, Optional
 
-class SampleService:
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import AnnotationConfig, JobConfig
+from common.models import Chromosome
+from result.models import Result
+from utils.queue_util import QueueUtil
+from .models import AnnotationCache, AnnotationJob, AnnotationJobStatus
+
+logger = logging.getLogger(__name__)
+
+# Khóa cache của một khoảng: (chromosome, start, end, sv_type)
+IntervalKey = tuple[Chromosome, int, int, str]
+
+
+class AnnotationCacheService:
+    @staticmethod
+    def lookup(
+        db: Session,
+        genome_build: str,
+        keys: list[IntervalKey],
+        tolerance: Optional[int] = None,
+    ) -> dict[IntervalKey, tuple[list[dict], str]]:
+        """
+        {khóa: (danh sách OMIM, ACMG class)} cho các khóa đã có trong cache. Với tolerance > 0,
+        entry có start và end lệch không quá tolerance bp cũng khớp (chọn entry lệch ít nhất).
+        """
+        if not keys or not AnnotationConfig.CACHE_ENABLED:
+            return {}
+        tolerance = AnnotationConfig.CACHE_TOLERANCE if tolerance is None else tolerance
+
+        entries = (
+            db.query(AnnotationCache)
+            .filter(
+                AnnotationCache.genome_build == genome_build,
+                AnnotationCache.chromosome.in_({key[0] for key in keys}),
+                AnnotationCache.sv_type.in_({key[3] for key in keys}),
+                AnnotationCache.start >= min(key[1] for key in keys) - tolerance,
+                AnnotationCache.start <= max(key[1] for key in keys) + tolerance,
+            )
+            .all()
+        )
+        by_group = defaultdict(list)
+        for entry in entries:
+            by_group[(entry.chromosome, entry.sv_type)].append(entry)
+
+        hits = {}
+        for key in keys:
+            chromosome, start, end, sv_type = key
+            best = None
+            for entry in by_group.get((chromosome, sv_type), ()):
+                distance = max(abs(entry.start - start), abs(entry.end - end))
+                if distance <= tolerance and (best is None or distance < best[0]):
+                    best = (distance, entry)
+            if best is not None:
+                hits[key] = (best[1].omim, best[1].acmg_class)
+        return hits
+
+    @staticmethod
+    def store(
+        db: Session,
+        genome_build: str,
+        annotations: dict[IntervalKey, tuple[list[dict], str]],
+    ) -> None:
+        """Ghi các khoảng vừa annotate vào cache (commit riêng; trùng khóa do ghi đồng thời thì bỏ qua)."""
+        if not annotations or not AnnotationConfig.CACHE_ENABLED:
+            return
+        for (chromosome, start, end, sv_type), (omim, acmg_class) in annotations.items():
+            try:
+                db.add(
+                    AnnotationCache(
+                        id=uuid.uuid4().hex,
+                        genome_build=genome_build,
+                        chromosome=chromosome,
+                        start=start,
+                        end=end,
+                        sv_type=sv_type,
+                        omim=omim,
+                        acmg_class=acmg_class,
+                    )
+                )
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+
+
+_submit_lock = threading.Lock()
+
+
+class AnnotationJobService:
     @staticmethod
-    def save():
-        pass
\ No newline at end of file
+    def _dedup_key(result_ids: List[str]) -> str:
+        return hashlib.sha256(",".join(sorted(set(result_ids))).encode()).hexdigest()
+
+    @staticmethod
+    def submit(db: Session, result_ids: List[str]) -> AnnotationJob:
+        """
+        Đưa việc annotate các result vào hàng đợi. Result đã nằm trong một job chờ/chạy (trong
+        JobConfig.JOB_TIMEOUT) không được annotate lần nữa: nếu mọi result đã có job thì trả về job
+        mới nhất chứa chúng, ngược lại tạo job chỉ cho các result còn lại.
+        """
+        found = {row[0] for row in db.query(Result.id).filter(Result.id.in_(set(result_ids))).all()}
+        missing = set(result_ids) - found
+        if missing:
+            raise ValueError(f"Result {', '.join(sorted(missing))} not found")
+
+        with _submit_lock:
+            # result_ids là cột JSON nên lọc giao nhau trong Python trên các job đang hoạt động
+            active = (
+                db.query(AnnotationJob)
+                .filter(
+                    AnnotationJob.status.in_([AnnotationJobStatus.QUEUED, AnnotationJobStatus.RUNNING]),
+                    AnnotationJob.created_at >= datetime.now() - timedelta(seconds=JobConfig.JOB_TIMEOUT),
+                )
+                .order_by(AnnotationJob.created_at.desc())
+                .all()
+            )
+            requested = set(result_ids)
+            covering = [job for job in active if requested & set(job.result_ids)]
+            uncovered = requested.difference(*(job.result_ids for job in covering))
+            if not uncovered:
+                return next((job for job in covering if requested <= set(job.result_ids)), covering[0])
+
+            job = AnnotationJob(
+                id=uuid.uuid4().hex,
+                dedup_key=AnnotationJobService._dedup_key(list(uncovered)),
+                result_ids=sorted(uncovered),
+                status=AnnotationJobStatus.QUEUED,
+            )
+            db.add(job)
+            db.commit()
+
+        try:
+            QueueUtil.enqueue(run_annotation_job, job.id)
+        except Exception as e:
+            job.status = AnnotationJobStatus.FAILED
+            job.error = f"Could not enqueue job: {e}"[:2048]
+            job.finished_at = datetime.now()
+            db.commit()
+            raise
+        return job
+
+    @staticmethod
+    def fail_unfinished(db: Session) -> int:
+        """
+        Đánh dấu FAILED mọi job còn chờ/chạy; trả về số job đã đánh dấu. Dùng với backend local khi
+        API khởi động hoặc dừng: thread pool mất theo tiến trình nên các job này không bao giờ kết thúc.
+        """
+        count = (
+            db.query(AnnotationJob)
+            .filter(AnnotationJob.status.in_([AnnotationJobStatus.QUEUED, AnnotationJobStatus.RUNNING]))
+            .update(
+                {
+                    AnnotationJob.status: AnnotationJobStatus.FAILED,
+                    AnnotationJob.error: "Interrupted: API process stopped",
+                    AnnotationJob.finished_at: datetime.now(),
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        return count
+
+    @staticmethod
+    def get(db: Session, job_id: str) -> AnnotationJob:
+        job = db.query(AnnotationJob).filter(AnnotationJob.id == job_id).first()
+        if not job:
+            raise ValueError(f"Annotation job {job_id} not found")
+        return job
+
+
+def run_annotation_job(job_id: str) -> None:
+    """Chạy một job annotate (trong thread pool hoặc RQ worker), cập nhật trạng thái job."""
+    from database import SessionLocal
+    from aberration.service import AberrationService
+
+    db = SessionLocal()
+    try:
+        job = db.query(AnnotationJob).filter(AnnotationJob.id == job_id).first()
+        if job is None:
+            return
+        job.status = AnnotationJobStatus.RUNNING
+        job.started_at = datetime.now()
+        db.commit()
+
+        try:
+            AberrationService.annotate_results(job.result_ids, db, raise_errors=True)
+            job.status = AnnotationJobStatus.FINISHED
+        except Exception as e:
+            logger.warning("Annotation job %s failed: %s", job_id, e)
+            db.rollback()
+            job.status = AnnotationJobStatus.FAILED
+            job.error = str(e)[:2048]
+        job.finished_at = datetime.now()
+        db.commit()
+    finally:
+        db.close()
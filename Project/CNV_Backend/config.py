@@ -19,7 +19,47 @@ class MinioConfig:
     SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "miniorootpw")
     USE_SSL = os.getenv("MINIO_USE_SSL", "false").lower() == "true"
     BUCKET = os.getenv("MINIO_BUCKET", "cnv-bucket")
+    # Kích thước mỗi part khi upload multipart (MinIO/S3 yêu cầu tối thiểu 5 MiB)
+    PART_SIZE = max(int(os.getenv("MINIO_PART_SIZE", str(16 * 1024 * 1024))), 5 * 1024 * 1024)
+    # Số file upload đồng thời trong save_many
+    UPLOAD_WORKERS = int(os.getenv("MINIO_UPLOAD_WORKERS", "4"))
 
 
 class SandboxConfig:
     SANDBOX_URL = os.getenv("SANDBOX_URL", "http://localhost:8001/api/v1/sandbox")
+
+
+class ResultConfig:
+    # Cách lưu bin của result: "rows" (bảng sample_bins), "db" (blob nén trong result_bin_tracks)
+    # hoặc "minio" (blob nén trên MinIO, result_bin_tracks giữ đường dẫn)
+    BIN_STORAGE = os.getenv("RESULT_BIN_STORAGE", "rows").lower()
+
+
+class AnnotationConfig:
+    # Cache annotate theo (build, chromosome, start, end, SV type); tolerance = độ lệch breakpoint (bp) vẫn coi là trùng
+    CACHE_ENABLED = os.getenv("ANNOTATION_CACHE_ENABLED", "true").lower() == "true"
+    CACHE_TOLERANCE = int(os.getenv("ANNOTATION_CACHE_TOLERANCE", "0"))
+    # "annotsv" (chạy AnnotSV) hoặc "local" (bảng gene/OMIM cục bộ, xem annotation/engine.py)
+    ENGINE = os.getenv("ANNOTATION_ENGINE", "annotsv").lower()
+    # Đường dẫn bảng cho engine local; {build} được thay bằng GRCh37 / GRCh38
+    LOCAL_TABLE = os.getenv(
+        "ANNOTATION_LOCAL_TABLE",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "annotation", "data", "omim_genes_{build}.tsv"),
+    )
+
+
+class ReportConfig:
+    # Giữ report đã dựng trong bao nhiêu giây (0 = không cache)
+    CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", "0"))
+    CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "256"))
+
+
+class JobConfig:
+    # "local" (thread pool trong tiến trình API) hoặc "rq" (RQ/Redis, worker chạy riêng)
+    BACKEND = os.getenv("JOB_QUEUE_BACKEND", "local").lower()
+    MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", "2"))
+    QUEUE_NAME = os.getenv("JOB_QUEUE_NAME", "annotation_queue")
+    REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+    REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+    # Job queued/running lâu hơn ngưỡng này (giây) coi như đã chết, không dùng để gộp yêu cầu trùng
+    JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", "3600"))
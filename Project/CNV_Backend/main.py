@@ -5,11 +5,15 @@ import algorithm
 import result
 import aberration
 # Import models to register them with Base
-from sample.models import Sample
+from sample.models import Sample, SampleFile
 from algorithm.models import Algorithm, AlgorithmParameter
-from result.models import Result, SampleSegment, SampleBin
+from result.models import Result, SampleSegment, SampleBin, ResultBinTrack, ResultBinSummary
 from aberration.models import Aberration, AberrationSegment, AberrationThreshold
-from database import Base, engine
+from annotation.models import AnnotationCache, AnnotationJob
+from annotation.service import AnnotationJobService
+from config import JobConfig
+from database import Base, engine, SessionLocal
+from utils.queue_util import QueueUtil
 from fastapi.middleware.cors import CORSMiddleware
 import os
 
@@ -44,6 +48,30 @@ app.include_router(algorithm.router, prefix="/algorithms", tags=["algorithms"])
 app.include_router(result.router, prefix="/results", tags=["results"])
 
 
+def fail_local_jobs():
+    # Job của backend local chạy trong thread pool của tiến trình API, dừng API là mất job
+    if JobConfig.BACKEND != "local":
+        return
+    db = SessionLocal()
+    try:
+        AnnotationJobService.fail_unfinished(db)
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def fail_interrupted_jobs():
+    # Job còn chờ/chạy từ lần chạy trước bị dừng đột ngột (kill, crash)
+    fail_local_jobs()
+
+
+@app.on_event("shutdown")
+def shutdown_job_queue():
+    # Dừng thread pool của hàng đợi job local (không làm gì với backend rq)
+    QueueUtil.shutdown()
+    fail_local_jobs()
+
+
 @app.get("/")
 def read_root(request: Request):
     return {
@@ -0,0 +1,116 @@
+"""
+Tóm tắt nhiều độ phân giải của bin track, dùng cho viewer khi zoom.
+
+Level k gộp SUMMARY_FACTOR**k bin liên tiếp trong cùng NST thành một cửa sổ (mean/min/max CN, số bin);
+level 0 là bin gốc. Các level được dựng một lần lúc ingest và lưu vào result_bin_summaries, mỗi level
+một blob npz; level thô nhất có không quá SUMMARY_MIN_WINDOWS cửa sổ (hoặc một cửa sổ mỗi NST).
+"""
+import io
+
+import numpy as np
+
+from common.models import Chromosome
+
+SUMMARY_FACTOR = 4
+SUMMARY_MIN_WINDOWS = 256
+# Số điểm mặc định / tối đa mà endpoint bins trả về cho một vùng
+DEFAULT_POINTS = 4000
+MAX_POINTS = 200_000
+
+_CHROMOSOME_RANK = {c.value: rank for rank, c in enumerate(Chromosome)}
+WINDOW_COLUMNS = ("chromosome", "start", "end", "mean", "min", "max", "bin_count")
+
+
+def _as_arrays(bins: dict) -> dict[str, np.ndarray]:
+    """Cột bin (list hoặc numpy, chromosome là enum hoặc chuỗi) -> numpy, sắp theo (NST, start)."""
+    chromosomes = np.array([getattr(c, "value", c) for c in bins["chromosome"]], dtype=str)
+    starts = np.asarray(bins["start"], dtype=np.int64)
+    ranks = np.array([_CHROMOSOME_RANK.get(c, len(_CHROMOSOME_RANK)) for c in chromosomes])
+    order = np.lexsort((starts, chromosomes, ranks))
+    copy_numbers = np.asarray(bins["copy_number"])
+    if copy_numbers.dtype in (np.float32, np.float16):
+        # Qua chuỗi để giữ giá trị ngắn nhất của float32 (2.0942 thay vì 2.094199895858765)
+        copy_numbers = copy_numbers.astype(str)
+    return {
+        "chromosome": chromosomes[order],
+        "start": starts[order],
+        "end": np.asarray(bins["end"], dtype=np.int64)[order],
+        "copy_number": copy_numbers.astype(np.float64)[order],
+    }
+
+
+def level_zero(bins: dict) -> dict[str, np.ndarray]:
+    """Bin gốc dưới dạng cửa sổ một bin."""
+    arrays = _as_arrays(bins)
+    copy_numbers = arrays["copy_number"]
+    return {
+        "chromosome": arrays["chromosome"],
+        "start": arrays["start"],
+        "end": arrays["end"],
+        "mean": copy_numbers,
+        "min": copy_numbers,
+        "max": copy_numbers,
+        "bin_count": np.ones(len(copy_numbers), dtype=np.int64),
+    }
+
+
+def build_levels(bins: dict) -> list[dict[str, np.ndarray]]:
+    """Dựng level 1, 2, ... (phần tử thứ i là level i + 1)."""
+    arrays = _as_arrays(bins)
+    chromosomes = arrays["chromosome"]
+    n = len(chromosomes)
+    if n == 0:
+        return []
+
+    # Vị trí của bin trong NST của nó
+    run_starts = np.flatnonzero(np.r_[True, chromosomes[1:] != chromosomes[:-1]])
+    run_lengths = np.diff(np.r_[run_starts, n])
+    index_in_run = np.arange(n) - np.repeat(run_starts, run_lengths)
+
+    levels = []
+    window_bins = 1
+    while True:
+        window_bins *= SUMMARY_FACTOR
+        firsts = np.flatnonzero(index_in_run % window_bins == 0)
+        lasts = np.r_[firsts[1:], n] - 1
+        copy_numbers = arrays["copy_number"]
+        bin_count = lasts - firsts + 1
+        levels.append({
+            "chromosome": chromosomes[firsts],
+            "start": arrays["start"][firsts],
+            "end": arrays["end"][lasts],
+            "mean": np.add.reduceat(copy_numbers, firsts) / bin_count,
+            "min": np.minimum.reduceat(copy_numbers, firsts),
+            "max": np.maximum.reduceat(copy_numbers, firsts),
+            "bin_count": bin_count,
+        })
+        if len(firsts) <= max(SUMMARY_MIN_WINDOWS, len(run_starts)):
+            return levels
+
+
+def encode_level(windows: dict[str, np.ndarray]) -> bytes:
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **windows)
+    return buffer.getvalue()
+
+
+def decode_level(blob: bytes) -> dict[str, np.ndarray]:
+    with np.load(io.BytesIO(blob), allow_pickle=False) as data:
+        return {name: data[name] for name in WINDOW_COLUMNS}
+
+
+def region_mask(
+    windows: dict[str, np.ndarray],
+    chromosome: str | None = None,
+    start: int | None = None,
+    end: int | None = None,
+) -> np.ndarray:
+    """Cửa sổ giao với vùng (chromosome, [start, end)); bỏ trống = toàn bộ."""
+    mask = np.ones(len(windows["start"]), dtype=bool)
+    if chromosome is not None:
+        mask &= windows["chromosome"] == chromosome
+    if start is not None:
+        mask &= windows["end"] > start
+    if end is not None:
+        mask &= windows["start"] < end
+    return mask
@@ -0,0 +1,121 @@
+"""
+Bin track dạng cột nén của một result (thay cho một dòng sample_bins mỗi bin).
+
+Blob = MAGIC + zlib(header + các mảng little-endian):
+- header: uint32 độ dài + JSON {"version", "bin_size", "chromosomes": [[chrom, start đầu, số bin, end cuối], ...]}
+- copy_number float32, read_count int32, gc_content float16 (mỗi mảng đủ n bin, theo thứ tự file)
+
+start/end không được lưu: start = start đầu + i * bin_size, end = min(start + bin_size, end cuối).
+Bin không nằm trên lưới đều (mỗi NST một đoạn liên tục) thì encode() báo ValueError.
+"""
+import json
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b"CNVBIN\x00\x01"
+ENCODING_VERSION = 1
+COMPRESSION_LEVEL = 6
+
+_COLUMN_DTYPES = (
+    ("copy_number", np.dtype("<f4")),
+    ("read_count", np.dtype("<i4")),
+    ("gc_content", np.dtype("<f2")),
+)
+
+
+def _infer_bin_size(starts: np.ndarray, ends: np.ndarray, bounds: list[int]) -> int:
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        if last - first > 1:
+            return int(starts[first + 1] - starts[first])
+    return int(ends[0] - starts[0])
+
+
+def encode(columns: dict[str, list], bin_size: int | None = None) -> tuple[bytes, int]:
+    """Mã hóa các cột bin (như _parse_tsv_columns trả về) thành (blob, bin_size)."""
+    chromosomes = [getattr(c, "value", c) for c in columns["chromosome"]]
+    starts = np.asarray(columns["start"], dtype=np.int64)
+    ends = np.asarray(columns["end"], dtype=np.int64)
+    if len(starts) == 0:
+        raise ValueError("bin track is empty")
+
+    # Mỗi NST phải là một đoạn liên tục trong file
+    bounds = [0] + [
+        i for i in range(1, len(chromosomes)) if chromosomes[i] != chromosomes[i - 1]
+    ] + [len(chromosomes)]
+    runs = [chromosomes[first] for first in bounds[:-1]]
+    if len(set(runs)) != len(runs):
+        raise ValueError("bins of a chromosome are not contiguous")
+
+    bin_size = bin_size or _infer_bin_size(starts, ends, bounds)
+    if bin_size <= 0:
+        raise ValueError(f"invalid bin size {bin_size}")
+
+    layout = []
+    for chrom, first, last in zip(runs, bounds[:-1], bounds[1:]):
+        n = last - first
+        expected_starts = starts[first] + np.arange(n, dtype=np.int64) * bin_size
+        expected_ends = np.minimum(expected_starts + bin_size, ends[last - 1])
+        if not (
+            np.array_equal(starts[first:last], expected_starts)
+            and np.array_equal(ends[first:last], expected_ends)
+        ):
+            raise ValueError(f"bins of chromosome {chrom} are not on a {bin_size} bp grid")
+        layout.append([chrom, int(starts[first]), n, int(ends[last - 1])])
+
+    read_counts = np.asarray(columns["read_count"], dtype=np.int64)
+    limits = np.iinfo(np.int32)
+    if read_counts.min() < limits.min or read_counts.max() > limits.max:
+        raise ValueError("read_count does not fit in int32")
+
+    header = json.dumps(
+        {"version": ENCODING_VERSION, "bin_size": bin_size, "chromosomes": layout}
+    ).encode()
+    payload = [struct.pack("<I", len(header)), header]
+    for name, dtype in _COLUMN_DTYPES:
+        payload.append(np.asarray(columns[name], dtype=dtype).tobytes())
+    return MAGIC + zlib.compress(b"".join(payload), COMPRESSION_LEVEL), bin_size
+
+
+def decode(blob: bytes) -> dict[str, np.ndarray]:
+    """Giải mã blob thành các cột numpy: chromosome, start, end, copy_number, read_count, gc_content."""
+    if not blob.startswith(MAGIC):
+        raise ValueError("not a bin track blob")
+    payload = zlib.decompress(blob[len(MAGIC):])
+    (header_length,) = struct.unpack_from("<I", payload)
+    offset = 4 + header_length
+    header = json.loads(payload[4:offset])
+    if header["version"] != ENCODING_VERSION:
+        raise ValueError(f"unsupported bin track version {header['version']}")
+
+    bin_size = header["bin_size"]
+    layout = header["chromosomes"]
+    counts = np.array([n for _, _, n, _ in layout], dtype=np.int64)
+    total = int(counts.sum())
+
+    # start = start đầu của NST + vị trí trong NST * bin_size
+    run_offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    index_in_run = np.arange(total, dtype=np.int64) - run_offsets
+    starts = np.repeat([first for _, first, _, _ in layout], counts).astype(np.int64) + index_in_run * bin_size
+    ends = np.minimum(starts + bin_size, np.repeat([last for _, _, _, last in layout], counts))
+
+    columns = {
+        "chromosome": np.repeat(np.array([chrom for chrom, _, _, _ in layout], dtype=object), counts),
+        "start": starts,
+        "end": ends,
+    }
+    for name, dtype in _COLUMN_DTYPES:
+        columns[name] = np.frombuffer(payload, dtype=dtype, count=total, offset=offset)
+        offset += total * dtype.itemsize
+    return columns
+
+
+def to_python(values: np.ndarray) -> list:
+    """
+    Mảng numpy -> list Python. float32/float16 đi qua biểu diễn ngắn nhất của chính kiểu đó
+    (2.0942 thay vì 2.094199895858765).
+    """
+    if values.dtype in (np.float32, np.float16):
+        return values.astype(str).astype(np.float64).tolist()
+    return values.tolist()
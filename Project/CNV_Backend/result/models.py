@@ -7,11 +7,13 @@ from sqlalchemy import (
     Integer,
     Float,
     Boolean,
+    LargeBinary,
 )
+from sqlalchemy.dialects.mysql import LONGBLOB
 from database import Base
 from enum import Enum
 from datetime import datetime
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from common.models import Chromosome, ReferenceGenome
 
 
@@ -52,6 +54,17 @@ class Result(Base):
     bins = relationship(
         "SampleBin", back_populates="result", cascade="all, delete-orphan"
     )
+    bin_track = relationship(
+        "ResultBinTrack",
+        back_populates="result",
+        uselist=False,
+        cascade="all, delete-orphan",
+    )
+    bin_summaries = relationship(
+        "ResultBinSummary", back_populates="result", cascade="all, delete-orphan"
+    )
+    # Chỉ đọc: aberration được tạo/xóa qua AberrationService và FK ondelete
+    aberration = relationship("Aberration", uselist=False, viewonly=True)
 
 
 class SampleSegment(Base):
@@ -92,3 +105,40 @@ class SampleBin(Base):
     gc_content = Column(Float, nullable=False)
 
     result = relationship("Result", back_populates="bins")
+
+
+class ResultBinTrack(Base):
+    """Bin của một result dưới dạng blob cột nén (xem result/bin_track.py), thay cho các dòng sample_bins."""
+
+    __tablename__ = "result_bin_tracks"
+
+    result_id = Column(
+        String(64),
+        ForeignKey("results.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    bin_size = Column(Integer, nullable=False)
+    bin_count = Column(Integer, nullable=False)
+    # Blob lưu trong DB, hoặc None nếu blob nằm ở MinIO (object_url = minio://bucket/object)
+    data = deferred(Column(LargeBinary().with_variant(LONGBLOB, "mysql"), nullable=True))
+    object_url = Column(String(256), nullable=True)
+
+    result = relationship("Result", back_populates="bin_track")
+
+
+class ResultBinSummary(Base):
+    """Một level tóm tắt (mean/min/max CN theo cửa sổ) của bin track, xem result/bin_summary.py."""
+
+    __tablename__ = "result_bin_summaries"
+
+    result_id = Column(
+        String(64),
+        ForeignKey("results.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    level = Column(Integer, primary_key=True)
+    window_bins = Column(Integer, nullable=False)
+    window_count = Column(Integer, nullable=False)
+    data = Column(LargeBinary().with_variant(LONGBLOB, "mysql"), nullable=False)
+
+    result = relationship("Result", back_populates="bin_summaries")
@@ -0,0 +1,197 @@
+"""
+Dựng report của result / cycle từ các result đã nạp sẵn quan hệ.
+
+load_results() lấy result cùng sample, algorithm, parameter và aberration bằng một query JOIN,
+aberration segments bằng một query selectin thứ hai; số query không phụ thuộc số embryo.
+ReportCache giữ report đã dựng trong ReportConfig.CACHE_TTL giây (0 = tắt), bị xóa khi result,
+aberration hoặc sample thay đổi trong tiến trình này. Report còn segment chờ annotate không được cache,
+vì job annotate có thể chạy ở tiến trình khác (RQ worker) và không xóa được cache của API.
+"""
+import threading
+import time
+from typing import Hashable, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
+
+from config import ReportConfig
+from aberration.models import Aberration
+from .models import Result
+from .schemas import (
+    ResultReportResponse,
+    SampleInfo,
+    AlgorithmInfo,
+    AlgorithmParameterInfo,
+    AberrationInfo,
+    AberrationSegmentInfo,
+    AberrationSummary,
+    EmbryoInfo,
+)
+
+# Số bệnh tối đa hiển thị cho một segment
+MAX_DISEASES = 10
+
+
+def load_results(db: Session, result_ids: Iterable[str]) -> list[Result]:
+    stmt = (
+        select(Result)
+        .where(Result.id.in_(set(result_ids)))
+        .options(
+            joinedload(Result.sample),
+            joinedload(Result.algorithm),
+            joinedload(Result.algorithm_parameter),
+            joinedload(Result.aberration).selectinload(Aberration.aberration_segments),
+        )
+    )
+    return db.execute(stmt).unique().scalars().all()
+
+
+def needs_annotation(result: Result) -> bool:
+    """Result chưa có aberration hoặc còn segment chưa annotate (embryo không có aberration thì không)."""
+    aberration = result.aberration
+    if aberration is None:
+        return True
+    return any(seg.annotation_for_segment is None for seg in aberration.aberration_segments)
+
+
+def _diseases(annotations) -> Optional[list[str]]:
+    if not annotations:
+        return None
+    return [f"{ann['OMIM_phenotype']} ({ann['OMIM_ID']})" for ann in annotations[:MAX_DISEASES]]
+
+
+def build_report(result: Result) -> ResultReportResponse:
+    sample = result.sample
+    if sample is None:
+        raise ValueError(f"Sample {result.sample_id} not found")
+    algorithm = result.algorithm
+    if algorithm is None:
+        raise ValueError(f"Algorithm {result.algorithm_id} not found")
+
+    sample_info = SampleInfo(
+        flowcell_id=sample.flowcell_id,
+        cycle_id=sample.cycle_id,
+        embryo_id=sample.embryo_id,
+        cell_type=sample.cell_type.value,
+        reference_genome=result.reference_genome.value,
+        date=sample.date,
+    )
+
+    algorithm_params = []
+    if result.algorithm_parameter:
+        for param_name, param_detail in result.algorithm_parameter.value.items():
+            algorithm_params.append(
+                AlgorithmParameterInfo(
+                    name=param_name,
+                    type=param_detail.get("type", ""),
+                    default=param_detail.get("default", None),
+                    value=param_detail.get("value", None),
+                )
+            )
+    algorithm_info = AlgorithmInfo(
+        name=algorithm.name, version=algorithm.version, parameters=algorithm_params
+    )
+
+    aberration_summary = []
+    aberration_segments = []
+    aberration = result.aberration
+    if aberration:
+        if aberration.aberration_summary:
+            aberration_summary = aberration.aberration_summary
+        for segment in aberration.aberration_segments:
+            aberration_segments.append(
+                AberrationSegmentInfo(
+                    chromosome=segment.chromosome.value,
+                    start=segment.start,
+                    end=segment.end,
+                    copy_number=segment.copy_number,
+                    confidence=segment.confidence,
+                    size=segment.size,
+                    type=segment.type.value,
+                    mosaicism=segment.mosaicism,
+                    aberration_code=segment.aberration_code,
+                    assessment=segment.assessment.value,
+                    annotation_for_segment=_diseases(segment.annotation_for_segment),
+                    man_change=segment.man_change,
+                )
+            )
+
+    return ResultReportResponse(
+        result_id=result.id,
+        sample=sample_info,
+        algorithm=algorithm_info,
+        aberration=AberrationInfo(
+            aberration_summary=aberration_summary,
+            aberration_segments=aberration_segments,
+        ),
+    )
+
+
+def build_embryo(result: Result) -> EmbryoInfo:
+    sample = result.sample
+    aberrations = []
+    if result.aberration:
+        for segment in result.aberration.aberration_segments:
+            aberrations.append(
+                AberrationSummary(
+                    code=segment.aberration_code,
+                    mosaic=segment.mosaicism,
+                    size=segment.size / 1_000_000,  # Convert to Mbp
+                    diseases=_diseases(segment.annotation_for_segment),
+                    assessment=segment.assessment.value,
+                )
+            )
+    return EmbryoInfo(
+        embryo_id=sample.embryo_id,
+        cell_type=sample.cell_type.value,
+        call="Abnormal" if aberrations else "Normal",
+        abberations=aberrations,
+    )
+
+
+_cache: dict[Hashable, tuple[float, frozenset, object]] = {}
+_cache_lock = threading.Lock()
+
+
+class ReportCache:
+    @staticmethod
+    def enabled() -> bool:
+        return ReportConfig.CACHE_TTL > 0
+
+    @staticmethod
+    def get(key: Hashable):
+        if not ReportCache.enabled():
+            return None
+        with _cache_lock:
+            entry = _cache.get(key)
+            if entry is None:
+                return None
+            expires_at, _, report = entry
+            if expires_at < time.monotonic():
+                del _cache[key]
+                return None
+            return report
+
+    @staticmethod
+    def put(key: Hashable, result_ids: Iterable[str], report) -> None:
+        if not ReportCache.enabled():
+            return
+        with _cache_lock:
+            if len(_cache) >= ReportConfig.CACHE_MAX_ENTRIES:
+                now = time.monotonic()
+                for stale in [k for k, (expires_at, _, _) in _cache.items() if expires_at < now]:
+                    del _cache[stale]
+                if len(_cache) >= ReportConfig.CACHE_MAX_ENTRIES:
+                    _cache.pop(next(iter(_cache)))
+            _cache[key] = (time.monotonic() + ReportConfig.CACHE_TTL, frozenset(result_ids), report)
+
+    @staticmethod
+    def invalidate(result_ids: Optional[Iterable[str]] = None) -> None:
+        """Xóa report chứa một trong các result; None = xóa hết."""
+        with _cache_lock:
+            if result_ids is None:
+                _cache.clear()
+                return
+            result_ids = set(result_ids)
+            for key in [k for k, (_, ids, _) in _cache.items() if ids & result_ids]:
+                del _cache[key]
@@ -7,7 +7,7 @@ from fastapi import (
     status,
     Request,
     Form,
-    BackgroundTasks
+    Query,
 )
 import time
 
@@ -16,10 +16,12 @@ from typing import List
 from sqlalchemy.orm import Session
 from database import get_db
 from .service import ResultService
-from .schemas import ResultSummary, ResultDto, ResultReportResponse, CycleReportRequest
+from .schemas import ResultSummary, ResultDto, ResultReportResponse, CycleReportRequest, BinWindowsResponse
+from .bin_summary import DEFAULT_POINTS, MAX_POINTS
+from utils.encoding_util import EncodingUtil
 from common.schemas import BasicResponse
-from database import SessionLocal
-from aberration.service import AberrationService
+from annotation.schemas import AnnotationJobResponse
+from annotation.service import AnnotationJobService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -83,14 +85,61 @@ def get_all_results(db: Session = Depends(get_db)):
 
 
 @router.get("/{result_id}", response_model=ResultDto)
-def get_result(result_id: str, db: Session = Depends(get_db)):
+def get_result(result_id: str, request: Request, db: Session = Depends(get_db)):
     try:
+        # Client chấp nhận msgpack/Arrow: trả dạng cột, bỏ qua model Pydantic từng bin
+        media_type = EncodingUtil.negotiate_media_type(request.headers.get("accept"))
+        if media_type:
+            return EncodingUtil.columnar_response(
+                ResultService.get_columns(db=db, result_id=result_id),
+                media_type,
+                table_key="bins",
+                accept_encoding=request.headers.get("accept-encoding"),
+            )
         result = ResultService.get(db=db, result_id=result_id)
         return result
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
 
 
+@router.get("/{result_id}/bins", response_model=BinWindowsResponse)
+def get_result_bins(
+    result_id: str,
+    request: Request,
+    chromosome: str = Query(None),
+    start: int = Query(None, ge=0),
+    end: int = Query(None, ge=0),
+    points: int = Query(DEFAULT_POINTS, ge=1, le=MAX_POINTS),
+    db: Session = Depends(get_db),
+):
+    try:
+        media_type = EncodingUtil.negotiate_media_type(request.headers.get("accept"))
+        if media_type:
+            return EncodingUtil.columnar_response(
+                ResultService.get_bin_windows(
+                    db=db,
+                    result_id=result_id,
+                    chromosome=chromosome,
+                    start=start,
+                    end=end,
+                    points=points,
+                ),
+                media_type,
+                table_key="bins",
+                accept_encoding=request.headers.get("accept-encoding"),
+            )
+        return ResultService.get_bins(
+            db=db,
+            result_id=result_id,
+            chromosome=chromosome,
+            start=start,
+            end=end,
+            points=points,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
 @router.get("/{result_id}/report", response_model=ResultReportResponse)
 def get_result_report(result_id: str, db: Session = Depends(get_db)):
     try:
@@ -109,25 +158,38 @@ def delete_result(result_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     
 
-@router.post("/{result_id}/annotation", status_code=202)
-def start_result_annotation(result_id: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    try:
-        def _bg(rid: str):
-            db_session = SessionLocal()
-            try:
-                AberrationService.annotate_result(rid, db_session)
-            finally:
-                db_session.close()
+def _job_response(job) -> AnnotationJobResponse:
+    return AnnotationJobResponse(
+        job_id=job.id,
+        status=job.status,
+        result_ids=job.result_ids,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
 
-        # schedule background annotation
-        background_tasks.add_task(_bg, result_id)
 
-        return JSONResponse(status_code=202, content={"message": "Annotation scheduled", "result_id": result_id})
+@router.post("/{result_id}/annotation", status_code=202, response_model=AnnotationJobResponse)
+def start_result_annotation(result_id: str, db: Session = Depends(get_db)):
+    try:
+        job = AnnotationJobService.submit(db=db, result_ids=[result_id])
+        return _job_response(job)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except Exception as e:
         logger.exception(e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Internal error")
 
 
+@router.get("/annotation-jobs/{job_id}", response_model=AnnotationJobResponse)
+def get_annotation_job(job_id: str, db: Session = Depends(get_db)):
+    try:
+        return _job_response(AnnotationJobService.get(db=db, job_id=job_id))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
 @router.post("/cycle-report")
 def cycle_report(req: CycleReportRequest, db: Session = Depends(get_db)):
     try:
@@ -34,6 +34,23 @@ class ResultDto(ResultSummary):
     bins: List[SampleBin]
 
 
+class BinWindow(BaseModel):
+    chromosome: str
+    start: int
+    end: int
+    mean: float
+    min: float
+    max: float
+    bin_count: int
+
+
+class BinWindowsResponse(BaseModel):
+    result_id: str
+    level: int
+    window_bins: int
+    bins: List[BinWindow]
+
+
 class SampleInfo(BaseModel):
     flowcell_id: str
     cycle_id: str
@@ -106,3 +123,7 @@ class CycleReportResponse(BaseModel):
     cycle_id: str
     flowcell_id: str
     embryos: List[EmbryoInfo]
+    # Còn result chưa annotate: client chờ annotation_job_id rồi tải lại, không export report dở
+    annotation_pending: bool = False
+    # Job annotate các result chưa có annotation (None = đã annotate đủ hoặc không đưa được vào hàng đợi)
+    annotation_job_id: Optional[str] = None
@@ -1,19 +1,25 @@
 import io
 import csv
 import logging
-from typing import Iterator, Tuple, Optional
+from functools import lru_cache
+from typing import Callable, Iterator, Optional
 from datetime import datetime
-from sqlalchemy import select
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
 from uuid import uuid4
-from sqlalchemy.orm import Session, selectinload
-from .models import Result, SampleSegment, SampleBin
+import numpy as np
+from sqlalchemy.orm import Session
+from config import ResultConfig
+from utils.minio_util import MinioUtil
+from . import bin_summary, bin_track, report
+from .report import ReportCache
+from .models import Result, SampleSegment, SampleBin, ResultBinTrack, ResultBinSummary
 from algorithm.plugin import (
     BaseOutput,
     SampleSegment as AlgoSampleSegment,
     SampleBin as AlgoSampleBin,
 )
 from algorithm.models import Algorithm, AlgorithmParameter
-from aberration.models import Aberration
 from .schemas import (
     ResultDto,
     ResultSummary,
@@ -23,45 +29,27 @@ from .schemas import (
     AlgorithmParameterInfo,
     AberrationInfo,
     AberrationSegmentInfo,
-    AberrationSummary,
-    EmbryoInfo,
     CycleReportResponse,
     SampleSegment as SampleSegmentSchema,
     SampleBin as SampleBinSchema,
+    BinWindow,
+    BinWindowsResponse,
 )
 from common.models import Chromosome
 from sample.models import Sample
 
-SEGMENT_EXPECTED = {"chromosome", "start", "end", "copy_number", "confidence"}
-BIN_EXPECTED = {"chromosome", "start", "end", "copy_number", "read_count", "gc_content"}
+# Số dòng mỗi lệnh INSERT (executemany) khi ghi segments/bins
+INSERT_CHUNK_SIZE = 5000
 
 
 logger = logging.getLogger(__name__)
 
 
-def _parse_tsv_bytes(
-    b: bytes, expected_cols: set, file_label: str
-) -> Iterator[Tuple[int, dict]]:
-    f = io.TextIOWrapper(io.BytesIO(b), encoding="utf-8")
-    reader = csv.DictReader(f, delimiter="\t")
-    if not reader.fieldnames:
-        raise ValueError(f"{file_label}: missing header or empty file")
-    headers = {h.strip() for h in reader.fieldnames}
-    if not expected_cols.issubset(headers):
-        missing = expected_cols - headers
-        raise ValueError(f"{file_label}: missing columns {missing}")
-    row_count = 0
-    for i, raw in enumerate(reader, start=1):
-        row = {
-            k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in raw.items()
-        }
-        row_count += 1
-        yield i, row
-
-    if row_count == 0:
-        raise ValueError(f"{file_label}: no data rows found")
+def _optional_float(value) -> Optional[float]:
+    return float(value) if value not in (None, "") else None
 
 
+@lru_cache(maxsize=None)
 def _map_chromosome(value: str) -> Chromosome:
     """Map chromosome với các trường hợp (normalize & thử nhiều format)."""
     v = value.strip().removeprefix("chr").removeprefix("CHR")
@@ -84,6 +72,167 @@ def _map_chromosome(value: str) -> Chromosome:
     raise ValueError(f"Cannot map chromosome value '{value}' to Chromosome enum")
 
 
+def _to_chromosome(value) -> Chromosome:
+    return _map_chromosome(str(value))
+
+
+SEGMENT_CONVERTERS: dict[str, Callable] = {
+    "chromosome": _to_chromosome,
+    "start": int,
+    "end": int,
+    "copy_number": float,
+    "confidence": _optional_float,
+}
+BIN_CONVERTERS: dict[str, Callable] = {
+    "chromosome": _to_chromosome,
+    "start": int,
+    "end": int,
+    "copy_number": float,
+    "read_count": int,
+    "gc_content": float,
+}
+
+
+def _parse_tsv_columns(
+    b: bytes, converters: dict[str, Callable], file_label: str
+) -> dict[str, list]:
+    """Parse TSV thành các cột {tên cột: list giá trị đã chuyển kiểu} theo converters."""
+    f = io.TextIOWrapper(io.BytesIO(b), encoding="utf-8", newline="")
+    reader = csv.reader(f, delimiter="\t")
+    header = next(reader, None)
+    if not header:
+        raise ValueError(f"{file_label}: missing header or empty file")
+    headers = [h.strip() for h in header]
+    if not set(converters).issubset(headers):
+        missing = set(converters) - set(headers)
+        raise ValueError(f"{file_label}: missing columns {missing}")
+
+    columns = {name: [] for name in converters}
+    fields = [
+        (headers.index(name), converters[name], values)
+        for name, values in columns.items()
+    ]
+    row_count = 0
+    for raw in reader:
+        if not raw:
+            continue
+        row_count += 1
+        try:
+            for position, convert, values in fields:
+                value = raw[position].strip() if position < len(raw) else None
+                values.append(convert(value))
+        except Exception as e:
+            raise ValueError(f"{file_label} line {row_count}: {e}")
+
+    if row_count == 0:
+        raise ValueError(f"{file_label}: no data rows found")
+    return columns
+
+
+def _columns_from_records(
+    records: list[dict], converters: dict[str, Callable], file_label: str
+) -> dict[str, list]:
+    """Chuyển list bản ghi (output của thuật toán) thành các cột giống _parse_tsv_columns."""
+    columns = {}
+    for name, convert in converters.items():
+        try:
+            columns[name] = [convert(record.get(name)) for record in records]
+        except Exception as e:
+            raise ValueError(f"{file_label}.{name}: {e}")
+    return columns
+
+
+def _iter_rows(result_id: str, columns: dict[str, list]) -> Iterator[dict]:
+    names = list(columns)
+    for values in zip(*columns.values()):
+        row = dict(zip(names, values))
+        row["id"] = uuid4().hex
+        row["result_id"] = result_id
+        yield row
+
+
+def _bulk_insert(db: Session, model, result_id: str, columns: dict[str, list]) -> None:
+    """
+    Ghi các cột bằng Core INSERT executemany theo từng chunk (không tạo object ORM).
+    Chạy trong transaction hiện tại của session; việc commit/rollback do nơi gọi quyết định.
+    """
+    stmt = insert(model.__table__)
+    chunk = []
+    for row in _iter_rows(result_id, columns):
+        chunk.append(row)
+        if len(chunk) == INSERT_CHUNK_SIZE:
+            db.execute(stmt, chunk)
+            chunk = []
+    if chunk:
+        db.execute(stmt, chunk)
+
+
+def _encode_bin_track(result_id: str, bins: dict[str, list]) -> Optional[ResultBinTrack]:
+    """
+    Đóng gói bins thành ResultBinTrack theo ResultConfig.BIN_STORAGE.
+    Trả về None nếu lưu theo dòng (mặc định) hoặc bins không nằm trên lưới đều.
+    """
+    if ResultConfig.BIN_STORAGE not in ("db", "minio"):
+        return None
+    try:
+        blob, bin_size = bin_track.encode(bins)
+    except ValueError as e:
+        logger.warning("Result %s: storing bins as rows (%s)", result_id, e)
+        return None
+
+    track = ResultBinTrack(
+        result_id=result_id,
+        bin_size=bin_size,
+        bin_count=len(bins["start"]),
+    )
+    if ResultConfig.BIN_STORAGE == "minio":
+        track.object_url = MinioUtil.save_file(
+            blob, f"bin_tracks/{result_id}.cnvbin", "application/octet-stream"
+        )
+    else:
+        track.data = blob
+    return track
+
+
+def _build_bin_summaries(result_id: str, bins: dict) -> list[ResultBinSummary]:
+    """Các level tóm tắt của bins (level 1 trở lên) để viewer zoom, xem result/bin_summary.py."""
+    summaries = []
+    for level, windows in enumerate(bin_summary.build_levels(bins), start=1):
+        summaries.append(
+            ResultBinSummary(
+                result_id=result_id,
+                level=level,
+                window_bins=bin_summary.SUMMARY_FACTOR**level,
+                window_count=len(windows["start"]),
+                data=bin_summary.encode_level(windows),
+            )
+        )
+    return summaries
+
+
+def _persist_result(
+    db: Session, result: Result, segments: dict[str, list], bins: dict[str, list]
+) -> None:
+    """Ghi Result cùng segments/bins (và các level tóm tắt của bins) trong một transaction."""
+    track = _encode_bin_track(result.id, bins)
+    summaries = _build_bin_summaries(result.id, bins)
+    try:
+        db.add(result)
+        db.flush()
+        _bulk_insert(db, SampleSegment, result.id, segments)
+        if track is not None:
+            db.add(track)
+        else:
+            _bulk_insert(db, SampleBin, result.id, bins)
+        db.add_all(summaries)
+        db.commit()
+    except Exception:
+        db.rollback()
+        if track is not None and track.object_url:
+            MinioUtil.delete_file(track.object_url)
+        raise
+
+
 class ResultService:
     @staticmethod
     def add_from_files(
@@ -135,55 +284,10 @@ class ResultService:
         result_id = uuid4().hex
 
         # 2. Parse segments
-        segments_objs: list[SampleSegment] = []
-        for idx, row in _parse_tsv_bytes(segments_tsv, SEGMENT_EXPECTED, "segments"):
-            try:
-                chrom = _map_chromosome(row["chromosome"])
-                start = int(row["start"])
-                end = int(row["end"])
-                copy_number = float(row["copy_number"])
-                conf_raw = row.get("confidence", "")
-                confidence = float(conf_raw) if conf_raw not in (None, "") else None
-            except Exception as e:
-                raise ValueError(f"segments line {idx}: {e}")
-
-            segments_objs.append(
-                SampleSegment(
-                    id=uuid4().hex,
-                    result_id=result_id,
-                    chromosome=chrom,
-                    start=start,
-                    end=end,
-                    copy_number=copy_number,
-                    confidence=confidence,
-                )
-            )
+        segments = _parse_tsv_columns(segments_tsv, SEGMENT_CONVERTERS, "segments")
 
         # 3. Parse bins
-        bins_objs: list[SampleBin] = []
-        for idx, row in _parse_tsv_bytes(bins_tsv, BIN_EXPECTED, "bins"):
-            try:
-                chrom = _map_chromosome(row["chromosome"])  # chromosome
-                start = int(row["start"])  # start
-                end = int(row["end"])  # end
-                copy_number = float(row["copy_number"])  # copy_number
-                read_count = int(row["read_count"])  # read_count
-                gc_content = float(row["gc_content"])  # gc_content
-            except Exception as e:
-                raise ValueError(f"bins line {idx}: {e}")
-
-            bins_objs.append(
-                SampleBin(
-                    id=uuid4().hex,
-                    result_id=result_id,
-                    chromosome=chrom,
-                    start=start,
-                    end=end,
-                    copy_number=copy_number,
-                    read_count=read_count,
-                    gc_content=gc_content,
-                )
-            )
+        bins = _parse_tsv_columns(bins_tsv, BIN_CONVERTERS, "bins")
 
         # 4. Khởi tạo Result
         result = Result(
@@ -194,17 +298,10 @@ class ResultService:
             reference_genome=sample_obj.reference_genome,
             created_at=created_at if created_at else datetime.now(),
         )
-        result.segments = segments_objs
-        result.bins = bins_objs
 
-        # 6. Persist
-        try:
-            db.add(result)
-            db.commit()
-            db.refresh(result)
-        except Exception:
-            db.rollback()
-            raise
+        # 5. Persist: Result + segments + bins trong một transaction
+        _persist_result(db, result, segments, bins)
+        db.refresh(result)
 
         # 7. Generate and save aberrations
         try:
@@ -262,35 +359,12 @@ class ResultService:
             reference_genome=sample_obj.reference_genome,
         )
 
-        segments = [
-            SampleSegment(
-                id=uuid4().hex,
-                chromosome=_map_chromosome(str(segment["chromosome"])),
-                start=segment["start"],
-                end=segment["end"],
-                copy_number=segment["copy_number"],
-                confidence=segment["confidence"],
-            )
-            for segment in algorithm_output["segments"]
-        ]
-        bins = [
-            SampleBin(
-                id=uuid4().hex,
-                chromosome=_map_chromosome(str(bin["chromosome"])),
-                start=bin["start"],
-                end=bin["end"],
-                copy_number=bin["copy_number"],
-                read_count=bin["read_count"],
-                gc_content=bin["gc_content"],
-            )
-            for bin in algorithm_output["bins"]
-        ]
-
-        result.segments = segments
-        result.bins = bins
+        segments = _columns_from_records(
+            algorithm_output["segments"], SEGMENT_CONVERTERS, "segments"
+        )
+        bins = _columns_from_records(algorithm_output["bins"], BIN_CONVERTERS, "bins")
 
-        db.add(result)
-        db.commit()
+        _persist_result(db, result, segments, bins)
 
         # Generate and save aberrations
         try:
@@ -308,8 +382,12 @@ class ResultService:
     def delete(db: Session, result_id: str):
         result = db.query(Result).filter(Result.id == result_id).first()
         if result:
+            object_url = result.bin_track.object_url if result.bin_track else None
             db.delete(result)
             db.commit()
+            ReportCache.invalidate([result_id])
+            if object_url:
+                MinioUtil.delete_file(object_url)
         else:
             raise ValueError(f"Result {result_id} not found")
 
@@ -333,112 +411,19 @@ class ResultService:
 
     @staticmethod
     def get_report(db: Session, result_id: str) -> ResultReportResponse:
-        from aberration.models import Aberration, AberrationSegment
+        key = ("result", result_id)
+        cached = ReportCache.get(key)
+        if cached is not None:
+            return cached
 
-        # 1. Query Result
-        result = db.query(Result).filter(Result.id == result_id).first()
-        if not result:
+        results = report.load_results(db, [result_id])
+        if not results:
             raise ValueError(f"Result {result_id} not found")
-
-        # 2. Query Sample info
-        sample = db.query(Sample).filter(Sample.id == result.sample_id).first()
-        if not sample:
-            raise ValueError(f"Sample {result.sample_id} not found")
-
-        sample_info = SampleInfo(
-            flowcell_id=sample.flowcell_id,
-            cycle_id=sample.cycle_id,
-            embryo_id=sample.embryo_id,
-            cell_type=sample.cell_type.value,
-            reference_genome=result.reference_genome.value,
-            date=sample.date,
-        )
-
-        # 3. Query Algorithm and AlgorithmParameter info
-        algorithm = (
-            db.query(Algorithm).filter(Algorithm.id == result.algorithm_id).first()
-        )
-        if not algorithm:
-            raise ValueError(f"Algorithm {result.algorithm_id} not found")
-
-        algorithm_params = []
-        if result.algorithm_parameter_id:
-            alg_param = (
-                db.query(AlgorithmParameter)
-                .filter(AlgorithmParameter.id == result.algorithm_parameter_id)
-                .first()
-            )
-            if alg_param:
-                for param_name, param_detail in alg_param.value.items():
-                    algorithm_params.append(
-                        AlgorithmParameterInfo(
-                            name=param_name,
-                            type=param_detail.get("type", ""),
-                            default=param_detail.get("default", None),
-                            value=param_detail.get("value", None),
-                        )
-                    )
-
-        algorithm_info = AlgorithmInfo(
-            name=algorithm.name, version=algorithm.version, parameters=algorithm_params
-        )
-
-        # 4. Query Aberration info
-        aberration = (
-            db.query(Aberration).filter(Aberration.result_id == result_id).first()
-        )
-
-        aberration_summary = []
-        aberration_segments = []
-
-        if aberration:
-            if aberration.aberration_summary:
-                aberration_summary = aberration.aberration_summary
-
-            segments = (
-                db.query(AberrationSegment)
-                .filter(AberrationSegment.aberration_id == aberration.id)
-                .all()
-            )
-
-            for segment in segments:
-                annotations = segment.annotation_for_segment
-                diseases = (
-                    [
-                        f"{ann['OMIM_phenotype']} ({ann['OMIM_ID']})"
-                        for ann in annotations[:10]
-                    ]
-                    if annotations and len(annotations) > 0
-                    else None
-                )          
-                aberration_segments.append(
-                    AberrationSegmentInfo(
-                        chromosome=segment.chromosome.value,
-                        start=segment.start,
-                        end=segment.end,
-                        copy_number=segment.copy_number,
-                        confidence=segment.confidence,
-                        size=segment.size,
-                        type=segment.type.value,
-                        mosaicism=segment.mosaicism,
-                        aberration_code=segment.aberration_code,
-                        assessment=segment.assessment.value,
-                        annotation_for_segment= diseases,
-                        man_change=segment.man_change,
-                    )
-                )
-
-        aberration_info = AberrationInfo(
-            aberration_summary=aberration_summary,
-            aberration_segments=aberration_segments,
-        )
-
-        return ResultReportResponse(
-            result_id=result_id,
-            sample=sample_info,
-            algorithm=algorithm_info,
-            aberration=aberration_info,
-        )
+        result_report = report.build_report(results[0])
+        # Như cycle report: report còn chờ annotate có thể được job ở tiến trình khác cập nhật
+        if not report.needs_annotation(results[0]):
+            ReportCache.put(key, [result_id], result_report)
+        return result_report
 
     @staticmethod
     def get_mock_report(db: Session, result_id: str) -> ResultReportResponse:
@@ -489,110 +474,60 @@ class ResultService:
 
     @staticmethod
     def get_cycle_report(db: Session, report_ids: list[str]) -> CycleReportResponse:
-        results = db.query(Result).filter(Result.id.in_(report_ids)).all()
+        key = ("cycle", tuple(report_ids))
+        cached = ReportCache.get(key)
+        if cached is not None:
+            return cached
+
+        results = report.load_results(db, report_ids)
         if not results:
             raise ValueError("No results found for the provided report IDs")
+        # Embryo theo thứ tự report_ids của request
+        position = {result_id: i for i, result_id in reversed(list(enumerate(report_ids)))}
+        results.sort(key=lambda result: position[result.id])
 
-        sample_ids = [r.sample_id for r in results]
-        samples = db.query(Sample).filter(Sample.id.in_(sample_ids)).distinct().all()
-
-        if not samples:
-            raise ValueError("No samples found for the provided report IDs")
-
-        sample = samples[0]
-        cycle_id = sample.cycle_id
-        flowcell_id = sample.flowcell_id
-
-        sample_map = {sample.id: sample}
+        cycle_id = results[0].sample.cycle_id
+        flowcell_id = results[0].sample.flowcell_id
         # Validate all samples belong to the same cycle and flowcell
-        for i in range(1, len(samples)):
-            sample = samples[i]
-            if sample.cycle_id != cycle_id:
+        for result in results:
+            if result.sample.cycle_id != cycle_id:
                 raise ValueError("All samples must belong to the same cycle")
-            if sample.flowcell_id != flowcell_id:
+            if result.sample.flowcell_id != flowcell_id:
                 raise ValueError("All samples must belong to the same flowcell")
 
-            sample_map[sample.id] = sample
+        # Dựng embryo trước khi submit: submit commit session và expire các result đã nạp
+        embryos = [report.build_embryo(result) for result in results]
+        result_ids = [result.id for result in results]
+        pending_ids = [result.id for result in results if report.needs_annotation(result)]
 
-        def _load_aberrations() -> list[Aberration]:
-            return (
-                db.execute(
-                    select(Aberration)
-                    .where(Aberration.result_id.in_(report_ids))
-                    .options(selectinload(Aberration.aberration_segments))
-                )
-                .scalars()
-                .all()
-            )
-
-        aberrations = _load_aberrations()
-        aberration_result_map = {ab.result_id: ab for ab in aberrations}
-
-        from aberration.service import AberrationService
-
-        for result in results:
-            ab = aberration_result_map.get(result.id)
-            needs_annotation = False
-
-            if ab is None or not ab.aberration_segments:
-                needs_annotation = True
-            else:
-                needs_annotation = any(
-                    segment.annotation_for_segment is None
-                    for segment in ab.aberration_segments
-                )
-
-            if not needs_annotation:
-                continue
+        # Không chờ AnnotSV: đưa cả cycle vào một job annotate, client theo dõi annotation_job_id
+        from annotation.service import AnnotationJobService
 
+        annotation_job_id = None
+        if pending_ids:
             try:
-                AberrationService.annotate_result(result.id, db)
+                annotation_job_id = AnnotationJobService.submit(db, pending_ids).id
             except Exception as exc:
-                logger.warning("Failed to annotate result %s: %s", result.id, exc)
-
-        aberrations = _load_aberrations()
-        aberration_result_map = {ab.result_id: ab for ab in aberrations}
-
-        embryos = []
-        for result in results:
-            sample = sample_map[result.sample_id]
-            aberration = aberration_result_map.get(result.id, None)
-
-            abberations_summary = []
-            if aberration:
-                for segment in aberration.aberration_segments:
-                    annotations = segment.annotation_for_segment
-                    abberations_summary.append(
-                        AberrationSummary(
-                            code=segment.aberration_code,
-                            mosaic=segment.mosaicism,
-                            size=segment.size / 1_000_000,  # Convert to Mbp
-                            diseases=(
-                                [
-                                    f"{ann['OMIM_phenotype']} ({ann['OMIM_ID']})"
-                                    for ann in annotations[:10]
-                                ]
-                                if annotations and len(annotations) > 0
-                                else None
-                            ),
-                            assessment=segment.assessment.value,
-                        )
-                    )
-            embryos.append(
-                EmbryoInfo(
-                    embryo_id=sample.embryo_id,
-                    cell_type=sample.cell_type.value,
-                    call="Abnormal" if abberations_summary else "Normal",
-                    abberations=abberations_summary,
-                )
-            )
-
-        return CycleReportResponse(
-            cycle_id=cycle_id, flowcell_id=flowcell_id, embryos=embryos
+                logger.warning("Failed to queue annotation for results %s: %s", pending_ids, exc)
+
+        cycle_report = CycleReportResponse(
+            cycle_id=cycle_id,
+            flowcell_id=flowcell_id,
+            embryos=embryos,
+            annotation_pending=bool(pending_ids),
+            annotation_job_id=annotation_job_id,
         )
+        # Report còn chờ annotate có thể được job (ở tiến trình khác) cập nhật bất cứ lúc nào
+        if not pending_ids:
+            ReportCache.put(key, result_ids, cycle_report)
+        return cycle_report
 
     @staticmethod
-    def get(db: Session, result_id: str) -> ResultDto:
+    def get_columns(db: Session, result_id: str) -> dict:
+        """
+        Result dạng cột: thông tin result + segments {cột: list} + bins {cột: numpy},
+        không dựng model Pydantic cho từng dòng (dùng cho các response nhị phân).
+        """
         stmt = (
             select(
                 Result.id,
@@ -610,36 +545,176 @@ class ResultService:
             raise ValueError(f"Result {result_id} not found")
 
         result_dict = result._asdict()
+        result_dict["reference_genome"] = result.reference_genome.value
 
         # --- load segments and bins ---
-        segment_rows = (
-            db.query(
+        segment_rows = db.execute(
+            select(
                 SampleSegment.chromosome,
                 SampleSegment.start,
                 SampleSegment.end,
                 SampleSegment.copy_number,
                 SampleSegment.confidence,
                 SampleSegment.man_change,
-            )
-            .filter(SampleSegment.result_id == result_id)
-            .all()
-        )
-        bin_rows = (
-            db.query(
-                SampleBin.chromosome,
-                SampleBin.start,
-                SampleBin.end,
-                SampleBin.copy_number,
-                SampleBin.read_count,
-                SampleBin.gc_content,
-            )
-            .filter(SampleBin.result_id == result_id)
-            .all()
-        )
+            ).where(SampleSegment.result_id == result_id)
+        ).all()
+        segment_names = ("chromosome", "start", "end", "copy_number", "confidence", "man_change")
+        segment_columns = [list(values) for values in zip(*segment_rows)] or [[] for _ in segment_names]
+        segment_columns[0] = [chrom.value for chrom in segment_columns[0]]
+
+        result_dict["segments"] = dict(zip(segment_names, segment_columns))
+        result_dict["bins"] = ResultService.load_bins(db, result_id)
+        return result_dict
 
+    @staticmethod
+    def get(db: Session, result_id: str) -> ResultDto:
+        result_dict = ResultService.get_columns(db, result_id)
+
+        segments = result_dict["segments"]
         result_dict["segments"] = [
-            SampleSegmentSchema(**s._asdict()) for s in segment_rows
+            SampleSegmentSchema(**dict(zip(segments, values)))
+            for values in zip(*segments.values())
+        ]
+        bins = result_dict["bins"]
+        result_dict["bins"] = [
+            SampleBinSchema(**dict(zip(bins, values)))
+            for values in zip(*(bin_track.to_python(column) for column in bins.values()))
         ]
-        result_dict["bins"] = [SampleBinSchema(**b._asdict()) for b in bin_rows]
 
         return ResultDto(**result_dict)
+
+    @staticmethod
+    def get_bins(
+        db: Session,
+        result_id: str,
+        chromosome: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        points: int = bin_summary.DEFAULT_POINTS,
+    ) -> BinWindowsResponse:
+        windows = ResultService.get_bin_windows(db, result_id, chromosome, start, end, points)
+        bins = windows["bins"]
+        names = list(bins)
+        windows["bins"] = [
+            BinWindow(**dict(zip(names, values)))
+            for values in zip(*(bins[name].tolist() for name in names))
+        ]
+        return BinWindowsResponse(**windows)
+
+    @staticmethod
+    def get_bin_windows(
+        db: Session,
+        result_id: str,
+        chromosome: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        points: int = bin_summary.DEFAULT_POINTS,
+    ) -> dict:
+        """
+        Bins của một vùng ở level mịn nhất có không quá `points` cửa sổ trong vùng
+        (level 0 = bin gốc), dạng cột numpy. Result ingest trước khi có bảng tóm tắt được
+        dựng bù ở lần gọi đầu.
+        """
+        if not db.query(Result.id).filter(Result.id == result_id).first():
+            raise ValueError(f"Result {result_id} not found")
+        if chromosome is not None:
+            chromosome = _map_chromosome(chromosome).value
+
+        def _load_summaries() -> list[ResultBinSummary]:
+            return (
+                db.query(ResultBinSummary)
+                .filter(ResultBinSummary.result_id == result_id)
+                .order_by(ResultBinSummary.level.desc())
+                .all()
+            )
+
+        summaries = _load_summaries()
+        if not summaries:
+            summaries = _build_bin_summaries(result_id, ResultService.load_bins(db, result_id))
+            db.add_all(summaries)
+            try:
+                db.commit()
+                summaries = sorted(summaries, key=lambda s: s.level, reverse=True)
+            except IntegrityError:
+                # Request khác vừa dựng xong cùng các level: dùng bản đã lưu
+                db.rollback()
+                summaries = _load_summaries()
+
+        # Đi từ level thô nhất xuống, dừng khi vùng có quá nhiều cửa sổ
+        selected, window_bins, windows = None, None, None
+        for summary in summaries:
+            candidate = bin_summary.decode_level(summary.data)
+            mask = bin_summary.region_mask(candidate, chromosome, start, end)
+            if selected is not None and mask.sum() > points:
+                break
+            selected, window_bins = summary.level, summary.window_bins
+            windows = {name: values[mask] for name, values in candidate.items()}
+        else:
+            # Cả level 1 cũng vừa: thử bin gốc
+            candidate = bin_summary.level_zero(
+                ResultService.load_bins(db, result_id, chromosome, start, end)
+            )
+            if selected is None or len(candidate["start"]) <= points:
+                selected, window_bins, windows = 0, 1, candidate
+
+        return {
+            "result_id": result_id,
+            "level": selected,
+            "window_bins": window_bins,
+            "bins": {name: windows[name] for name in bin_summary.WINDOW_COLUMNS},
+        }
+
+    @staticmethod
+    def load_bins(
+        db: Session,
+        result_id: str,
+        chromosome: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        Bins của result dưới dạng cột numpy (chromosome, start, end, copy_number, read_count,
+        gc_content), đọc từ bin track nén nếu có, ngược lại từ bảng sample_bins.
+        chromosome/start/end (tùy chọn) giới hạn các bin giao với vùng đó.
+        """
+        track = (
+            db.query(ResultBinTrack)
+            .filter(ResultBinTrack.result_id == result_id)
+            .first()
+        )
+        if track is not None:
+            blob = track.data if track.object_url is None else MinioUtil.get_file(track.object_url)
+            if blob is None:
+                raise ValueError(f"Bin track of result {result_id} not found")
+            bins = bin_track.decode(blob)
+            if chromosome is None and start is None and end is None:
+                return bins
+            mask = bin_summary.region_mask(bins, chromosome, start, end)
+            return {name: values[mask] for name, values in bins.items()}
+
+        stmt = select(
+            SampleBin.chromosome,
+            SampleBin.start,
+            SampleBin.end,
+            SampleBin.copy_number,
+            SampleBin.read_count,
+            SampleBin.gc_content,
+        ).where(SampleBin.result_id == result_id)
+        if chromosome is not None:
+            stmt = stmt.where(SampleBin.chromosome == _map_chromosome(chromosome))
+        if start is not None:
+            stmt = stmt.where(SampleBin.end > start)
+        if end is not None:
+            stmt = stmt.where(SampleBin.start < end)
+        rows = db.execute(stmt).all()
+        chromosomes, starts, ends, copy_numbers, read_counts, gc_contents = (
+            zip(*rows) if rows else ([],) * 6
+        )
+        return {
+            "chromosome": np.array([c.value for c in chromosomes], dtype=object),
+            "start": np.array(starts, dtype=np.int64),
+            "end": np.array(ends, dtype=np.int64),
+            "copy_number": np.array(copy_numbers, dtype=np.float64),
+            "read_count": np.array(read_counts, dtype=np.int64),
+            "gc_content": np.array(gc_contents, dtype=np.float64),
+        }
@@ -1,5 +1,5 @@
 from enum import Enum
-from sqlalchemy import Column, String, Enum as SqlEnum, Date
+from sqlalchemy import Column, String, Enum as SqlEnum, Date, BigInteger, ForeignKey
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import date
@@ -33,3 +33,22 @@ class Sample(Base):
     results = relationship(
         "Result", back_populates="sample", cascade="all, delete-orphan"
     )
+    bam_file = relationship(
+        "SampleFile", back_populates="sample", uselist=False, cascade="all, delete-orphan"
+    )
+
+
+class SampleFile(Base):
+    """Thông tin file BAM của sample trên MinIO, tính trong lúc upload."""
+
+    __tablename__ = "sample_files"
+
+    sample_id = Column(
+        String(64),
+        ForeignKey("samples.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    sha256 = Column(String(64), index=True, nullable=False)
+    size = Column(BigInteger, nullable=False)
+
+    sample = relationship("Sample", back_populates="bam_file")
@@ -11,17 +11,17 @@ router = APIRouter()
 
 
 @router.post("/")
-async def upload_file(
+def upload_file(
     file: UploadFile = File(...),
     reference_genome: str = Body(None),
     cell_type: str = Body(None),
     date: str = Body(None),
     db: Session = Depends(get_db)
 ):
-    content = await file.read()
+    # file.file là file tạm của Starlette (trên đĩa khi lớn): upload lên MinIO từng part, không đọc hết vào RAM
     name = file.filename
     fileName = name[:name.index("_")] if "_" in name else name
-    result = SampleService.save(db=db, file_stream=content, file_name=fileName, reference_genome=reference_genome, cell_type=cell_type, date=date)
+    result = SampleService.save(db=db, file=file.file, file_name=fileName, reference_genome=reference_genome, cell_type=cell_type, date=date)
     success = result.get("success")
     message = ""
     if success:
@@ -32,7 +32,7 @@ async def upload_file(
 
 
 @router.post("/many")
-async def upload_multiple_files(
+def upload_multiple_files(
     files: List[UploadFile] = File(...),
     reference_genome: str = Body(None),
     cell_type: str = Body(None),
@@ -42,8 +42,7 @@ async def upload_multiple_files(
     file_streams = []
     names = []
     for file in files:
-        content = await file.read()
-        file_streams.append(content)
+        file_streams.append(file.file)
         name = file.filename
         fileName = name[:name.index("_")] if "_" in name else name
         names.append(fileName)
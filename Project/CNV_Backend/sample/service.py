@@ -1,13 +1,15 @@
 import io
-from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, List, Optional, Tuple
 import uuid
 import datetime
 import re
 
 from fastapi import HTTPException, status
 
+from config import MinioConfig
 from utils.minio_util import MinioUtil
-from .models import Sample, CellType
+from .models import Sample, SampleFile, CellType
 from sqlalchemy.orm import Session
 from .schemas import EditRequest, SampleSummary
 from common.models import ReferenceGenome
@@ -29,7 +31,7 @@ class SampleService:
         )
 
     @staticmethod
-    def _create_sample(file_stream: bytes, file_name: str, reference_genome: str = None, cell_type: str = None, date: str = None) -> Sample:
+    def _create_sample(file: BinaryIO, file_name: str, reference_genome: str = None, cell_type: str = None, date: str = None) -> Sample:
         id = str(uuid.uuid4())
         flowcell_id, cycle_id, embryo_id = SampleService.parse_filename(file_name)
         ref_genome = ReferenceGenome(reference_genome) if reference_genome else ReferenceGenome.HG19
@@ -38,7 +40,7 @@ class SampleService:
         object_name = f"{id}.bam"
         content_type = "application/octet-stream"
 
-        bam_url = MinioUtil.save_file(file_stream, object_name, content_type)
+        bam_url, sha256, size = MinioUtil.save_stream(file, object_name, content_type)
 
         sample = Sample(
             id=id,
@@ -50,14 +52,15 @@ class SampleService:
             cell_type=cell_type,
             reference_genome=ref_genome,
             date=date,
+            bam_file=SampleFile(sha256=sha256, size=size),
         )
         return sample
 
     @staticmethod
-    def save(db: Session, file_stream: bytes, file_name: str, reference_genome: str = None, cell_type: str = None, date: str = None):
+    def save(db: Session, file: BinaryIO, file_name: str, reference_genome: str = None, cell_type: str = None, date: str = None):
         existing = db.query(Sample).filter(Sample.name == file_name).first()
         if not existing:
-            sample = SampleService._create_sample(file_stream, file_name, reference_genome, cell_type, date)
+            sample = SampleService._create_sample(file, file_name, reference_genome, cell_type, date)
             db.add(sample)
             db.commit()
         return {
@@ -65,21 +68,44 @@ class SampleService:
         }
 
     @staticmethod
-    def save_many(db: Session, files: List[bytes], names: List[str], reference_genome: str = None, cell_type: str = None, date: str = None):
+    def save_many(db: Session, files: List[BinaryIO], names: List[str], reference_genome: str = None, cell_type: str = None, date: str = None):
+        """Upload các file đồng thời (tối đa MinioConfig.UPLOAD_WORKERS file một lúc), rồi lưu sample một lần."""
         if len(files) != len(names):
             raise ValueError("Số lượng files và names phải bằng nhau.")
 
-        created_samples = []
+        existing_names = {
+            name for (name,) in db.query(Sample.name).filter(Sample.name.in_(set(names))).all()
+        }
+        pending = []
         skipped_names = []
-
-        for i, (file_stream, name) in enumerate(zip(files, names)):
-            existing = db.query(Sample).filter(Sample.name == name).first()
-            if existing:
+        for file, name in zip(files, names):
+            if name in existing_names:
                 skipped_names.append(name)
                 continue  # Bỏ qua file trùng name
+            existing_names.add(name)
+            pending.append((file, name))
 
-            sample = SampleService._create_sample(file_stream, name, reference_genome, cell_type, date)
-            created_samples.append(sample)
+        created_samples = []
+        if pending:
+            # Tạo bucket một lần trước khi các thread upload song song
+            MinioUtil.ensure_bucket_exists(MinioConfig.BUCKET)
+            workers = max(1, min(MinioConfig.UPLOAD_WORKERS, len(pending)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload") as executor:
+                futures = [
+                    executor.submit(SampleService._create_sample, file, name, reference_genome, cell_type, date)
+                    for file, name in pending
+                ]
+                error = None
+                for future in futures:
+                    try:
+                        created_samples.append(future.result())
+                    except Exception as e:
+                        error = error or e
+            if error:
+                # Không lưu nửa batch: xóa các file đã upload
+                for sample in created_samples:
+                    MinioUtil.delete_file(sample.bam_url)
+                raise error
 
         # Nếu có sample mới, thêm vào DB
         if created_samples:
@@ -102,9 +128,12 @@ class SampleService:
     def delete(db: Session, sample_id: str) -> None:
         sample = db.query(Sample).filter(Sample.id == sample_id).first()
         if sample:
+            from result.report import ReportCache
+            result_ids = [result.id for result in sample.results]
             MinioUtil.delete_file(sample.bam_url)
             db.delete(sample)
             db.commit()
+            ReportCache.invalidate(result_ids)
 
     @staticmethod
     def get_all(db: Session) -> List[SampleSummary]:
@@ -143,4 +172,7 @@ class SampleService:
             
             db.commit()
             db.refresh(sample)
+
+            from result.report import ReportCache
+            ReportCache.invalidate([result.id for result in sample.results])
         return sample
@@ -0,0 +1,154 @@
+"""
+Trả payload dạng cột (các mảng song song) ở định dạng nhị phân theo header Accept / Accept-Encoding.
+
+- application/msgpack: msgpack của dict, mỗi bảng là {tên cột: list}
+- application/vnd.apache.arrow.stream: Arrow IPC stream của một bảng (bins), phần còn lại của payload
+  nằm trong metadata "payload" của schema (JSON)
+- nén zstd (nếu có thư viện zstandard) hoặc gzip
+
+msgpack, pyarrow, zstandard là tùy chọn: thiếu thư viện thì định dạng tương ứng không được chọn
+(endpoint trả JSON như cũ).
+"""
+import datetime
+import gzip
+import json
+from enum import Enum
+from typing import Optional
+
+import numpy as np
+from fastapi.responses import Response
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+_MEDIA_TYPE_ALIASES = {
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+    "application/vnd.apache.arrow.file": ARROW,
+}
+# Body nhỏ hơn ngưỡng này không nén
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+
+def _parse_header(value: Optional[str]) -> list[str]:
+    """Các giá trị của header kiểu Accept, theo q giảm dần (giữ thứ tự khi q bằng nhau); bỏ q=0."""
+    entries = []
+    for position, part in enumerate((value or "").split(",")):
+        name, *params = [p.strip() for p in part.split(";")]
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, raw = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(raw)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            entries.append((-q, position, name.lower()))
+    return [name for _, _, name in sorted(entries)]
+
+
+def _plain(value):
+    """numpy / enum / datetime -> kiểu Python để msgpack và json ghi được."""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, np.ndarray):
+        if value.dtype in (np.float32, np.float16):
+            # biểu diễn ngắn nhất của float32/float16 (2.0942 thay vì 2.094199895858765)
+            return value.astype(str).astype(np.float64).tolist()
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+class EncodingUtil:
+    @staticmethod
+    def negotiate_media_type(accept: Optional[str]) -> Optional[str]:
+        """MSGPACK / ARROW nếu client ưu tiên và thư viện có sẵn; None = trả JSON."""
+        available = {MSGPACK: msgpack is not None, ARROW: pa is not None}
+        for name in _parse_header(accept):
+            name = _MEDIA_TYPE_ALIASES.get(name, name)
+            if name in (JSON, "application/*", "*/*"):
+                return None
+            if available.get(name):
+                return name
+        return None
+
+    @staticmethod
+    def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+        for name in _parse_header(accept_encoding):
+            if name == "zstd" and zstandard is not None:
+                return "zstd"
+            if name == "gzip":
+                return "gzip"
+        return None
+
+    @staticmethod
+    def to_msgpack(payload: dict) -> bytes:
+        return msgpack.packb(_plain(payload), use_bin_type=True)
+
+    @staticmethod
+    def to_arrow(payload: dict, table_key: str) -> bytes:
+        """Bảng payload[table_key] thành Arrow IPC stream; các khóa còn lại vào metadata của schema."""
+        table = pa.table({name: pa.array(values) for name, values in payload[table_key].items()})
+        rest = {key: value for key, value in payload.items() if key != table_key}
+        table = table.replace_schema_metadata({"payload": json.dumps(_plain(rest))})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    @staticmethod
+    def compress(body: bytes, encoding: Optional[str]) -> bytes:
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+        if encoding == "gzip":
+            return gzip.compress(body, compresslevel=GZIP_LEVEL)
+        return body
+
+    @staticmethod
+    def columnar_response(
+        payload: dict,
+        media_type: str,
+        table_key: str,
+        accept_encoding: Optional[str] = None,
+    ) -> Response:
+        """Response nhị phân cho payload đã chọn media_type (xem negotiate_media_type)."""
+        if media_type == ARROW:
+            body = EncodingUtil.to_arrow(payload, table_key)
+        else:
+            body = EncodingUtil.to_msgpack(payload)
+
+        headers = {"Vary": "Accept, Accept-Encoding"}
+        encoding = EncodingUtil.negotiate_encoding(accept_encoding)
+        if encoding and len(body) >= MIN_COMPRESS_SIZE:
+            body = EncodingUtil.compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=media_type, headers=headers)
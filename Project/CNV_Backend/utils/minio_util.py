@@ -1,12 +1,28 @@
 # from __future__ import annotations
 
+import hashlib
 import io
-from typing import Optional
+from typing import BinaryIO, Optional, Tuple
 
 from minio import Minio
 from minio.error import S3Error
 from config import MinioConfig
 
+class _HashingReader:
+    """Bọc stream đọc tuần tự, tính SHA-256 và kích thước của phần đã đọc."""
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+
 class MinioUtil:
     @staticmethod
     def _get_minio_client() -> Minio:
@@ -23,7 +39,12 @@ class MinioUtil:
         client = MinioUtil._get_minio_client()
         found = client.bucket_exists(bucket_name)
         if not found:
-            client.make_bucket(bucket_name)
+            try:
+                client.make_bucket(bucket_name)
+            except S3Error as e:
+                # Upload khác vừa tạo bucket
+                if e.code != "BucketAlreadyOwnedByYou":
+                    raise
 
     @staticmethod
     def save_file(file_stream: bytes, object_name: str, content_type: Optional[str] = None) -> str:
@@ -52,6 +73,33 @@ class MinioUtil:
         # Store as a portable URI for later retrieval/deletion
         return f"minio://{bucket}/{object_name}"
 
+    @staticmethod
+    def save_stream(
+        stream: BinaryIO, object_name: str, content_type: Optional[str] = None
+    ) -> Tuple[str, str, int]:
+        """Upload stream lên MinIO theo từng part MinioConfig.PART_SIZE, không đọc cả file vào bộ nhớ.
+
+        Returns (object URI, SHA-256 hex, size) - hash và size tính trong lúc upload.
+        """
+        bucket = MinioConfig.BUCKET
+        client = MinioUtil._get_minio_client()
+
+        MinioUtil.ensure_bucket_exists(bucket)
+
+        reader = _HashingReader(stream)
+        # length=-1: multipart upload, mỗi lần giữ một part trong bộ nhớ
+        client.put_object(
+            bucket,
+            object_name,
+            data=reader,
+            length=-1,
+            content_type=content_type or "application/octet-stream",
+            part_size=MinioConfig.PART_SIZE,
+            num_parallel_uploads=1,
+        )
+
+        return f"minio://{bucket}/{object_name}", reader.sha256.hexdigest(), reader.size
+
     @staticmethod
     def delete_file(object_uri: str) -> None:
         """Delete a file in MinIO by its stored URI path (minio://bucket/object)."""
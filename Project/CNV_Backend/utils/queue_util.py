@@ -0,0 +1,52 @@
+"""
+Hàng đợi job nền cho API.
+
+- "local" (mặc định): thread pool trong tiến trình API, số worker = JobConfig.MAX_WORKERS
+  (job chờ/chạy bị đánh dấu FAILED khi API khởi động hoặc dừng, nên chỉ chạy một tiến trình API)
+- "rq": đẩy job vào RQ/Redis như cnv_sandbox; chạy worker riêng từ thư mục CNV_Backend:
+  `rq worker annotation_queue` (số worker đang chạy = số job chạy đồng thời)
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from config import JobConfig
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+class QueueUtil:
+    @staticmethod
+    def _get_executor() -> ThreadPoolExecutor:
+        global _executor
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=JobConfig.MAX_WORKERS, thread_name_prefix="job"
+                )
+            return _executor
+
+    @staticmethod
+    def _get_rq_queue():
+        from redis import Redis
+        from rq import Queue
+
+        redis_conn = Redis(host=JobConfig.REDIS_HOST, port=JobConfig.REDIS_PORT)
+        return Queue(JobConfig.QUEUE_NAME, connection=redis_conn)
+
+    @staticmethod
+    def enqueue(func: Callable, *args) -> None:
+        """Chạy func(*args) ở nền; func phải import được theo tên module khi dùng RQ."""
+        if JobConfig.BACKEND == "rq":
+            QueueUtil._get_rq_queue().enqueue(func, *args, job_timeout=JobConfig.JOB_TIMEOUT)
+        else:
+            QueueUtil._get_executor().submit(func, *args)
+
+    @staticmethod
+    def shutdown() -> None:
+        global _executor
+        with _executor_lock:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+                _executor = None
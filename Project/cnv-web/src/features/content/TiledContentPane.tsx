@@ -1,6 +1,6 @@
 "use client";
 
-import { useEffect, useMemo, useState } from "react";
+import { useEffect, useMemo, useRef, useState } from "react";
 import { Typography } from "@mui/material";
 import { useViewHandle } from "../view/viewHandle";
 import useResultHandle from "../result/resultHandle";
@@ -31,6 +31,9 @@ const defaultHeights = {
   report: 600,
 };
 
+// Chu kỳ hỏi trạng thái job annotate của cycle report (ms)
+const ANNOTATION_POLL_INTERVAL = 2000;
+
 export default function TiledContentPane() {
   const checked = useSelector((state: RootState) => state.app.viewChecked);
   const selectedResultIds = useSelector((state: RootState) => state.app.selectedResults);
@@ -50,6 +53,11 @@ export default function TiledContentPane() {
   const [cycleReport, setCycleReport] = useState<CycleReportResponse | null>(null);
   const [cycleReportLoading, setCycleReportLoading] = useState(false);
   const [cycleReportError, setCycleReportError] = useState<string | null>(null);
+  // Cycle report còn embryo chưa annotate: đang chờ job, chưa cho export
+  const [cycleAnnotationPending, setCycleAnnotationPending] = useState(false);
+  // Tăng mỗi lần chọn result khác, để bỏ kết quả/poll của lần tải cũ
+  const cycleRequestRef = useRef(0);
+  const annotationTimerRef = useRef<ReturnType<typeof setTimeout> | null>(null);
 
   useEffect(() => {
     const srcBins = selectedResultDto?.bins ?? [];
@@ -72,16 +80,21 @@ export default function TiledContentPane() {
   }, [selectedResultDto]);
 
   useEffect(() => {
+    cycleRequestRef.current += 1;
+    stopAnnotationPolling();
     if (selectedResultIds.length === 0) {
       setCycleReport(null);
       setCycleReportError(null);
       setCycleReportLoading(false);
+      setCycleAnnotationPending(false);
       return;
     }
 
-    loadCycleReport(selectedResultIds);
+    loadCycleReport(selectedResultIds, cycleRequestRef.current);
   }, [selectedResultIds]);
 
+  useEffect(() => stopAnnotationPolling, []);
+
   // helper for structured clone fallback
   function structuredCloneSafe<T>(v: T): T {
     try {
@@ -108,23 +121,65 @@ export default function TiledContentPane() {
       });
   };
 
-  const loadCycleReport = (resultIds: string[]) => {
-    setCycleReportLoading(true);
+  const stopAnnotationPolling = () => {
+    if (annotationTimerRef.current) {
+      clearTimeout(annotationTimerRef.current);
+      annotationTimerRef.current = null;
+    }
+  };
+
+  const loadCycleReport = (resultIds: string[], request: number, background = false) => {
+    if (!background) {
+      setCycleReportLoading(true);
+    }
     setCycleReportError(null);
 
     resultAPI
       .getCycleReport(resultIds)
       .then((report) => {
+        if (request !== cycleRequestRef.current) return;
         setCycleReport(report);
+        setCycleAnnotationPending(!!report.annotation_pending);
+        if (report.annotation_job_id) {
+          pollAnnotationJob(report.annotation_job_id, resultIds, request);
+        } else if (report.annotation_pending) {
+          setCycleReportError("Annotation could not be queued, the report is missing diseases");
+        }
       })
       .catch((err: any) => {
+        if (request !== cycleRequestRef.current) return;
         setCycleReportError(err.message || "Failed to fetch cycle report");
       })
       .finally(() => {
+        if (request !== cycleRequestRef.current) return;
         setCycleReportLoading(false);
       });
   };
 
+  // Chờ job annotate xong rồi tải lại report (job mới có thể được trả về nếu còn result chưa annotate)
+  const pollAnnotationJob = (jobId: string, resultIds: string[], request: number) => {
+    annotationTimerRef.current = setTimeout(() => {
+      resultAPI
+        .getAnnotationJob(jobId)
+        .then((job) => {
+          if (request !== cycleRequestRef.current) return;
+          if (job.status === "finished") {
+            loadCycleReport(resultIds, request, true);
+          } else if (job.status === "failed") {
+            setCycleAnnotationPending(false);
+            setCycleReportError(`Annotation failed: ${job.error || "unknown error"}`);
+          } else {
+            pollAnnotationJob(jobId, resultIds, request);
+          }
+        })
+        .catch((err: any) => {
+          if (request !== cycleRequestRef.current) return;
+          setCycleAnnotationPending(false);
+          setCycleReportError(err.message || "Failed to fetch annotation job");
+        });
+    }, ANNOTATION_POLL_INTERVAL);
+  };
+
   const items = useMemo(() => {
     const res = [];
     // Các phần Table và Report giữ nguyên (hiển thị cho selectedResultDto hoặc logic cũ)
@@ -279,7 +334,8 @@ export default function TiledContentPane() {
 
     if (checked.cycleReport) {
       const cycleReportExportOptions: ExportAction[] = [];
-      if (cycleReport) {
+      // Không export report còn thiếu annotation
+      if (cycleReport && !cycleAnnotationPending && !cycleReportError) {
         cycleReportExportOptions.push(
           {
             id: "xlsx",
@@ -308,7 +364,7 @@ export default function TiledContentPane() {
         id: "cycleReport",
         title: `Cycle Report`,
         initialHeight: defaultHeights.report,
-        content: <CycleReport loading={cycleReportLoading} error={cycleReportError} report={cycleReport} exportToDocx={exportCycleReportToDocx} exportToXlsx={exportCycleReportToXlsx} exportToPdf={exportCycleReportToPdf} sx={{ height: "100%" }} />,
+        content: <CycleReport loading={cycleReportLoading} error={cycleReportError} annotationPending={cycleAnnotationPending} report={cycleReport} exportToDocx={exportCycleReportToDocx} exportToXlsx={exportCycleReportToXlsx} exportToPdf={exportCycleReportToPdf} sx={{ height: "100%" }} />,
         exportOptions: cycleReportExportOptions,
         onClose: () => dispatch(setViewOption({ key: "cycleReport", value: false })),
       });
@@ -327,6 +383,7 @@ export default function TiledContentPane() {
     cycleReportLoading,
     cycleReportError,
     cycleReport,
+    cycleAnnotationPending,
   ]);
 
   return (
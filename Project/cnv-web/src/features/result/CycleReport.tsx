@@ -4,6 +4,7 @@ import { CycleReportResponse } from "@/types/result";
 interface CycleReportProps {
   loading: boolean;
   error: string | null;
+  annotationPending?: boolean;
   report: CycleReportResponse | null;
   exportToDocx: (report: CycleReportResponse) => void;
   exportToXlsx: (report: CycleReportResponse) => void;
@@ -11,7 +12,7 @@ interface CycleReportProps {
   sx?: SxProps<Theme>;
 }
 
-export const CycleReport: React.FC<CycleReportProps> = ({ loading, error, report, exportToDocx, exportToXlsx, exportToPdf, sx }) => {
+export const CycleReport: React.FC<CycleReportProps> = ({ loading, error, annotationPending, report, exportToDocx, exportToXlsx, exportToPdf, sx }) => {
   return (
     <Box
       sx={{
@@ -36,6 +37,12 @@ export const CycleReport: React.FC<CycleReportProps> = ({ loading, error, report
         </Alert>
       )}
 
+      {!loading && !error && annotationPending && (
+        <Alert severity="info" sx={{ mb: 2 }}>
+          Annotating aberrations, diseases will appear and export will be available when it finishes.
+        </Alert>
+      )}
+
       {!loading && !error && report && (
         <Box>
           {/* Cycle Information */}
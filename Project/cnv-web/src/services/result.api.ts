@@ -8,9 +8,12 @@ import {
   Result,
   ResultSummary,
   ResultDto,
+  BinWindowsQuery,
+  BinWindowsResponse,
   ResultReportResponse,
   CycleReportRequest,
   CycleReportResponse,
+  AnnotationJob,
 } from "@/types/result";
 
 export const resultAPI = {
@@ -28,6 +31,25 @@ export const resultAPI = {
     return fetchAPI<ResultDto>(`/results/${id}`);
   },
 
+  /**
+   * Lấy bins của một vùng đã gộp theo mức zoom (không quá `points` điểm)
+   */
+  async getBins(
+    id: string,
+    query: BinWindowsQuery = {}
+  ): Promise<BinWindowsResponse> {
+    const params = new URLSearchParams();
+    Object.entries(query).forEach(([key, value]) => {
+      if (value !== undefined && value !== null) {
+        params.append(key, String(value));
+      }
+    });
+    const search = params.toString();
+    return fetchAPI<BinWindowsResponse>(
+      `/results/${id}/bins${search ? `?${search}` : ""}`
+    );
+  },
+
   /**
    * Tạo result mới
    */
@@ -96,4 +118,20 @@ export const resultAPI = {
 
     return response;
   },
+
+  /**
+   * Đưa một result vào hàng đợi annotate
+   */
+  async startAnnotation(id: string): Promise<AnnotationJob> {
+    return fetchAPI<AnnotationJob>(`/results/${id}/annotation`, {
+      method: "POST",
+    });
+  },
+
+  /**
+   * Trạng thái của một job annotate
+   */
+  async getAnnotationJob(jobId: string): Promise<AnnotationJob> {
+    return fetchAPI<AnnotationJob>(`/results/annotation-jobs/${jobId}`);
+  },
 };
@@ -105,6 +105,31 @@ export interface ResultDto extends ResultSummary {
   bins: SampleBin[];
 }
 
+/* -------------------- BIN WINDOWS (zoom) -------------------- */
+export interface BinWindow {
+  chromosome: Chromosome;
+  start: number;
+  end: number;
+  mean: number;
+  min: number;
+  max: number;
+  bin_count: number;
+}
+
+export interface BinWindowsResponse {
+  result_id: string;
+  level: number; // 0 = bin gốc
+  window_bins: number;
+  bins: BinWindow[];
+}
+
+export interface BinWindowsQuery {
+  chromosome?: Chromosome;
+  start?: number;
+  end?: number;
+  points?: number;
+}
+
 /* -------------------- RESULT REPORT RESPONSE -------------------- */
 
 /** Tương ứng với lớp `SampleInfo` trong backend */
@@ -200,4 +225,21 @@ export interface CycleReportResponse {
   cycle_id: string;
   flowcell_id: string;
   embryos: EmbryoInfo[];
+  annotation_pending?: boolean; // còn embryo chưa annotate, không export
+  annotation_job_id?: string | null; // job annotate đang chạy, null = đã annotate đủ hoặc không vào được hàng đợi
+}
+
+/* -------------------- ANNOTATION JOB -------------------- */
+
+export type AnnotationJobStatus = "queued" | "running" | "finished" | "failed";
+
+/** Tương ứng với lớp `AnnotationJobResponse` trong backend */
+export interface AnnotationJob {
+  job_id: string;
+  status: AnnotationJobStatus;
+  result_ids: string[];
+  error?: string | null;
+  created_at: string;
+  started_at?: string | null;
+  finished_at?: string | null;
 }
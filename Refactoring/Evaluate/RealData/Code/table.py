@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from Code import utils
+
+SEGMENT_COLUMNS = ['sample', 'algorithm', 'chrom', 'chromStart', 'chromEnd', 'copyNumber']
+
+def load_segments(merge_dir: Path) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Đọc mọi `*_segments.bed` của một thí nghiệm một lần thành bảng dạng cột.
+
+    Trả về (files, segments):
+    - files: (sample, algorithm, order) theo thứ tự duyệt thư mục, kể cả file không có segment nào.
+    - segments: sample, algorithm, chrom (str), chromStart, chromEnd, copyNumber theo thứ tự trong file.
+    """
+    merge_dir = Path(merge_dir)
+    files = []
+    frames = []
+    for sample_dir in merge_dir.iterdir():
+        if not sample_dir.is_dir():
+            continue
+        sample_id = sample_dir.name
+        for segment_file in sample_dir.glob("*_segments.bed"):
+            algorithm_id = segment_file.name.replace(f"{sample_id}_", "").replace("_segments.bed", "")
+            df = pd.read_csv(segment_file, sep='\t', usecols=SEGMENT_COLUMNS[2:])
+            df['chrom'] = df['chrom'].astype(str)
+            df.insert(0, 'algorithm', algorithm_id)
+            df.insert(0, 'sample', sample_id)
+            files.append((sample_id, algorithm_id))
+            frames.append(df)
+
+    files = pd.DataFrame(files, columns=['sample', 'algorithm'])
+    files['order'] = np.arange(len(files))
+    if frames:
+        segments = pd.concat(frames, ignore_index=True)
+    else:
+        segments = pd.DataFrame(columns=SEGMENT_COLUMNS)
+    segments['length'] = segments['chromEnd'] - segments['chromStart']
+    return files, segments
+
+def determine_genders(files: pd.DataFrame, segments: pd.DataFrame) -> pd.Series:
+    """
+    Giới tính của các mẫu có BlueFuse (không rỗng), theo thứ tự duyệt: giống utils.determine_gender
+    (đoạn NST Y dài nhất có CN < MOSAIC_THRESHOLD hoặc không có NST Y thì là Female).
+    """
+    bluefuse = segments[segments['algorithm'] == 'bluefuse']
+    samples = files.loc[files['algorithm'] == 'bluefuse', 'sample']
+    samples = samples[samples.isin(bluefuse['sample'])]
+
+    y_data = bluefuse[bluefuse['chrom'] == '24']
+    longest_y = y_data.loc[y_data.groupby('sample', sort=False)['length'].idxmax()]
+    male = pd.Series(~(longest_y['copyNumber'] < utils.MOSAIC_THRESHOLD).to_numpy(), index=longest_y['sample'].to_numpy())
+
+    genders = pd.Series('Female', index=samples.to_numpy(), name='gender')
+    genders[male.reindex(genders.index, fill_value=False).to_numpy()] = 'Male'
+    return genders
+
+def select_samples(files: pd.DataFrame, genders: pd.Series, chromosome_type: str) -> pd.DataFrame:
+    """Các file của mẫu được đánh giá (có BlueFuse; chỉ mẫu nam khi xét Gonosome), kèm giới tính."""
+    if chromosome_type == 'Gonosome':
+        genders = genders[genders == 'Male']
+    sample_order = pd.Series(np.arange(len(genders)), index=genders.index)
+    selected = files[files['sample'].isin(genders.index)].copy()
+    selected['gender'] = genders.reindex(selected['sample']).to_numpy()
+    selected['sampleOrder'] = sample_order.reindex(selected['sample']).to_numpy()
+    return selected.sort_values(['sampleOrder', 'order'], kind='stable').drop(columns='sampleOrder')
+
+def expand_chromosomes(selected: pd.DataFrame, chromosomes_list: list) -> pd.DataFrame:
+    """Mỗi (sample, algorithm) lặp lại cho từng NST, kèm CN bình thường dự kiến."""
+    grid = selected.loc[selected.index.repeat(len(chromosomes_list))].reset_index(drop=True)
+    grid['chromosome'] = np.tile(chromosomes_list, len(selected))
+    expected = {(chromosome, gender): utils.get_expected_copy_number(chromosome, gender)
+                for chromosome in chromosomes_list for gender in ('Male', 'Female', 'Unknown')}
+    grid['expected'] = [expected[key] for key in zip(grid['chromosome'], grid['gender'])]
+    return grid
+
+def chromosome_types(selected: pd.DataFrame, segments: pd.DataFrame, chromosomes_list: list) -> pd.DataFrame:
+    """
+    Trạng thái Gain/Loss/No Change và phần trăm độ dài của trạng thái đó cho mọi (sample, algorithm, NST),
+    tính bằng groupby trên toàn bộ segment. Ngưỡng Gain/Loss là CN kỳ vọng ± utils.MOSAIC_THRESHOLD.
+    """
+    grid = expand_chromosomes(selected, chromosomes_list)
+    keys = ['sample', 'algorithm', 'chromosome']
+
+    sub = segments[segments['chrom'].isin(chromosomes_list)].rename(columns={'chrom': 'chromosome'})
+    sub = sub.merge(grid[keys + ['expected']], on=keys, how='inner')
+    sub['total'] = sub['length'].clip(lower=0)
+    sub['gain'] = sub['length'].where(sub['copyNumber'] >= sub['expected'] + utils.MOSAIC_THRESHOLD, 0)
+    sub['loss'] = sub['length'].where(sub['copyNumber'] <= sub['expected'] - utils.MOSAIC_THRESHOLD, 0)
+    lengths = sub.groupby(keys, sort=False)[['total', 'gain', 'loss']].sum()
+
+    grid = grid.merge(lengths, left_on=keys, right_index=True, how='left')
+    total = grid['total'].fillna(0).to_numpy(dtype=float)
+    valid = total != 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pcts = np.column_stack([
+            grid['gain'].to_numpy(dtype=float) / total,
+            grid['loss'].to_numpy(dtype=float) / total,
+            (total - grid['gain'].to_numpy(dtype=float) - grid['loss'].to_numpy(dtype=float)) / total,
+        ])
+    # argmax chọn cột đứng trước khi bằng nhau: Gain > Loss > No Change
+    choice = np.argmax(pcts, axis=1)
+    grid['type'] = np.where(valid, np.array(['Gain', 'Loss', 'No Change'])[choice], 'No Change')
+    grid['percent'] = np.where(valid, pcts[np.arange(len(grid)), choice], 0.0)
+    return grid.drop(columns=['total', 'gain', 'loss'])
+
+def chromosome_copy_numbers(selected: pd.DataFrame, segments: pd.DataFrame, chromosomes_list: list) -> pd.DataFrame:
+    """
+    CN của segment dài nhất cho mọi (sample, algorithm, NST); `present` = False khi NST không có segment
+    (CN để trống).
+    """
+    grid = expand_chromosomes(selected, chromosomes_list)
+    keys = ['sample', 'algorithm', 'chromosome']
+
+    selected_files = pd.MultiIndex.from_frame(selected[['sample', 'algorithm']])
+    sub = segments[segments['chrom'].isin(chromosomes_list)]
+    sub = sub[pd.MultiIndex.from_frame(sub[['sample', 'algorithm']]).isin(selected_files)]
+    # idxmax giữ segment đứng trước trong file khi độ dài bằng nhau
+    longest = sub.loc[sub.groupby(['sample', 'algorithm', 'chrom'], sort=False)['length'].idxmax()]
+    longest = longest.rename(columns={'chrom': 'chromosome'})[keys + ['copyNumber']]
+    longest['present'] = True
+
+    grid = grid.merge(longest, on=keys, how='left')
+    grid['present'] = grid['present'].eq(True)
+    return grid
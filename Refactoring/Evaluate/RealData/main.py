@@ -1,5 +1,8 @@
+import argparse
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from Code import merge
+from Code import table
 from Code import evaluate
 from Code import deviation
 from Code import statistic
@@ -28,18 +31,19 @@ def process_experiment(experiment_id: str, root_dir: Path):
     
     integrate_dir.mkdir(parents=True, exist_ok=True)
 
-    # 1. Gộp dữ liệu
+    # 1. Gộp dữ liệu, đọc mọi segments của thí nghiệm một lần
     merge.run_merge(experiment_id, str(input_dir), str(merge_dir))
+    segments_table = table.load_segments(merge_dir)
     
     for chromosome_type in ["Autosome", "Gonosome"]:
         output_dir = experiment_out_dir / chromosome_type
         output_dir.mkdir(parents=True, exist_ok=True)
                 
         # 2. Đánh giá (TP/FP/FN/TN)
-        evaluate.run_evaluate(experiment_id, str(merge_dir), str(output_dir), chromosome_type)
+        evaluate.run_evaluate(experiment_id, str(merge_dir), str(output_dir), chromosome_type, segments_table)
         
         # 3. Độ lệch
-        deviation.run_deviation(experiment_id, str(merge_dir), str(integrate_dir), str(output_dir), chromosome_type)
+        deviation.run_deviation(experiment_id, str(merge_dir), str(integrate_dir), str(output_dir), chromosome_type, segments_table)
         
         # 4. Thống kê
         summary_file = output_dir / f"{experiment_id}_summary.tsv"
@@ -50,6 +54,10 @@ def process_experiment(experiment_id: str, root_dir: Path):
     
 
 def main():
+    parser = argparse.ArgumentParser(description="Đánh giá các thuật toán trên dữ liệu thật so với BlueFuse")
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Số thí nghiệm xử lý song song (1 = tuần tự)')
+    args = parser.parse_args()
+
     root_dir = Path(__file__).resolve().parent
     input_dir = root_dir / "Input"
     if not input_dir.exists():
@@ -62,9 +70,16 @@ def main():
         print("Không tìm thấy thí nghiệm nào trong thư mục Input")
         return
         
-    for i, experiment_id in enumerate(experiments, 1):
-        print(f"\033[1m\n=== XỬ LÝ THÍ NGHIỆM [{i}/{len(experiments)}]: {experiment_id} ===\033[0m")
-        process_experiment(experiment_id, root_dir)
+    if args.workers <= 1:
+        for i, experiment_id in enumerate(experiments, 1):
+            print(f"\033[1m\n=== XỬ LÝ THÍ NGHIỆM [{i}/{len(experiments)}]: {experiment_id} ===\033[0m")
+            process_experiment(experiment_id, root_dir)
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {executor.submit(process_experiment, experiment_id, root_dir): experiment_id for experiment_id in experiments}
+            for i, future in enumerate(as_completed(futures), 1):
+                future.result()
+                print(f"\033[1m=== XONG THÍ NGHIỆM [{i}/{len(experiments)}]: {futures[future]} ===\033[0m")
     
     print("Hoàn thành!")
 
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from collections import defaultdict
@@ -5,27 +6,19 @@ from Code import utils
 
 def create_gt2(metadata_df: pd.DataFrame, samples: list) -> pd.DataFrame:
     """Tạo ground truth GT2 (baseline = 2 cho mọi NST)."""
-    integrate_rows = []
     region_cols = [col for col in metadata_df.columns if col != 'sample']
     
-    for sample_id in samples:
-        sample_meta = metadata_df[metadata_df['sample'] == sample_id]
-        if sample_meta.empty:
-            continue
-        
-        row = {'sample': sample_id}
-        for region_col in region_cols:
-            scale_ratio = float(sample_meta.iloc[0][region_col])
-            expected_cn = scale_ratio * 2.0
-            row[region_col] = expected_cn
-        
-        integrate_rows.append(row)
+    # Mỗi sample lấy dòng đầu tiên trong metadata, giữ thứ tự của samples
+    sample_meta = metadata_df.drop_duplicates('sample').set_index('sample')
+    sample_meta = sample_meta.loc[[sample_id for sample_id in samples if sample_id in sample_meta.index], region_cols]
     
-    return pd.DataFrame(integrate_rows)
+    gt_df = sample_meta.astype(float) * 2.0
+    return gt_df.rename_axis('sample').reset_index()
 
 def create_gtbf(metadata_df: pd.DataFrame, regions_df: pd.DataFrame, samples: list, groundtruth_dir: Path) -> pd.DataFrame:
     """Tạo ground truth GTBF (dựa trên BlueFuse ground truth)."""
     integrate_rows = []
+    region_cols = [str(i + 1) for i in range(len(regions_df))]
     
     for sample_id in samples:
         sample_meta = metadata_df[metadata_df['sample'] == sample_id]
@@ -35,22 +28,12 @@ def create_gtbf(metadata_df: pd.DataFrame, regions_df: pd.DataFrame, samples: li
         bluefuse_file = groundtruth_dir / sample_id / f"{sample_id}_bluefuse_segments.bed"
         if not bluefuse_file.exists():
             continue
-        bluefuse_df = pd.read_csv(bluefuse_file, sep='\t')
         
+        # CN của BlueFuse cho mọi region trong một lượt, nhân với scale ratio
+        base_cn = utils.get_regions_copy_number(utils.SegmentIndex.from_file(bluefuse_file), regions_df)
+        scale_ratio = sample_meta.iloc[0][region_cols].to_numpy(dtype=float)
         row = {'sample': sample_id}
-        for idx, region_row in regions_df.iterrows():
-            region_id = idx + 1
-            scale_ratio = float(sample_meta.iloc[0][str(region_id)])
-
-            base_cn = utils.get_region_copy_number(
-                bluefuse_df,
-                region_row['chrom'],
-                region_row['chromStart'],
-                region_row['chromEnd']
-            )
-            expected_cn = scale_ratio * base_cn if base_cn is not None else None
-            row[str(region_id)] = expected_cn
-        
+        row.update(zip(region_cols, scale_ratio * base_cn))
         integrate_rows.append(row)
     
     return pd.DataFrame(integrate_rows)
@@ -84,6 +67,7 @@ def run_integrate(experiment_id: str, metadata_dir: Path, merge_dir: Path,
     gt_df.to_csv(gt_integrate_file, sep='\t', index=False)
     
     # Xử lý từng thuật toán
+    region_cols = [str(i+1) for i in range(len(regions_df))]
     integrate_rows_per_algorithm = defaultdict(list)
     
     for sample_dir in sorted(merge_dir.iterdir()):
@@ -92,23 +76,14 @@ def run_integrate(experiment_id: str, metadata_dir: Path, merge_dir: Path,
         
         sample_id = sample_dir.name
         
-        # Xử lý tất cả thuật toán
+        # Xử lý tất cả thuật toán: mỗi file được index một lần, mọi region tính trong một lượt
         algorithm_files = list(sample_dir.glob("*_segments.bed"))
         for algorithm_file in algorithm_files:
             algorithm_id = algorithm_file.name.replace(f"{sample_id}_", "").replace("_segments.bed", "")
-            algorithm_df = pd.read_csv(algorithm_file, sep='\t')
+            region_cn = utils.get_regions_copy_number(utils.SegmentIndex.from_file(algorithm_file), regions_df)
             
             row_integrate = {'sample': sample_id}
-            for idx, region_row in regions_df.iterrows():
-                region_id = idx + 1
-                region_cn = utils.get_region_copy_number(
-                    algorithm_df,
-                    region_row['chrom'],
-                    region_row['chromStart'],
-                    region_row['chromEnd']
-                )
-                row_integrate[str(region_id)] = region_cn
-            
+            row_integrate.update(zip(region_cols, region_cn))
             integrate_rows_per_algorithm[algorithm_id].append(row_integrate)
     
     # Lưu bảng integrate cho từng thuật toán
@@ -130,73 +105,56 @@ def run_deviation(experiment_id: str, metadata_dir: Path, integrate_dir: Path,
         return
     
     regions_df = pd.read_csv(regions_bed, sep='\s+', usecols=['chrom', 'chromStart', 'chromEnd', 'type'])
+    cols = ['sample'] + [str(i+1) for i in range(len(regions_df))]
+    region_cols = cols[1:]
     
     # Đọc ground truth integrate
     gt_integrate_file = integrate_dir / f"{gt_type}_integrate.tsv"
     if not gt_integrate_file.exists():
         return
     gt_df = pd.read_csv(gt_integrate_file, sep='\t')
+    gt_df = gt_df.drop_duplicates('sample').set_index('sample').reindex(columns=region_cols)
+    
+    # Gain: algorithm - groundtruth, Loss: groundtruth - algorithm
+    sign = np.where(regions_df['type'].to_numpy() == 'G', 1.0, -1.0)
     
     # Tìm tất cả file integrate của thuật toán
     algorithm_integrate_files = [f for f in integrate_dir.glob("*_integrate.tsv") 
                                  if not f.name.startswith(('GT2', 'GTBF'))]
     
-    # Tính deviation và relative cho từng thuật toán
+    # Tính deviation và relative cho từng thuật toán (mọi sample và region cùng lúc)
     for algorithm_integrate_file in algorithm_integrate_files:
         algorithm_id = algorithm_integrate_file.name.replace("_integrate.tsv", "")
         algorithm_integrate_df = pd.read_csv(algorithm_integrate_file, sep='\t')
         
-        deviation_rows = []
-        relative_rows = []
+        # Chỉ giữ các sample có ground truth
+        algorithm_integrate_df = algorithm_integrate_df[algorithm_integrate_df['sample'].isin(gt_df.index)]
+        samples = algorithm_integrate_df['sample'].to_numpy()
+        algorithm_values = algorithm_integrate_df.reindex(columns=region_cols).to_numpy(dtype=float)
+        gt_values = gt_df.loc[samples].to_numpy(dtype=float)
         
-        for _, algorithm_row in algorithm_integrate_df.iterrows():
-            sample_id = algorithm_row['sample']
-            
-            # Lấy ground truth tương ứng
-            gt_row = gt_df[gt_df['sample'] == sample_id]
-            if gt_row.empty:
-                continue
-            gt_row = gt_row.iloc[0]
-            
-            dev_row = {'sample': sample_id}
-            rel_row = {'sample': sample_id}
-            
-            for idx, region_row in regions_df.iterrows():
-                region_id = str(idx + 1)
-                region_type = region_row['type']  # 'G' hoặc 'L'
-                
-                algorithm_value = algorithm_row.get(region_id)
-                gt_value = gt_row.get(region_id)
-                
-                if pd.isna(algorithm_value) or pd.isna(gt_value):
-                    dev_row[region_id] = None
-                    rel_row[region_id] = None
-                    continue
-                
-                raw = algorithm_value - gt_value
-                deviation = raw if region_type == 'G' else -raw
-                if gt_value != 0:
-                    relative = round((deviation / gt_value) * 100, 2)
-                else:
-                    relative = None
-                
-                dev_row[region_id] = deviation
-                rel_row[region_id] = f"{relative}%" if relative is not None else None
-            
-            deviation_rows.append(dev_row)
-            relative_rows.append(rel_row)
+        deviation = (algorithm_values - gt_values) * sign
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relative = np.round((deviation / gt_values) * 100, 2)
+        has_relative = ~np.isnan(deviation) & (gt_values != 0)
+        
+        dev_df = pd.DataFrame(deviation, columns=region_cols)
+        dev_df.insert(0, 'sample', samples)
+        rel_df = pd.DataFrame(
+            [[f"{value}%" if valid else None for value, valid in zip(values, valids)]
+             for values, valids in zip(relative.tolist(), has_relative.tolist())],
+            columns=region_cols, dtype=object
+        )
+        rel_df.insert(0, 'sample', samples)
         
         # Lưu deviation và relative
-        cols = ['sample'] + [str(i+1) for i in range(len(regions_df))]
         dev_dir = deviation_dir / gt_type
         dev_dir.mkdir(parents=True, exist_ok=True)
         
-        dev_df = pd.DataFrame(deviation_rows)
         dev_df = dev_df.reindex(columns=cols, fill_value=None)
         dev_file = dev_dir / f"{algorithm_id}_deviation.tsv"
         dev_df.to_csv(dev_file, sep='\t', index=False)
         
-        rel_df = pd.DataFrame(relative_rows)
         rel_df = rel_df.reindex(columns=cols, fill_value=None)
         rel_file = dev_dir / f"{algorithm_id}_relative.tsv"
-        rel_df.to_csv(rel_file, sep='\t', index=False)
\ No newline at end of file
+        rel_df.to_csv(rel_file, sep='\t', index=False)
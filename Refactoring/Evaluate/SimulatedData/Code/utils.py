@@ -1,36 +1,95 @@
+import numpy as np
 import pandas as pd
 from typing import Optional, Tuple, Union
 from pathlib import Path
 
-def get_overlap_length(seg_start: int, seg_end: int, region_start: int, region_end: int) -> int:
-    """Tính độ dài overlap giữa segment và region."""
-    overlap_start = max(seg_start, region_start)
-    overlap_end = min(seg_end, region_end)
-    return max(0, overlap_end - overlap_start)
+SEGMENT_COLUMNS = ['chrom', 'chromStart', 'chromEnd', 'copyNumber']
 
-def get_region_copy_number(segments_df: pd.DataFrame, region_chrom: str, 
+class SegmentIndex:
+    """
+    Chỉ mục interval theo NST của một bảng segments (dựng một lần cho mỗi file).
+
+    Segment của mỗi NST được sắp theo chromStart, kèm max tích lũy của chromEnd để tìm nhanh khoảng
+    segment có thể overlap với region bằng searchsorted, kể cả khi các segment chồng lấn nhau.
+    """
+
+    def __init__(self, segments_df: pd.DataFrame):
+        self.chromosomes = {}
+        if segments_df.empty:
+            return
+        codes, chroms = pd.factorize(segments_df['chrom'])
+        starts = segments_df['chromStart'].to_numpy(dtype=np.int64)
+        ends = segments_df['chromEnd'].to_numpy(dtype=np.int64)
+        copy_numbers = segments_df['copyNumber'].to_numpy(dtype=float)
+
+        # Sắp theo (NST, chromStart) một lần; lexsort ổn định nên giữ thứ tự trong file khi chromStart bằng nhau
+        order = np.lexsort((starts, codes))
+        order = order[codes[order] >= 0]  # bỏ dòng không có chrom
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        for positions in np.split(order, bounds):
+            if len(positions) == 0:
+                continue
+            self.chromosomes[chroms[codes[positions[0]]]] = (
+                starts[positions],
+                ends[positions],
+                np.maximum.accumulate(ends[positions]),
+                copy_numbers[positions],
+                positions,  # thứ tự trong file, để chọn segment đứng trước khi overlap bằng nhau
+            )
+
+    @classmethod
+    def from_file(cls, segments_file: Path) -> 'SegmentIndex':
+        return cls(pd.read_csv(segments_file, sep='\t', usecols=SEGMENT_COLUMNS))
+
+    def copy_numbers(self, chroms, starts, ends) -> np.ndarray:
+        """
+        CN của segment overlap nhiều nhất với từng region (NaN nếu không có segment overlap).
+        Kết quả giống get_region_copy_number gọi cho từng region.
+        """
+        chroms = np.asarray(chroms, dtype=object)
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        result = np.full(len(chroms), np.nan)
+
+        for chrom in pd.unique(chroms):
+            if chrom not in self.chromosomes:
+                continue
+            seg_starts, seg_ends, max_ends, copy_numbers, file_order = self.chromosomes[chrom]
+            regions = np.flatnonzero(chroms == chrom)
+            region_starts, region_ends = starts[regions], ends[regions]
+
+            # Segment [lo, hi) là ứng viên: trước lo đều kết thúc trước region, từ hi bắt đầu sau region
+            lo = np.searchsorted(max_ends, region_starts, side='right')
+            hi = np.searchsorted(seg_starts, region_ends, side='left')
+            counts = np.maximum(hi - lo, 0)
+            if counts.sum() == 0:
+                continue
+
+            pair_region = np.repeat(np.arange(len(regions)), counts)
+            offsets = np.cumsum(counts) - counts
+            pair_segment = lo[pair_region] + np.arange(counts.sum()) - offsets[pair_region]
+            overlap = (np.minimum(seg_ends[pair_segment], region_ends[pair_region])
+                       - np.maximum(seg_starts[pair_segment], region_starts[pair_region]))
+
+            # Mỗi region: overlap lớn nhất, bằng nhau thì segment đứng trước trong file
+            best = np.lexsort((file_order[pair_segment], -overlap, pair_region))
+            first = best[np.r_[True, pair_region[best][1:] != pair_region[best][:-1]]]
+            positive = overlap[first] > 0
+            result[regions[pair_region[first][positive]]] = copy_numbers[pair_segment[first][positive]]
+
+        return result
+
+def get_regions_copy_number(segments: Union[pd.DataFrame, SegmentIndex], regions_df: pd.DataFrame) -> np.ndarray:
+    """CN đại diện cho mọi region trong regions_df (chrom, chromStart, chromEnd) trong một lượt."""
+    index = segments if isinstance(segments, SegmentIndex) else SegmentIndex(segments)
+    return index.copy_numbers(regions_df['chrom'].to_numpy(), regions_df['chromStart'].to_numpy(),
+                              regions_df['chromEnd'].to_numpy())
+
+def get_region_copy_number(segments_df: Union[pd.DataFrame, SegmentIndex], region_chrom: str,
                            region_start: int, region_end: int) -> Optional[float]:
     """Xác định CN đại diện cho vùng theo CN của phân đoạn overlap với vùng nhiều nhất."""
-    if segments_df.empty:
-        return None
-    
-    # Lọc các segments trên cùng NST
-    sub = segments_df[segments_df['chrom'] == region_chrom].copy()
-    if sub.empty:
-        return None
-    
-    # Tính overlap với từng segment
-    sub['overlap'] = sub.apply(
-        lambda row: get_overlap_length(
-            row['chromStart'], row['chromEnd'], 
-            region_start, region_end
-        ),
-        axis=1
-    )
-    
-    # Lấy segment có overlap lớn nhất
-    max_overlap_seg = sub.loc[sub['overlap'].idxmax()]
-    if max_overlap_seg['overlap'] == 0:
+    if isinstance(segments_df, pd.DataFrame) and segments_df.empty:
         return None
-    
-    return float(max_overlap_seg['copyNumber'])
\ No newline at end of file
+    index = segments_df if isinstance(segments_df, SegmentIndex) else SegmentIndex(segments_df)
+    copy_number = index.copy_numbers([region_chrom], [region_start], [region_end])[0]
+    return None if np.isnan(copy_number) else float(copy_number)
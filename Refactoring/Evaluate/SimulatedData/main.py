@@ -1,4 +1,6 @@
+import argparse
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from Code import merge
 from Code import deviation
 from Code import statistic
@@ -56,6 +58,10 @@ def process_experiment(experiment_id: str, root_dir: Path):
     
 
 def main():
+    parser = argparse.ArgumentParser(description="Đánh giá các thuật toán trên dữ liệu mô phỏng")
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Số thí nghiệm xử lý song song (1 = tuần tự)')
+    args = parser.parse_args()
+
     root_dir = Path(__file__).resolve().parent
     metadata_dir = root_dir / "Input" / "Metadata"
     if not metadata_dir.exists():
@@ -68,9 +74,16 @@ def main():
         print("Không tìm thấy thí nghiệm nào trong thư mục Metadata")
         return
     
-    for i, experiment_id in enumerate(experiments, 1):
-        print(f"\033[1m\n=== XỬ LÝ THÍ NGHIỆM [{i}/{len(experiments)}]: {experiment_id} ===\033[0m")
-        process_experiment(experiment_id, root_dir)
+    if args.workers <= 1:
+        for i, experiment_id in enumerate(experiments, 1):
+            print(f"\033[1m\n=== XỬ LÝ THÍ NGHIỆM [{i}/{len(experiments)}]: {experiment_id} ===\033[0m")
+            process_experiment(experiment_id, root_dir)
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {executor.submit(process_experiment, experiment_id, root_dir): experiment_id for experiment_id in experiments}
+            for i, future in enumerate(as_completed(futures), 1):
+                future.result()
+                print(f"\033[1m=== XONG THÍ NGHIỆM [{i}/{len(experiments)}]: {futures[future]} ===\033[0m")
     
     print("Hoàn thành!")
 
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Benchmark every Baseline stage on synthetic fixtures at several panel sizes and bin sizes.
+
+    python bench.py --scales 1,24 --resolutions 400000,100000 --save my-branch
+    python bench.py --scales 1,24 --resolutions 400000,100000 --compare my-branch
+
+Results are stored as Baselines/{name}.json; --compare reports the ratio to a stored run and
+exits with status 1 when a stage is slower than the tolerance allows.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARK_DIR.parent / "Code"))
+
+import fixtures  # noqa: E402
+from estimate import Estimator  # noqa: E402
+from filter import create_blacklist  # noqa: E402
+from mosaic import estimate_mosaicism  # noqa: E402
+from normalize import base_content, lowess_normalize  # noqa: E402
+from plot import Plotter  # noqa: E402
+from segment import cbs, segment_statistics  # noqa: E402
+from smooth import bilateral_smooth, mean_smooth, median_smooth  # noqa: E402
+
+BASELINE_DIR = BENCHMARK_DIR / "Baselines"
+STAGES = ('count_read', 'base_content', 'lowess', 'blacklist', 'median_smooth', 'mean_smooth',
+          'bilateral_smooth', 'cbs', 'segment_stats', 'plot')
+# Stages on the mini genome: bin size is fixed and they do not depend on --resolutions
+READ_LEVEL_STAGES = ('count_read', 'base_content')
+SMOOTH_WINDOW = 5
+
+
+class Skip(Exception):
+    """Stage cannot run in this environment or at this scale."""
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started
+
+
+def bench_count_read(context, scale, bin_size, scratch):
+    _, bam_list, chromosome_lengths = fixtures.make_bam_set(context.fixture_dir, scale, context.bam_reads, context.seed)
+    estimator = Estimator(bin_size, fixtures.CHROMOSOME_LIST, chromosome_lengths)
+    return _timed(lambda: [estimator.count_read(bam_file, scratch) for bam_file in bam_list]), scale * context.bam_reads
+
+
+def bench_base_content(context, scale, bin_size, scratch):
+    if scale != min(context.scales):
+        raise Skip("independent of the number of samples")
+    fasta_file, _, chromosome_lengths = fixtures.make_bam_set(context.fixture_dir, 0, context.bam_reads, context.seed)
+    (scratch / "Prepare").mkdir()
+    pipeline = SimpleNamespace(work_directory=scratch, chromosome_list=fixtures.CHROMOSOME_LIST,
+                               chromosome_lengths=chromosome_lengths, bin_size=bin_size)
+    return _timed(base_content, pipeline, fasta_file), sum(chromosome_lengths.values()) // bin_size
+
+
+def bench_lowess(context, scale, bin_size, scratch):
+    panel_dir = fixtures.make_count_panel(context.fixture_dir, scale, bin_size, context.seed)
+    gc_data = dict(np.load(panel_dir / "Prepare" / "GC-content.npz"))
+    filter_data = dict(np.load(panel_dir / "Prepare" / "Combined_filter.npz"))
+    raw_list = [dict(np.load(raw_file)) for raw_file, _, _ in fixtures.panel_files(panel_dir, scale)]
+    return _timed(lambda: [lowess_normalize(raw, gc_data, filter_data) for raw in raw_list]), _panel_bins(gc_data, scale)
+
+
+def bench_blacklist(context, scale, bin_size, scratch):
+    if scale < 2:
+        raise Skip("needs at least one female and one male sample")
+    panel_dir = fixtures.make_count_panel(context.fixture_dir, scale, bin_size, context.seed)
+    train_dir = scratch / "Train"
+    estimator = Estimator(bin_size, fixtures.CHROMOSOME_LIST, fixtures.CHROMOSOME_LENGTHS_GRCh37)
+    train_dir.mkdir()
+    for raw_file, _, _ in fixtures.panel_files(panel_dir, scale):
+        # Synthetic counts stand in for normalized counts; the name decides the frequency file name
+        normalized_file = train_dir / raw_file.name.replace('_rawCount', '_normalized')
+        os.symlink(raw_file.resolve(), normalized_file)
+        estimator.calculate_frequency(normalized_file, train_dir)
+    combined_filter_file = panel_dir / "Prepare" / "Combined_filter.npz"
+    return _timed(create_blacklist, train_dir, combined_filter_file), _panel_bins(np.load(combined_filter_file), scale)
+
+
+def _bench_smoother(smoother):
+    def bench(context, scale, bin_size, scratch):
+        panel_dir = fixtures.make_count_panel(context.fixture_dir, scale, bin_size, context.seed)
+        ratio_list = [ratio_file for _, ratio_file, _ in fixtures.panel_files(panel_dir, scale)]
+        elapsed = _timed(lambda: [smoother(str(ratio_file), str(scratch), SMOOTH_WINDOW) for ratio_file in ratio_list])
+        return elapsed, _panel_bins(np.load(ratio_list[0]), scale)
+    return bench
+
+
+def bench_cbs(context, scale, bin_size, scratch):
+    if shutil.which("Rscript") is None:
+        raise Skip("Rscript not found (segment_stats covers the in-process part)")
+    panel_dir = fixtures.make_count_panel(context.fixture_dir, scale, bin_size, context.seed)
+    ratio_list = [ratio_file for _, ratio_file, _ in fixtures.panel_files(panel_dir, scale)]
+    elapsed = _timed(lambda: [cbs(str(ratio_file), scratch, bin_size, fixtures.CHROMOSOME_LIST) for ratio_file in ratio_list])
+    return elapsed, _panel_bins(np.load(ratio_list[0]), scale)
+
+
+def bench_segment_stats(context, scale, bin_size, scratch):
+    panel_dir = fixtures.make_count_panel(context.fixture_dir, scale, bin_size, context.seed)
+    samples = []
+    for _, ratio_file, segments_file in fixtures.panel_files(panel_dir, scale):
+        samples.append((ratio_file, shutil.copy(segments_file, scratch)))
+
+    def run():
+        for index, (ratio_file, segments_file) in enumerate(samples):
+            segment_statistics(ratio_file, segments_file, bin_size, fixtures.CHROMOSOME_LIST)
+            estimate_mosaicism(ratio_file, segments_file, bin_size, fixtures.CHROMOSOME_LIST, None, fixtures.sample_gender(index))
+    return _timed(run), _panel_bins(np.load(samples[0][0]), scale)
+
+
+def bench_plot(context, scale, bin_size, scratch):
+    panel_dir = fixtures.make_count_panel(context.fixture_dir, scale, bin_size, context.seed)
+    plotter = Plotter(fixtures.CHROMOSOME_LIST, bin_size, scratch)
+    samples = [(ratio_file, segments_file) for _, ratio_file, segments_file in fixtures.panel_files(panel_dir, scale)]
+    return _timed(lambda: [plotter.plot(ratio_file, segments_file) for ratio_file, segments_file in samples]), _panel_bins(np.load(samples[0][0]), scale)
+
+
+def _panel_bins(data, scale):
+    return int(sum(len(data[key]) for key in data)) * scale
+
+
+BENCHMARKS = {
+    'count_read': bench_count_read,
+    'base_content': bench_base_content,
+    'lowess': bench_lowess,
+    'blacklist': bench_blacklist,
+    'median_smooth': _bench_smoother(median_smooth),
+    'mean_smooth': _bench_smoother(mean_smooth),
+    'bilateral_smooth': _bench_smoother(bilateral_smooth),
+    'cbs': bench_cbs,
+    'segment_stats': bench_segment_stats,
+    'plot': bench_plot,
+}
+
+
+def run_benchmarks(context):
+    results = []
+    for stage in context.stages:
+        resolutions = [fixtures.BAM_BIN_SIZE] if stage in READ_LEVEL_STAGES else context.resolutions
+        for bin_size in resolutions:
+            for scale in context.scales:
+                timings, units, note = [], None, None
+                for _ in range(context.repeat):
+                    # Stages skip outputs that already exist, so every repeat gets an empty scratch dir
+                    scratch = Path(tempfile.mkdtemp(prefix=f"{stage}_", dir=context.work_dir))
+                    try:
+                        elapsed, units = BENCHMARKS[stage](context, scale, bin_size, scratch)
+                        timings.append(elapsed)
+                    except Skip as e:
+                        note = str(e)
+                        break
+                    finally:
+                        shutil.rmtree(scratch, ignore_errors=True)
+
+                result = {"stage": stage, "bin_size": bin_size, "samples": scale}
+                if note is not None:
+                    result["skipped"] = note
+                    print(f"{stage:<16} {bin_size:>7} {scale:>4}  skipped: {note}")
+                else:
+                    seconds = float(np.median(timings))
+                    result.update({
+                        "seconds": round(seconds, 6),
+                        "seconds_per_sample": round(seconds / scale, 6),
+                        "units": units,
+                        "units_per_second": round(units / seconds, 2) if seconds > 0 else None,
+                        "repeats": [round(t, 6) for t in timings],
+                    })
+                    print(f"{stage:<16} {bin_size:>7} {scale:>4}  {seconds:10.3f}s  {seconds / scale:9.4f}s/sample")
+                results.append(result)
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARK_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline_file, tolerance):
+    """Print current / stored seconds per stage; returns the number of regressions."""
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    stored = {(r["stage"], r["bin_size"], r["samples"]): r for r in baseline["results"] if "seconds" in r}
+    print(f"\nCompared with {baseline_file.name} (commit {baseline['environment'].get('commit')}):")
+    regressions = 0
+    for result in results:
+        key = (result["stage"], result["bin_size"], result["samples"])
+        if "seconds" not in result or key not in stored:
+            continue
+        ratio = result["seconds"] / stored[key]["seconds"] if stored[key]["seconds"] > 0 else float("inf")
+        status = "REGRESSION" if ratio > 1.0 + tolerance else ("faster" if ratio < 1.0 - tolerance else "")
+        regressions += status == "REGRESSION"
+        print(f"{key[0]:<16} {key[1]:>7} {key[2]:>4}  {stored[key]['seconds']:10.3f}s -> {result['seconds']:10.3f}s  x{ratio:5.2f}  {status}")
+    return regressions
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmark Baseline stages on synthetic fixtures")
+    parser.add_argument('--stages', default = ",".join(STAGES), help = f"Comma-separated stages ({', '.join(STAGES)})")
+    parser.add_argument('--scales', type = _int_list, default = [1, 24], help = f"Comma-separated panel sizes, e.g. {','.join(map(str, fixtures.SCALES))}")
+    parser.add_argument('--resolutions', type = _int_list, default = [400000, 100000], help = f"Comma-separated bin sizes, e.g. {','.join(map(str, fixtures.RESOLUTIONS))}")
+    parser.add_argument('--repeat', type = int, default = 1, help = 'Repeats per measurement (median is reported)')
+    parser.add_argument('--bam-reads', type = int, default = 20000, help = 'Reads per synthetic BAM')
+    parser.add_argument('--seed', type = int, default = 0, help = 'Seed of all fixtures')
+    parser.add_argument('--fixture-dir', default = Path(tempfile.gettempdir()) / "cnv_benchmark" / "Fixtures", help = 'Cache of generated fixtures')
+    parser.add_argument('--save', default = None, help = 'Store results as Baselines/NAME.json')
+    parser.add_argument('--compare', default = None, help = 'Compare with Baselines/NAME.json')
+    parser.add_argument('--tolerance', type = float, default = 0.2, help = 'Relative slowdown reported as regression')
+    args = parser.parse_args()
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    fixture_dir = Path(args.fixture_dir)
+    work_dir = fixture_dir.parent / "Work"
+    work_dir.mkdir(parents = True, exist_ok = True)
+    context = SimpleNamespace(stages = stages, scales = sorted(args.scales), resolutions = args.resolutions,
+                              repeat = max(1, args.repeat), bam_reads = args.bam_reads, seed = args.seed,
+                              fixture_dir = fixture_dir, work_dir = work_dir)
+
+    results = run_benchmarks(context)
+    report = {"environment": environment(), "seed": args.seed, "bam_reads": args.bam_reads, "results": results}
+
+    if args.save:
+        BASELINE_DIR.mkdir(exist_ok = True)
+        baseline_file = BASELINE_DIR / f"{args.save}.json"
+        with open(baseline_file, "w") as f:
+            json.dump(report, f, indent = 2)
+        print(f"\nSaved benchmark results to: {baseline_file}")
+
+    if args.compare:
+        if compare(results, BASELINE_DIR / f"{args.compare}.json", args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
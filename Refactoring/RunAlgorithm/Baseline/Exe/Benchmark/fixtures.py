@@ -0,0 +1,298 @@
+"""
+Deterministic synthetic inputs for the Baseline benchmarks (no network, no real samples).
+
+- FASTA + BAM: GRCh37 layout shrunk by GENOME_SCALE, reads drawn with known CNVs (count_read, base_content).
+- Count panels: full GRCh37 bins at 400 kb / 100 kb / 10 kb with GC bias, filter, log2 ratios and
+  segments derived from the same known CNVs (LOWESS, blacklist, smoothers, CBS, plot).
+
+Every fixture only depends on its arguments and the seed, and is reused when it already exists.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pysam
+
+CHROMOSOME_LIST = [str(i) for i in range(1, 23)] + ['X', 'Y']
+
+CHROMOSOME_LENGTHS_GRCh37 = {
+    "1": 249250621, "2": 243199373, "3": 198022430, "4": 191154276,
+    "5": 180915260, "6": 171115067, "7": 159138663, "8": 146364022,
+    "9": 141213431, "10": 135534747, "11": 135006516, "12": 133851895,
+    "13": 115169878, "14": 107349540, "15": 102531392, "16": 90354753,
+    "17": 81195210, "18": 78077248, "19": 59128983, "20": 63025520,
+    "21": 48129895, "22": 51304566, "X": 155270560, "Y": 59373566,
+}
+
+RESOLUTIONS = (400000, 100000, 10000)
+SCALES = (1, 24, 96, 384)
+
+# Read-level fixtures use the GRCh37 layout shrunk by this factor (chr1 ~1.25 Mb)
+GENOME_SCALE = 200
+BAM_BIN_SIZE = 10000
+READ_LENGTH = 36
+# Reads per sample in count panels, close to a low-pass PGT run
+PANEL_READS = 5_000_000
+# Fraction of bins masked by the synthetic combined filter
+FILTER_FRACTION = 0.03
+GC_MEAN = 0.41
+
+
+def scaled_lengths(factor=GENOME_SCALE):
+    return {chromosome: length // factor for chromosome, length in CHROMOSOME_LENGTHS_GRCh37.items()}
+
+
+def sample_name(index):
+    return f"Sample_{index:04d}"
+
+
+def sample_gender(index):
+    return "male" if index % 2 else "female"
+
+
+def make_events(num_samples, chromosome_lengths, seed=0):
+    """
+    Known CNVs: sample i carries a gain (i % 3 == 1) or a loss (i % 3 == 2) over the middle
+    third of autosome (i % 22) + 1; every third sample is normal.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for index in range(num_samples):
+        kind = index % 3
+        if kind == 0:
+            continue
+        chromosome = str(index % 22 + 1)
+        length = chromosome_lengths[chromosome]
+        copy_number = 3.0 if kind == 1 else 1.0
+        # Mosaic level between 0.5 and 1 so segment values are not all identical
+        mosaic = float(np.round(rng.uniform(0.5, 1.0), 2))
+        rows.append({
+            'sample': sample_name(index),
+            'chrom': chromosome,
+            'start': length // 3,
+            'end': 2 * length // 3,
+            'type': 'G' if kind == 1 else 'L',
+            'copy_number': 2.0 + (copy_number - 2.0) * mosaic,
+        })
+    return pd.DataFrame(rows, columns=['sample', 'chrom', 'start', 'end', 'type', 'copy_number'])
+
+
+def copy_number_track(chromosome, positions, gender, events):
+    """Copy number at the given positions of one chromosome for one sample."""
+    if chromosome == 'X':
+        base = 1.0 if gender == 'male' else 2.0
+    elif chromosome == 'Y':
+        base = 1.0 if gender == 'male' else 0.0
+    else:
+        base = 2.0
+    track = np.full(len(positions), base)
+    for event in events.itertuples(index=False):
+        if event.chrom == chromosome:
+            inside = (positions >= event.start) & (positions < event.end)
+            track[inside] = event.copy_number
+    return track
+
+
+def gc_track(num_bins, rng):
+    """Smooth GC fraction per bin around GC_MEAN (random walk through a moving average)."""
+    steps = rng.normal(0.0, 0.02, num_bins + 20)
+    walk = np.convolve(np.cumsum(steps) - np.cumsum(steps).mean(), np.ones(21) / 21, mode='valid')[:num_bins]
+    return np.clip(GC_MEAN + walk - walk.mean() + rng.normal(0.0, 0.01, num_bins), 0.3, 0.6)
+
+
+def gc_bias(gc):
+    """Unimodal read depth bias over GC, 1 at GC_MEAN."""
+    return np.clip(1.0 + 1.5 * (gc - GC_MEAN) - 12.0 * (gc - GC_MEAN) ** 2, 0.2, None)
+
+
+def make_fasta(fasta_file, chromosome_lengths=None, seed=0, window=BAM_BIN_SIZE):
+    """Mini reference named 1..22, X, Y with GC varying per window and an N block at each start."""
+    fasta_file = Path(fasta_file)
+    if fasta_file.exists() and Path(f"{fasta_file}.fai").exists():
+        return str(fasta_file)
+    chromosome_lengths = chromosome_lengths or scaled_lengths()
+    fasta_file.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    bases = np.frombuffer(b"ACGT", dtype=np.uint8)
+
+    with open(fasta_file, "wb") as f:
+        for chromosome in CHROMOSOME_LIST:
+            length = chromosome_lengths[chromosome]
+            num_windows = -(-length // window)
+            gc = np.repeat(gc_track(num_windows, rng), window)[:length]
+            is_gc = rng.random(length) < gc
+            pick = rng.integers(0, 2, length)
+            sequence = np.where(is_gc, bases[1 + pick], bases[pick * 3])
+            sequence[: length // 50] = ord('N')
+            f.write(f">{chromosome}\n".encode())
+            for offset in range(0, length, 60):
+                f.write(sequence[offset: offset + 60].tobytes() + b"\n")
+
+    pysam.faidx(str(fasta_file))
+    return str(fasta_file)
+
+
+def make_bam(bam_file, index, num_reads, events, chromosome_lengths=None, seed=0):
+    """Sorted, indexed single-end BAM (contigs chr1..chrY) whose depth follows the known CNVs."""
+    bam_file = Path(bam_file)
+    if bam_file.exists() and Path(f"{bam_file}.bai").exists():
+        return str(bam_file)
+    chromosome_lengths = chromosome_lengths or scaled_lengths()
+    bam_file.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng([seed, index])
+    gender = sample_gender(index)
+    sample_events = events[events['sample'] == sample_name(index)]
+
+    header = {
+        'HD': {'VN': '1.6', 'SO': 'coordinate'},
+        'SQ': [{'SN': f"chr{c}", 'LN': chromosome_lengths[c]} for c in CHROMOSOME_LIST],
+        'RG': [{'ID': sample_name(index), 'SM': sample_name(index)}],
+    }
+    total_length = sum(chromosome_lengths.values())
+    query = "A" * READ_LENGTH
+    qualities = pysam.qualitystring_to_array("I" * READ_LENGTH)
+
+    with pysam.AlignmentFile(str(bam_file), "wb", header=header) as bam:
+        for reference_id, chromosome in enumerate(CHROMOSOME_LIST):
+            length = chromosome_lengths[chromosome]
+            # Uniform proposals at the highest copy number, thinned to the local copy number
+            expected = num_reads * length / total_length * 1.5
+            positions = np.sort(rng.integers(0, max(1, length - READ_LENGTH), rng.poisson(expected)))
+            copy_number = copy_number_track(chromosome, positions, gender, sample_events)
+            positions = positions[rng.random(len(positions)) < copy_number / 3.0]
+            for read_index, position in enumerate(positions):
+                segment = pysam.AlignedSegment()
+                segment.query_name = f"{chromosome}_{read_index}"
+                segment.query_sequence = query
+                segment.flag = 0
+                segment.reference_id = reference_id
+                segment.reference_start = int(position)
+                segment.mapping_quality = 60
+                segment.cigarstring = f"{READ_LENGTH}M"
+                segment.query_qualities = qualities
+                bam.write(segment)
+
+    pysam.index(str(bam_file))
+    return str(bam_file)
+
+
+def make_bam_set(fixture_dir, num_samples, num_reads=20000, seed=0):
+    """FASTA + num_samples BAMs for read-level stages; returns (fasta_file, bam_list, chromosome_lengths)."""
+    fixture_dir = Path(fixture_dir) / f"bam_scale{GENOME_SCALE}_seed{seed}"
+    chromosome_lengths = scaled_lengths()
+    fasta_file = make_fasta(fixture_dir / "mini.fa", chromosome_lengths, seed)
+    events = make_events(num_samples, chromosome_lengths, seed)
+    bam_list = [
+        make_bam(fixture_dir / f"reads{num_reads}" / f"{sample_name(i)}.bam", i, num_reads, events, chromosome_lengths, seed)
+        for i in range(num_samples)
+    ]
+    return fasta_file, bam_list, chromosome_lengths
+
+
+def make_count_panel(fixture_dir, num_samples, bin_size, seed=0, num_reads=PANEL_READS):
+    """
+    Count-level panel on the full GRCh37 layout. Layout of the returned directory:
+
+        Prepare/GC-content.npz, Prepare/Combined_filter.npz
+        Counts/{sample}_rawCount.npz      raw counts with GC bias and known CNVs
+        Ratios/{sample}_log2Ratio.npz     log2(CN / 2) + noise, -10 on filtered bins
+        Segments/{sample}_segments.csv    DNAcopy-style segments of the known CNVs
+        truth.tsv, fixture.json
+    Samples are appended when a larger panel is requested with the same seed and bin size.
+    """
+    panel_dir = Path(fixture_dir) / f"panel_{bin_size}_seed{seed}"
+    for sub_dir in ("Prepare", "Counts", "Ratios", "Segments"):
+        (panel_dir / sub_dir).mkdir(parents=True, exist_ok=True)
+
+    chromosome_lengths = CHROMOSOME_LENGTHS_GRCh37
+    num_bins = {c: chromosome_lengths[c] // bin_size for c in CHROMOSOME_LIST}
+    total_bins = sum(num_bins.values())
+
+    gc_file = panel_dir / "Prepare" / "GC-content.npz"
+    filter_file = panel_dir / "Prepare" / "Combined_filter.npz"
+    if not gc_file.exists() or not filter_file.exists():
+        rng = np.random.default_rng([seed, bin_size])
+        gc_content, combined_filter = {}, {}
+        for chromosome in CHROMOSOME_LIST:
+            gc_content[chromosome] = gc_track(num_bins[chromosome], rng)
+            mask = rng.random(num_bins[chromosome]) < FILTER_FRACTION
+            mask[: max(1, num_bins[chromosome] // 50)] = True
+            combined_filter[chromosome] = mask
+        np.savez_compressed(gc_file, **gc_content)
+        np.savez_compressed(filter_file, **combined_filter)
+
+    gc_data = np.load(gc_file)
+    filter_data = np.load(filter_file)
+    events = make_events(num_samples, chromosome_lengths, seed)
+    events.to_csv(panel_dir / "truth.tsv", sep="\t", index=False)
+    depth = num_reads / total_bins
+
+    for index in range(num_samples):
+        name = sample_name(index)
+        raw_file = panel_dir / "Counts" / f"{name}_rawCount.npz"
+        ratio_file = panel_dir / "Ratios" / f"{name}_log2Ratio.npz"
+        segments_file = panel_dir / "Segments" / f"{name}_segments.csv"
+        if raw_file.exists() and ratio_file.exists() and segments_file.exists():
+            continue
+
+        rng = np.random.default_rng([seed, bin_size, index])
+        gender = sample_gender(index)
+        sample_events = events[events['sample'] == name]
+        counts, ratios, segments = {}, {}, []
+        for chromosome in CHROMOSOME_LIST:
+            maploc = np.arange(num_bins[chromosome]) * bin_size + bin_size // 2
+            copy_number = copy_number_track(chromosome, maploc, gender, sample_events)
+            expected = depth * gc_bias(gc_data[chromosome]) * copy_number / 2.0
+            counts[chromosome] = rng.poisson(expected).astype(float)
+
+            with np.errstate(divide='ignore'):
+                log2_ratio = np.log2(np.maximum(counts[chromosome], 0.5) / (depth * gc_bias(gc_data[chromosome])))
+            log2_ratio = np.where(filter_data[chromosome], -10.0, log2_ratio)
+            ratios[chromosome] = log2_ratio
+            segments.extend(_segments_of(name, chromosome, maploc, copy_number, log2_ratio))
+
+        np.savez_compressed(raw_file, **counts)
+        np.savez_compressed(ratio_file, **ratios)
+        pd.DataFrame(segments).to_csv(segments_file, index=False)
+
+    with open(panel_dir / "fixture.json", "w") as f:
+        json.dump({"bin_size": bin_size, "seed": seed, "num_reads": num_reads,
+                   "num_samples": max(num_samples, _existing_samples(panel_dir))}, f, indent=2)
+    return panel_dir
+
+
+def panel_files(panel_dir, num_samples):
+    """(raw, log2 ratio, segments) files of the first num_samples samples of a panel."""
+    panel_dir = Path(panel_dir)
+    return [
+        (panel_dir / "Counts" / f"{sample_name(i)}_rawCount.npz",
+         panel_dir / "Ratios" / f"{sample_name(i)}_log2Ratio.npz",
+         panel_dir / "Segments" / f"{sample_name(i)}_segments.csv")
+        for i in range(num_samples)
+    ]
+
+
+def _segments_of(name, chromosome, maploc, copy_number, log2_ratio):
+    """One segment per constant copy-number run, with the mean of the valid bins as seg.mean."""
+    if len(maploc) == 0:
+        return []
+    chrom_numeric = 23 if chromosome == 'X' else (24 if chromosome == 'Y' else int(chromosome))
+    breaks = np.flatnonzero(np.diff(copy_number)) + 1
+    rows = []
+    for low, high in zip(np.r_[0, breaks], np.r_[breaks, len(maploc)]):
+        values = log2_ratio[low:high]
+        values = values[values > -10]
+        if values.size == 0:
+            continue
+        rows.append({
+            'ID': name, 'chrom': chrom_numeric,
+            'loc.start': int(maploc[low]), 'loc.end': int(maploc[high - 1]),
+            'num.mark': int(values.size), 'seg.mean': round(float(values.mean()), 4),
+            'chrom_original': chromosome,
+        })
+    return rows
+
+
+def _existing_samples(panel_dir):
+    return len(list((Path(panel_dir) / "Counts").glob("*_rawCount.npz")))
@@ -203,6 +203,55 @@ class Estimator:
         print(f"Saved reference mean to: {reference_file}")
         return str(reference_file)
 
+    def create_reference_noise(self, train_dir, reference_file, output_dir):
+        """Compute per-bin standard deviation of train log2 ratios against the reference (NaN if unknown)."""
+        proportion_list = list(Path(train_dir).glob("*_proportion.npz"))
+        noise_file = Path(output_dir) / "Reference_sd.npz"
+
+        if noise_file.exists():
+            print(f"Reference noise file already exists: {noise_file}")
+            return str(noise_file)
+
+        reference_data = np.load(reference_file)
+        autosome_list = [str(i) for i in range(1, 23)]
+        log2_data = {chromosome: [] for chromosome in self.chromosome_list}
+
+        for proportion_file in proportion_list:
+            data = np.load(proportion_file, allow_pickle=True)
+            gender = str(data['gender'])
+
+            # Same sample selection as create_reference: X from females, Y from males
+            chromosome_list = list(autosome_list)
+            if gender == 'female':
+                chromosome_list.append('X')
+            if gender == 'male':
+                chromosome_list.append('Y')
+
+            for chromosome in chromosome_list:
+                if chromosome not in reference_data.files:
+                    continue
+                proportion = data[chromosome]
+                reference_proportion = reference_data[chromosome]
+                log2_ratio = np.full(proportion.shape, np.nan)
+                valid = (proportion > 0) & (reference_proportion > 0)
+                log2_ratio[valid] = np.log2(proportion[valid] / reference_proportion[valid])
+                log2_data[chromosome].append(log2_ratio)
+
+        noise_dict = {}
+        for chromosome, log2_list in log2_data.items():
+            if len(log2_list) < 2:
+                continue
+            stack = np.stack(log2_list, axis=0)
+            num_valid = np.count_nonzero(~np.isnan(stack), axis=0)
+            sd = np.full(stack.shape[1], np.nan)
+            enough = num_valid >= 2
+            sd[enough] = np.nanstd(stack[:, enough], axis=0, ddof=1)
+            noise_dict[chromosome] = sd
+
+        np.savez_compressed(noise_file, **noise_dict)
+        print(f"Saved reference noise to: {noise_file}")
+        return str(noise_file)
+
     def calculate_ratio(self, test_file, reference_file, output_dir):
         """Calculate linear ratio (test/reference) using only bins where reference > 0."""
         test_data = np.load(test_file)
@@ -0,0 +1,163 @@
+import json
+import os
+import resource
+import time
+from pathlib import Path
+
+import numpy as np
+
+TRACE_FORMATS = ('jsonl', 'chrome')
+
+
+def _io_counters():
+    """Bytes read/written by this process (rchar/wchar from /proc, 0 when unavailable)."""
+    try:
+        with open(f"/proc/{os.getpid()}/io") as f:
+            counters = dict(line.split(":") for line in f.read().splitlines())
+        return int(counters["rchar"]), int(counters["wchar"])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+
+def _cpu_seconds(who=resource.RUSAGE_SELF):
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def _count_units(stage, result, args):
+    """Reads for count tasks (sum of raw counts), otherwise bins of the first NPZ in result or inputs."""
+    candidates = [result] + list(args)
+    for candidate in candidates:
+        if isinstance(candidate, (str, Path)) and str(candidate).endswith(".npz") and Path(candidate).exists():
+            with np.load(candidate, allow_pickle=True) as data:
+                arrays = [data[key] for key in data.files if data[key].ndim == 1]
+            if stage == "count":
+                return {"reads": int(sum(array.sum() for array in arrays))}
+            return {"bins": int(sum(len(array) for array in arrays))}
+    return {}
+
+
+def measure(key, func, *args):
+    """
+    Run func(*args) and return (result, record) with wall/CPU time, peak RSS and IO of the task.
+    Called inside the worker process so the counters belong to the process doing the work.
+
+    ru_maxrss is a process-lifetime high-water mark, so the record has both the process peak
+    after the task (process_peak_rss_mb) and how far the task raised it (peak_rss_growth_mb,
+    0 when the task stayed below an earlier peak of the same process).
+
+    Subprocesses the task waited for (the Rscript CBS segmentation) are not in RUSAGE_SELF: their CPU
+    time is children_cpu_s, and children_peak_rss_mb is the largest child peak so far (not a sum),
+    with children_peak_rss_growth_mb as how far the task raised it.
+    """
+    stage, _, sample = key.partition(":")
+    read_before, write_before = _io_counters()
+    cpu_before = _cpu_seconds()
+    peak_before = _peak_rss_mb()
+    children_cpu_before = _cpu_seconds(resource.RUSAGE_CHILDREN)
+    children_peak_before = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+    start = time.time()
+    started = time.perf_counter()
+
+    result = func(*args)
+
+    wall = time.perf_counter() - started
+    cpu = _cpu_seconds() - cpu_before
+    read_after, write_after = _io_counters()
+    peak_after = _peak_rss_mb()
+    children_cpu = _cpu_seconds(resource.RUSAGE_CHILDREN) - children_cpu_before
+    children_peak_after = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+
+    record = {
+        "task": key,
+        "stage": stage,
+        "sample": sample or None,
+        "pid": os.getpid(),
+        "start": start,
+        "wall_s": round(wall, 6),
+        "cpu_s": round(cpu, 6),
+        "process_peak_rss_mb": round(peak_after, 2),
+        "peak_rss_growth_mb": round(peak_after - peak_before, 2),
+        "children_cpu_s": round(children_cpu, 6),
+        "children_peak_rss_mb": round(children_peak_after, 2),
+        "children_peak_rss_growth_mb": round(children_peak_after - children_peak_before, 2),
+        "read_bytes": read_after - read_before,
+        "write_bytes": write_after - write_before,
+    }
+    for unit, count in _count_units(stage, result, args).items():
+        record[unit] = count
+        record[f"{unit}_per_s"] = round(count / wall, 2) if wall > 0 else None
+    return result, record
+
+
+class Tracer:
+    """
+    Collect task records and write them as JSONL (one record per line, flushed as tasks finish)
+    or as a Chrome trace (chrome://tracing, Perfetto) when the pipeline completes.
+    """
+
+    def __init__(self, trace_file, trace_format='jsonl'):
+        if trace_format not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format: {trace_format}")
+        self.trace_file = Path(trace_file)
+        self.trace_format = trace_format
+        self.records = []
+        self.trace_file.parent.mkdir(parents=True, exist_ok=True)
+        self._handle = open(self.trace_file, "w") if trace_format == 'jsonl' else None
+
+    def record(self, record):
+        self.records.append(record)
+        if self._handle is not None:
+            self._handle.write(json.dumps(record) + "\n")
+            self._handle.flush()
+
+    def summary(self):
+        """Total wall, CPU and subprocess CPU seconds per stage."""
+        stages = {}
+        for record in self.records:
+            total = stages.setdefault(
+                record["stage"], {"tasks": 0, "wall_s": 0.0, "cpu_s": 0.0, "children_cpu_s": 0.0}
+            )
+            total["tasks"] += 1
+            total["wall_s"] += record["wall_s"]
+            total["cpu_s"] += record["cpu_s"]
+            total["children_cpu_s"] += record["children_cpu_s"]
+        for total in stages.values():
+            for field in ("wall_s", "cpu_s", "children_cpu_s"):
+                total[field] = round(total[field], 6)
+        return stages
+
+    def close(self, wall_s=None):
+        summary = {"task": "pipeline", "stage": "pipeline", "wall_s": wall_s, "stages": self.summary()}
+        if self._handle is not None:
+            self._handle.write(json.dumps(summary) + "\n")
+            self._handle.close()
+            self._handle = None
+        elif self.trace_format == 'chrome':
+            origin = min((record["start"] for record in self.records), default=0.0)
+            events = []
+            for record in self.records:
+                args = {k: v for k, v in record.items() if k not in ("task", "stage", "pid", "start")}
+                events.append({
+                    "name": record["task"],
+                    "cat": record["stage"],
+                    "ph": "X",
+                    "ts": int((record["start"] - origin) * 1e6),
+                    "dur": int(record["wall_s"] * 1e6),
+                    "pid": record["pid"],
+                    "tid": record["pid"],
+                    "args": args,
+                })
+            with open(self.trace_file, "w") as f:
+                json.dump({"traceEvents": events, "otherData": summary}, f)
+
+        for stage, total in sorted(summary["stages"].items(), key=lambda item: -item[1]["wall_s"]):
+            print(f"  {stage:<16} {total['tasks']:>4} tasks  wall {total['wall_s']:9.2f}s  cpu {total['cpu_s']:9.2f}s"
+                  f"  children cpu {total['children_cpu_s']:9.2f}s")
+        print(f"Trace written to: {self.trace_file}")
@@ -0,0 +1,230 @@
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from segment import CHROMOSOME_KEY_OFFSET, _chromosome_numeric, baseline_copy_number
+
+# Signed grid of mosaic fractions: negative = loss, positive = gain
+MOSAIC_GRID = np.round(np.linspace(-1.0, 1.0, 201), 4)
+# Lowest copy number used in the likelihood so a full loss stays finite in log2 space
+MIN_COPY_NUMBER = 0.1
+# Median of the chi-square distribution with 1 degree of freedom
+CHI2_MEDIAN = 0.454936
+
+
+def load_calibration(calibration_file):
+    """Read {"Gain": {"slope", "intercept"}, "Loss": {...}}; identity when no file is given."""
+    identity = {"Gain": {"slope": 1.0, "intercept": 0.0}, "Loss": {"slope": 1.0, "intercept": 0.0}}
+    if not calibration_file or not Path(calibration_file).exists():
+        return identity
+    with open(calibration_file) as f:
+        calibration = json.load(f)
+    for mosaic_type in identity:
+        calibration.setdefault(mosaic_type, identity[mosaic_type])
+    return calibration
+
+
+def apply_calibration(fraction, mosaic_type, calibration):
+    """Map raw fractions to calibrated fractions per event type, clipped to [0, 1]."""
+    fraction = np.asarray(fraction, dtype=float)
+    slope = np.ones_like(fraction)
+    intercept = np.zeros_like(fraction)
+    for name, params in calibration.items():
+        selected = mosaic_type == name
+        slope[selected] = params["slope"]
+        intercept[selected] = params["intercept"]
+    return np.clip(slope * fraction + intercept, 0.0, 1.0)
+
+
+def estimate_mosaicism(ratio_file, segments_file, bin_size, chromosome_list, noise_file=None, gender='female', calibration_file=None, level=0.95):
+    """
+    Fit the mosaic fraction of every segment by grid likelihood over bin log2 ratios.
+
+    Bins of a segment are modelled as N(log2(CN(m) / 2), phi * sd_i^2) where CN(m) = P ± m,
+    P is the normal copy number of the chromosome, sd_i the reference panel noise of the bin
+    and phi a sample-level overdispersion factor. The posterior over the signed grid gives the
+    MAP fraction (mosaic.fraction, mosaic.type) and a credible interval (mosaic.lower/upper).
+    """
+    if segments_file is None or not Path(segments_file).exists():
+        return segments_file
+
+    segments_df = pd.read_csv(segments_file)
+    if segments_df.empty:
+        return str(segments_file)
+
+    data = np.load(ratio_file)
+    noise_data = np.load(noise_file) if noise_file and Path(noise_file).exists() else None
+
+    key_list, value_list, sd_list = [], [], []
+    for chromosome in chromosome_list:
+        if chromosome not in data.files:
+            continue
+        ratios = data[chromosome]
+        valid = ratios > -10
+        maploc = np.arange(len(ratios), dtype=np.int64) * bin_size + bin_size // 2
+        key_list.append(_chromosome_numeric(chromosome) * CHROMOSOME_KEY_OFFSET + maploc[valid])
+        value_list.append(ratios[valid].astype(float))
+        if noise_data is not None and chromosome in noise_data.files and len(noise_data[chromosome]) == len(ratios):
+            sd_list.append(noise_data[chromosome][valid].astype(float))
+        else:
+            sd_list.append(np.full(np.count_nonzero(valid), np.nan))
+
+    keys = np.concatenate(key_list)
+    values = np.concatenate(value_list)
+    sds = np.concatenate(sd_list)
+    order = np.argsort(keys, kind="mergesort")
+    keys, values, sds = keys[order], values[order], sds[order]
+
+    # Bins without panel noise use the sample's own robust noise (MAD of neighbour differences)
+    sample_sd = 1.4826 * np.median(np.abs(np.diff(values))) / np.sqrt(2.0) if values.size > 1 else 1.0
+    sample_sd = sample_sd if sample_sd > 0 else 1.0
+    sds = np.where(np.isnan(sds) | (sds <= 0), sample_sd, sds)
+    weights = 1.0 / np.square(sds)
+
+    chrom_col = segments_df['chrom_original'] if 'chrom_original' in segments_df.columns else segments_df['chrom']
+    seg_chrom = np.array([_chromosome_numeric(c) for c in chrom_col], dtype=np.int64)
+    low = np.searchsorted(keys, seg_chrom * CHROMOSOME_KEY_OFFSET + segments_df['loc.start'].to_numpy(dtype=np.int64), side="left")
+    high = np.searchsorted(keys, seg_chrom * CHROMOSOME_KEY_OFFSET + segments_df['loc.end'].to_numpy(dtype=np.int64), side="right")
+    num_bins = high - low
+
+    # Weighted sufficient statistics of every segment from prefix sums
+    sum_w = _segment_sum(weights, low, high)
+    sum_wx = _segment_sum(weights * values, low, high)
+    sum_wxx = _segment_sum(weights * values * values, low, high)
+
+    # Overdispersion: residuals around segment means compared with the panel variance
+    segment_index = np.repeat(np.arange(len(low)), num_bins)
+    bin_index = np.repeat(low - np.cumsum(num_bins) + num_bins, num_bins) + np.arange(num_bins.sum())
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weighted_mean = sum_wx / sum_w
+        residual = np.square(values[bin_index] - weighted_mean[segment_index]) * weights[bin_index]
+    phi = float(np.nanmedian(residual) / CHI2_MEDIAN) if residual.size else 1.0
+    phi = max(1.0, phi) if np.isfinite(phi) else 1.0
+
+    # Expected log2 ratio for every (segment, grid point)
+    baseline = np.array([baseline_copy_number(c, gender) for c in chrom_col], dtype=float)
+    copy_number = np.maximum(baseline[:, None] + MOSAIC_GRID[None, :], MIN_COPY_NUMBER)
+    mu = np.log2(copy_number / 2.0)
+
+    log_likelihood = -(sum_wxx[:, None] - 2.0 * mu * sum_wx[:, None] + mu * mu * sum_w[:, None]) / (2.0 * phi)
+    log_likelihood -= log_likelihood.max(axis=1, keepdims=True)
+    posterior = np.exp(log_likelihood)
+    posterior /= posterior.sum(axis=1, keepdims=True)
+
+    map_signed = MOSAIC_GRID[np.argmax(posterior, axis=1)]
+    cdf = np.cumsum(posterior, axis=1)
+    tail = (1.0 - level) / 2.0
+    q_low = MOSAIC_GRID[np.minimum((cdf < tail).sum(axis=1), len(MOSAIC_GRID) - 1)]
+    q_high = MOSAIC_GRID[np.minimum((cdf < 1.0 - tail).sum(axis=1), len(MOSAIC_GRID) - 1)]
+
+    mosaic_type = np.where(map_signed > 0, "Gain", np.where(map_signed < 0, "Loss", "No_Change"))
+    is_loss = map_signed < 0
+    fraction = np.abs(map_signed)
+    lower = np.where(is_loss, np.maximum(0.0, -q_high), np.maximum(0.0, q_low))
+    upper = np.where(is_loss, np.maximum(0.0, -q_low), np.maximum(0.0, q_high))
+
+    raw_fraction = fraction
+    calibration = load_calibration(calibration_file)
+    fraction = apply_calibration(fraction, mosaic_type, calibration)
+    lower = apply_calibration(lower, mosaic_type, calibration)
+    upper = apply_calibration(upper, mosaic_type, calibration)
+
+    # Segments without bins, or Y in a female sample, have nothing to estimate
+    undefined = (num_bins == 0) | (baseline == 0)
+    mosaic_type = np.where(undefined, "", mosaic_type)
+    raw_fraction, fraction, lower, upper = (np.where(undefined, np.nan, v) for v in (raw_fraction, fraction, lower, upper))
+
+    columns = {
+        'mosaic.type': mosaic_type,
+        'mosaic.raw': np.round(raw_fraction, 4),
+        'mosaic.fraction': np.round(fraction, 4),
+        'mosaic.lower': np.round(lower, 4),
+        'mosaic.upper': np.round(upper, 4),
+    }
+    segments_df = segments_df.drop(columns=[c for c in columns if c in segments_df.columns])
+    for column, value in columns.items():
+        segments_df[column] = value
+
+    segments_df.to_csv(segments_file, index=False)
+    print(f"Estimated mosaicism for {len(segments_df)} segments (overdispersion = {phi:.2f})")
+    return str(segments_file)
+
+
+def _segment_sum(array, low, high):
+    prefix = np.concatenate(([0.0], np.cumsum(array)))
+    return prefix[high] - prefix[low]
+
+
+def read_simulated_regions(bed_file):
+    """Read a simulation BED (chrom, chromStart, chromEnd, region, type, mosaic)."""
+    regions = pd.read_csv(bed_file, sep=r"\s+", header=None, comment='#',
+                          names=['chrom', 'chromStart', 'chromEnd', 'region', 'type', 'mosaic'])
+    regions = regions[regions['chrom'].astype(str) != 'chrom']
+    regions['chrom'] = regions['chrom'].map(_chromosome_numeric)
+    regions[['chromStart', 'chromEnd']] = regions[['chromStart', 'chromEnd']].astype(np.int64)
+    regions['mosaic'] = regions['mosaic'].astype(float)
+    regions['type'] = regions['type'].str.upper().map({'G': 'Gain', 'L': 'Loss'})
+    return regions
+
+
+def collect_calibration_pairs(segments_dir, bed_file):
+    """Match every simulated region to the segment with maximal overlap in each *_segments.csv."""
+    regions = read_simulated_regions(bed_file)
+    pairs = []
+    for segments_file in sorted(Path(segments_dir).glob("*_segments.csv")):
+        segments_df = pd.read_csv(segments_file)
+        if 'mosaic.raw' not in segments_df.columns or segments_df.empty:
+            continue
+        chrom_col = segments_df['chrom_original'] if 'chrom_original' in segments_df.columns else segments_df['chrom']
+        seg_chrom = np.array([_chromosome_numeric(c) for c in chrom_col])
+        seg_start = segments_df['loc.start'].to_numpy()
+        seg_end = segments_df['loc.end'].to_numpy()
+        # Fit on uncalibrated estimates so an existing calibration does not feed back into itself
+        raw_fraction = segments_df['mosaic.raw'].to_numpy()
+        seg_type = segments_df['mosaic.type'].to_numpy()
+
+        for region in regions.itertuples(index=False):
+            overlap = np.minimum(seg_end, region.chromEnd) - np.maximum(seg_start, region.chromStart)
+            overlap = np.where(seg_chrom == region.chrom, overlap, 0)
+            if overlap.max() <= 0:
+                continue
+            best = int(np.argmax(overlap))
+            estimate = raw_fraction[best] if seg_type[best] == region.type else 0.0
+            pairs.append((region.type, float(estimate), float(region.mosaic)))
+    return pairs
+
+
+def fit_calibration(pairs):
+    """Least-squares line true = slope * estimate + intercept per event type."""
+    calibration = load_calibration(None)
+    pairs_df = pd.DataFrame(pairs, columns=['type', 'estimate', 'truth']).dropna()
+    for mosaic_type, group in pairs_df.groupby('type'):
+        if len(group) < 2 or group['estimate'].nunique() < 2:
+            continue
+        slope, intercept = np.polyfit(group['estimate'], group['truth'], 1)
+        calibration[mosaic_type] = {"slope": float(slope), "intercept": float(intercept), "n": int(len(group))}
+    return calibration
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "Fit mosaic fraction calibration from simulated G/L experiments")
+    parser.add_argument('--experiment', nargs = 2, action = 'append', required = True, metavar = ('SEGMENTS_DIR', 'BED'),
+                        help = 'Directory of *_segments.csv and the simulation BED of that experiment')
+    parser.add_argument('-o', '--output', required = True, help = 'Output calibration JSON')
+    args = parser.parse_args()
+
+    pairs = []
+    for segments_dir, bed_file in args.experiment:
+        pairs.extend(collect_calibration_pairs(segments_dir, bed_file))
+    calibration = fit_calibration(pairs)
+
+    with open(args.output, 'w') as f:
+        json.dump(calibration, f, indent = 2)
+    print(f"Fitted calibration on {len(pairs)} regions: {calibration}")
+
+
+if __name__ == "__main__":
+    main()
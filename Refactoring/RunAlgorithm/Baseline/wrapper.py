@@ -6,9 +6,16 @@ import sys
 from pathlib import Path
 import pandas as pd
 import numpy as np
-import pysam
 import re
 import time
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# panel_cache.py và links.py nằm ở thư mục RunAlgorithm, dùng chung cho các wrapper
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from panel_cache import PanelCache  # noqa: E402
+from links import link_path, link_bam_files  # noqa: E402
 
 # Độ dài chromosome cho GRCh37
 CHROMOSOME_LENGTHS_GRCh37 = {
@@ -20,6 +27,21 @@ CHROMOSOME_LENGTHS_GRCh37 = {
     "21": 48129895, "22": 51304566, "X": 155270560, "Y": 59373566,
 }
 
+# Tệp đầu vào dùng chung trong Exe/Run/Input (ngoài BAM train)
+SHARED_INPUT_FILES = ("hg19.fa", "hg19.fa.fai", "consensusBlacklist.bed")
+# Tệp reference trong Temporary của entry cache (được symlink vào scratch của mỗi thí nghiệm)
+SHARED_REFERENCE_FILES = ("Blacklist.npz", "Reference.npz", "Reference_sd.npz", "XY_ratio.tsv")
+# Bin size khi run không có run_metadata.json (bản baseline.py cũ)
+DEFAULT_BIN_SIZE = 400000
+BED_COLUMNS = ['chrom', 'chromStart', 'chromEnd', 'copyNumber']
+# Định dạng upload của backend (ResultService.add_from_files)
+BACKEND_COLUMNS = {
+    'chrom': 'chromosome', 'chromStart': 'start', 'chromEnd': 'end', 'copyNumber': 'copy_number',
+    'readCount': 'read_count', 'gcContent': 'gc_content',
+}
+BACKEND_BIN_COLUMNS = ('chromosome', 'start', 'end', 'copy_number', 'read_count', 'gc_content')
+BACKEND_SEGMENT_COLUMNS = ('chromosome', 'start', 'end', 'copy_number', 'confidence')
+
 def standardize_chromosomes(chrom):
     """Chuẩn hóa chromosome: X -> 23, Y -> 24, và đảm bảo là int."""
     chrom = str(chrom).replace('chr', '')
@@ -27,73 +49,115 @@ def standardize_chromosomes(chrom):
     chrom = replacements.get(chrom, chrom)
     return int(chrom)
 
-def move_bam_files(src_dir, dst_dir):
-    """Di chuyển BAM và BAI từ src_dir sang dst_dir, tạo BAI nếu thiếu"""
-    for bam_file in src_dir.glob("*.bam"):
-        bam_dest = dst_dir / bam_file.name
-        shutil.move(bam_file, bam_dest)
-        bai_file = bam_file.with_suffix('.bam.bai')
-        bai_dest = bam_dest.with_suffix('.bam.bai')
-        if bai_file.exists():
-            shutil.move(bai_file, bai_dest)
-        else:
-            print(f"  - Tạo BAI cho {bam_file.name}")
-            pysam.index(str(bam_dest))
-
-def collect_bins(log2ratio_npz: Path, bin_size: int):
-    """Thu thập bins từ NPZ, trả về danh sách dict cho BED."""
-    bins = []
+def prepare_scratch(scratch_dir: Path, run_dir: Path, reference_dir: Path, experiment_dir: Path):
+    """
+    Thư mục làm việc riêng của một thí nghiệm: BAM test là symlink tới Input/{Experiment ID},
+    BAM train và genome là symlink tới Exe/Run/Input, filter, count train và reference là symlink
+    (chỉ đọc) tới entry cache reference_dir.
+    """
+    if scratch_dir.exists():
+        shutil.rmtree(scratch_dir)  # còn sót từ lần chạy bị ngắt
+    (scratch_dir / "Input" / "Test").mkdir(parents=True)
+    (scratch_dir / "Temporary" / "Test").mkdir(parents=True)
+    (scratch_dir / "Output").mkdir()
+
+    for name in ("Train",) + SHARED_INPUT_FILES:
+        link_path(scratch_dir / "Input" / name, run_dir / "Input" / name)
+    link_path(scratch_dir / "Prepare", reference_dir / "Prepare")
+    link_path(scratch_dir / "Temporary" / "Train", reference_dir / "Temporary" / "Train")
+    for name in SHARED_REFERENCE_FILES:
+        link_path(scratch_dir / "Temporary" / name, reference_dir / "Temporary" / name)
+
+    link_bam_files(experiment_dir, scratch_dir / "Input" / "Test")
+
+def read_run_metadata(run_output_dir: Path):
+    """Đọc run_metadata.json do baseline.py ghi (bin_size, ...); mặc định nếu run cũ không có."""
+    metadata_file = run_output_dir / "run_metadata.json"
+    if metadata_file.exists():
+        with open(metadata_file) as f:
+            return json.load(f)
+    print(f"  - Không tìm thấy {metadata_file.name}, dùng bin_size = {DEFAULT_BIN_SIZE}")
+    return {"bin_size": DEFAULT_BIN_SIZE}
+
+def collect_bins(log2ratio_npz: Path, bin_size: int, raw_npz: Path = None, gc_npz: Path = None):
+    """
+    Thu thập bins từ NPZ thành DataFrame (chrom, chromStart, chromEnd, copyNumber, readCount, gcContent).
+    Bin bị che (log2 ratio <= -10) bị loại; readCount/gcContent lấy từ raw count và GC-content nếu có.
+    """
     ratio = np.load(log2ratio_npz)
+    raw = np.load(raw_npz) if raw_npz is not None and Path(raw_npz).exists() else None
+    gc = np.load(gc_npz) if gc_npz is not None and Path(gc_npz).exists() else None
+
+    tables = []
     for chrom in ratio.files:
         chrom_std = standardize_chromosomes(chrom)
         if not (1 <= chrom_std <= 24):
             continue
         arr = ratio[chrom]
-        n = len(arr)
-        for i in range(n):
-            r = float(arr[i])
-            if r <= -10:  # bin bị che
-                continue
-            start = i * bin_size
-            end = min((i + 1) * bin_size, CHROMOSOME_LENGTHS_GRCh37.get(str(chrom), 0))
-            cn = float(2.0 ** (r + 1.0))
-            bins.append({
-                'chrom': chrom_std,
-                'chromStart': int(start),
-                'chromEnd': int(end),
-                'copyNumber': cn
-            })
-    return bins
+        index = np.flatnonzero(arr > -10)  # bỏ bin bị che
+        chrom_length = CHROMOSOME_LENGTHS_GRCh37.get(str(chrom), 0)
+        table = {
+            'chrom': np.full(index.size, chrom_std),
+            'chromStart': index * bin_size,
+            'chromEnd': np.minimum((index + 1) * bin_size, chrom_length),
+            'copyNumber': np.power(2.0, arr[index].astype(float) + 1.0),
+            'readCount': _values_at(raw, chrom, index, 0).astype(np.int64),
+            'gcContent': _values_at(gc, chrom, index, np.nan),
+        }
+        tables.append(pd.DataFrame(table))
+
+    columns = ['chrom', 'chromStart', 'chromEnd', 'copyNumber', 'readCount', 'gcContent']
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=columns)
+
+def _values_at(data, chrom, index, fill):
+    if data is None or chrom not in data.files:
+        return np.full(index.size, fill, dtype=float)
+    values = data[chrom]
+    inside = index < len(values)
+    out = np.full(index.size, fill, dtype=float)
+    out[inside] = values[index[inside]]
+    return out
 
 def collect_segments(segments_csv: Path):
-    """Thu thập segments từ CSV, trả về danh sách dict cho BED."""
-    segments = []
+    """Thu thập segments từ CSV thành DataFrame (chrom, chromStart, chromEnd, copyNumber, confidence)."""
+    columns = ['chrom', 'chromStart', 'chromEnd', 'copyNumber', 'confidence']
+    if not Path(segments_csv).exists():
+        return pd.DataFrame(columns=columns)
     df = pd.read_csv(segments_csv)
-    for _, row in df.iterrows():
-        chrom_std = standardize_chromosomes(row.get("chrom"))
-        if not (1 <= chrom_std <= 24):
-            continue
-        start = int(row.get("loc.start", 0))
-        end = int(row.get("loc.end", start))
-        seg_mean = float(row.get("seg.mean", 0.0))
-        cn = float(2.0 ** (seg_mean + 1.0))
-        segments.append({
-            'chrom': chrom_std,
-            'chromStart': start,
-            'chromEnd': end,
-            'copyNumber': cn
-        })
-    return segments
-
-def write_bed(file_path: Path, data: list, columns: list):
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    chrom_std = df['chrom'].map(standardize_chromosomes)
+    start = df['loc.start'].astype(np.int64) if 'loc.start' in df.columns else pd.Series(0, index=df.index)
+    end = df['loc.end'].astype(np.int64) if 'loc.end' in df.columns else start
+    seg_mean = df['seg.mean'].astype(float) if 'seg.mean' in df.columns else pd.Series(0.0, index=df.index)
+    segments = pd.DataFrame({
+        'chrom': chrom_std,
+        'chromStart': start,
+        'chromEnd': end,
+        'copyNumber': np.power(2.0, seg_mean + 1.0),
+        'confidence': df['confidence'] if 'confidence' in df.columns else np.nan,
+    })
+    return segments[chrom_std.between(1, 24)].reset_index(drop=True)
+
+def write_bed(file_path: Path, data: pd.DataFrame, columns: list):
     """Ghi dữ liệu vào file BED."""
-    with open(file_path, 'w') as f:
-        f.write('\t'.join(columns) + '\n')
-        for row in data:
-            f.write('\t'.join(str(row[col]) for col in columns) + '\n')
+    data[columns].to_csv(file_path, sep='\t', index=False)
+
+def write_backend_tsv(sample_output_dir: Path, sample_name: str, bins: pd.DataFrame, segments: pd.DataFrame):
+    """Ghi {sample}_bins.tsv và {sample}_segments.tsv theo định dạng upload của backend."""
+    bins_tsv = sample_output_dir / f"{sample_name}_bins.tsv"
+    bins.rename(columns=BACKEND_COLUMNS)[list(BACKEND_BIN_COLUMNS)].to_csv(bins_tsv, sep='\t', index=False)
+    segments_tsv = sample_output_dir / f"{sample_name}_segments.tsv"
+    segments.rename(columns=BACKEND_COLUMNS)[list(BACKEND_SEGMENT_COLUMNS)].to_csv(segments_tsv, sep='\t', index=False)
+    print(f"    - Ghi {bins_tsv.name}, {segments_tsv.name}")
 
-def process_sample_outputs(run_output_dir, exp_output_dir):
+def process_sample_outputs(run_output_dir, exp_output_dir, output_format="bed"):
     """Xử lý output cho từng sample"""
+    run_dir = run_output_dir.parent
+    bin_size = int(read_run_metadata(run_output_dir).get("bin_size", DEFAULT_BIN_SIZE))
+    gc_npz = run_dir / "Prepare" / "GC-content.npz"
+
     log2_files = sorted(run_output_dir.glob("*_log2Ratio.npz"))
     for log2_npz in log2_files:
         sample_name_raw = log2_npz.stem.replace("_log2Ratio", "")
@@ -101,88 +165,155 @@ def process_sample_outputs(run_output_dir, exp_output_dir):
         sample_output_dir = exp_output_dir / sample_name
         sample_output_dir.mkdir(parents=True, exist_ok=True)
 
-        # Chuyển đổi bins sang BED
-        bins_raw = collect_bins(log2_npz, bin_size=400000)  # Default bin_size
-        bins_bed = sample_output_dir / f"{sample_name}_baseline_bins.bed"
-        write_bed(bins_bed, bins_raw, ['chrom', 'chromStart', 'chromEnd', 'copyNumber'])
-        print(f"    - Ghi {bins_bed}")
-
-        # Chuyển đổi segments sang BED
-        segments_csv = run_output_dir / f"{sample_name_raw}_segments.csv"
-        segments_raw = collect_segments(segments_csv)
-        segments_bed = sample_output_dir / f"{sample_name}_baseline_segments.bed"
-        write_bed(segments_bed, segments_raw, ['chrom', 'chromStart', 'chromEnd', 'copyNumber'])
-        print(f"    - Ghi {segments_bed}")
-
-        # Đổi tên và di chuyển scatterChart
-        scatter_src = run_output_dir / f"{sample_name_raw}_scatterChart.png"
-        scatter_dst = sample_output_dir / f"{sample_name}_baseline_scatterChart.png"
-        shutil.move(str(scatter_src), str(scatter_dst))
-        print(f"    - Sao chép {scatter_dst}")
+        raw_npz = run_dir / "Temporary" / "Test" / f"{sample_name_raw}_rawCount.npz"
+        bins = collect_bins(log2_npz, bin_size, raw_npz, gc_npz)
+        segments = collect_segments(run_output_dir / f"{sample_name_raw}_segments.csv")
+
+        if output_format in ("bed", "both"):
+            # Chuyển đổi bins và segments sang BED
+            bins_bed = sample_output_dir / f"{sample_name}_baseline_bins.bed"
+            write_bed(bins_bed, bins, BED_COLUMNS)
+            print(f"    - Ghi {bins_bed}")
+            segments_bed = sample_output_dir / f"{sample_name}_baseline_segments.bed"
+            write_bed(segments_bed, segments, BED_COLUMNS)
+            print(f"    - Ghi {segments_bed}")
+
+        if output_format in ("backend", "both"):
+            write_backend_tsv(sample_output_dir, sample_name, bins, segments)
+
+        # Đổi tên và di chuyển scatterChart (PNG hoặc payload JSON; không có nếu chạy --no-plot)
+        for suffix in (".png", ".json"):
+            scatter_src = run_output_dir / f"{sample_name_raw}_scatterChart{suffix}"
+            if scatter_src.exists():
+                scatter_dst = sample_output_dir / f"{sample_name}_baseline_scatterChart{suffix}"
+                shutil.move(str(scatter_src), str(scatter_dst))
+                print(f"    - Sao chép {scatter_dst}")
+
+def baseline_options(args):
+    """Tham số truyền cho mọi lần chạy baseline.py."""
+    return ["--workers", str(args.workers), "--bin-size", str(args.bin_size), "--filter-ratio", str(args.filter_ratio)]
+
+def build_reference(code_dir: Path, run_dir: Path, cache: PanelCache, args):
+    """
+    Entry cache chứa Prepare/ (GC-content, filter) và Temporary/ (count train, Blacklist, Reference, XY_ratio)
+    dựng từ Exe/Run/Input; khóa theo digest của BAM train, hg19.fa, consensusBlacklist.bed, tham số và Exe/Code.
+    """
+    input_dir = run_dir / "Input"
+    train_bam_list = sorted((input_dir / "Train").glob("*.bam"))
+    if not train_bam_list:
+        raise FileNotFoundError(f"Không có BAM train trong {input_dir / 'Train'}")
+    inputs = train_bam_list + [input_dir / name for name in SHARED_INPUT_FILES if (input_dir / name).exists()]
+    params = {"bin_size": args.bin_size, "filter_ratio": args.filter_ratio, "reference_genome": "GRCh37"}
+
+    def builder(build_dir):
+        (build_dir / "Input").mkdir()
+        for name in ("Train",) + SHARED_INPUT_FILES:
+            link_path(build_dir / "Input" / name, input_dir / name)
+        cmd = [sys.executable, str(code_dir / "baseline.py"), "-o", str(build_dir), "--reference-only"] + baseline_options(args)
+        print(f"  - Chạy: {' '.join(cmd)}")
+        subprocess.run(cmd, cwd=str(code_dir), check=True)
+        for name in ("Input", "Output", "Temporary/Test"):
+            shutil.rmtree(build_dir / name, ignore_errors=True)
+
+    return cache.get_or_build("baseline", inputs, params, builder, code_dir=code_dir, rebuild=args.rebuild_cache)
+
+def run_experiment(experiment_dir: Path, code_dir: Path, run_dir: Path, reference_dir: Path, output_dir: Path, args, log_to_file: bool):
+    """
+    Chạy Baseline cho một thí nghiệm trong thư mục scratch riêng. Kết quả được ghi vào
+    Output/.{Experiment ID}.partial rồi đổi tên, nên Output/{Experiment ID} luôn là kết quả hoàn chỉnh.
+    """
+    experiment_name = experiment_dir.name
+    scratch_dir = run_dir / "Experiments" / experiment_name
+    prepare_scratch(scratch_dir, run_dir, reference_dir, experiment_dir)
+
+    start_time = time.perf_counter()
+    cmd = [sys.executable, str(code_dir / "baseline.py"), "-o", str(scratch_dir)] + baseline_options(args)
+    print(f"  - [{experiment_name}] Chạy: {' '.join(cmd)}")
+    if log_to_file:
+        with open(scratch_dir / "baseline.log", "w") as log:
+            process = subprocess.run(cmd, cwd=str(code_dir), stdout=log, stderr=subprocess.STDOUT)
+    else:
+        process = subprocess.run(cmd, cwd=str(code_dir))
+    elapsed_time = time.perf_counter() - start_time
+    if process.returncode != 0:
+        raise RuntimeError(f"baseline.py lỗi (mã {process.returncode}), xem {scratch_dir}")
+
+    partial_dir = output_dir / f".{experiment_name}.partial"
+    if partial_dir.exists():
+        shutil.rmtree(partial_dir)
+    partial_dir.mkdir(parents=True)
+    process_sample_outputs(scratch_dir / "Output", partial_dir, args.output_format)
+
+    experiment_output_directory = output_dir / experiment_name
+    if experiment_output_directory.exists():
+        shutil.rmtree(experiment_output_directory)
+    partial_dir.rename(experiment_output_directory)
+
+    if not args.keep_scratch:
+        shutil.rmtree(scratch_dir)
+    return elapsed_time
 
 def main():
+    parser = argparse.ArgumentParser(description="Chạy Baseline cho từng thí nghiệm trong Input/")
+    parser.add_argument('--format', dest='output_format', choices=['bed', 'backend', 'both'], default='bed',
+                        help='BED (chrom/chromStart/chromEnd/copyNumber), TSV upload của backend (_bins.tsv/_segments.tsv) hoặc cả hai')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Số thí nghiệm chạy đồng thời')
+    parser.add_argument('--workers', type=int, default=1, help='Số process của mỗi lần chạy baseline.py')
+    parser.add_argument('--keep-scratch', action='store_true', help='Giữ Exe/Run/Experiments/{Experiment ID} sau khi chạy')
+    parser.add_argument('--bin-size', type=int, default=DEFAULT_BIN_SIZE, help='Bin size của baseline.py')
+    parser.add_argument('--filter-ratio', type=float, default=0.9, help='Filter ratio của baseline.py')
+    parser.add_argument('--cache-dir', default=None, help='Thư mục cache train panel (mặc định Exe/Cache); có thể dùng chung giữa nhiều bộ dữ liệu')
+    parser.add_argument('--rehash', action='store_true', help='Băm lại toàn bộ tệp đầu vào thay vì tin size/mtime đã ghi nhớ')
+    parser.add_argument('--rebuild-cache', action='store_true', help='Dựng lại entry cache của train panel hiện tại')
+    args = parser.parse_args()
+
     root_dir = Path(__file__).resolve().parent
     input_dir = root_dir / "Input"
     exe_dir = root_dir / "Exe"
     output_dir = root_dir / "Output"
     run_dir = exe_dir / "Run"
     code_dir = exe_dir / "Code"
-    test_dir = run_dir / "Input" / "Test"
-    temp_test_dir = run_dir / "Temporary" / "Test"
-    run_output_dir = run_dir / "Output"
 
     experiments = [d for d in sorted(input_dir.iterdir()) if d.is_dir()]
     if not experiments:
         print("Không có experiment nào trong Input")
         return
+    output_dir.mkdir(parents=True, exist_ok=True)
 
-    run_times = []
-
-    for i, experiment_dir in enumerate(experiments, 1):
-        experiment_name = experiment_dir.name
-        print(f"\033[1m\n=== XỬ LÝ THÍ NGHIỆM [{i}/{len(experiments)}]: {experiment_name} ===\033[0m")
-
-        # 1. Dọn dẹp thư mục tạm thời và đầu ra
-        print("  - Dọn dẹp thư mục run")
-        if temp_test_dir.exists():
-            shutil.rmtree(temp_test_dir)
-            temp_test_dir.mkdir(parents=True)
-        if run_output_dir.exists():
-            shutil.rmtree(run_output_dir)
-            run_output_dir.mkdir(parents=True)
-
-        # 2. Di chuyển file BAM vào test_dir và xử lý .bai
-        print("  - Chuyển BAM vào Test")
-        move_bam_files(experiment_dir, test_dir)
-
-        # 3. Chạy Baseline
-        start_time = time.perf_counter()
-        cmd = [sys.executable, str(code_dir / "baseline.py"), "-o", str(run_dir)]
-        print(f"  - Chạy: {' '.join(cmd)}")
-        subprocess.run(cmd, cwd=str(code_dir))
-        end_time = time.perf_counter()
-        elapsed_time = end_time - start_time
-        run_times.append((experiment_name, elapsed_time))
-
-        # 4. Tạo thư mục đầu ra cho thí nghiệm
-        experiment_output_directory = output_dir / experiment_name
-        experiment_output_directory.mkdir(parents=True, exist_ok=True)
-
-        # 5. Xử lý đầu ra cho mỗi mẫu
-        if run_output_dir.exists():
-            process_sample_outputs(run_output_dir, experiment_output_directory)
+    # 1. Reference dùng chung, lấy từ cache theo digest của train panel
+    print("\033[1m\n=== REFERENCE DÙNG CHUNG ===\033[0m")
+    cache = PanelCache(Path(args.cache_dir) if args.cache_dir else exe_dir / "Cache", rehash=args.rehash)
+    reference_dir = build_reference(code_dir, run_dir, cache, args)
 
-        # 6. Khôi phục BAM
-        print("  - Khôi phục BAM về Input")
-        move_bam_files(test_dir, experiment_dir)
+    # 2. Chạy từng thí nghiệm trong scratch riêng, có thể đồng thời
+    run_times = {}
+    failed = []
+    jobs = max(1, args.jobs)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for i, experiment_dir in enumerate(experiments, 1):
+            print(f"\033[1m\n=== XỬ LÝ THÍ NGHIỆM [{i}/{len(experiments)}]: {experiment_dir.name} ===\033[0m")
+            futures[executor.submit(run_experiment, experiment_dir, code_dir, run_dir, reference_dir, output_dir, args, jobs > 1)] = experiment_dir.name
+        for future in as_completed(futures):
+            experiment_name = futures[future]
+            try:
+                run_times[experiment_name] = future.result()
+                print(f"  - Xong {experiment_name} ({run_times[experiment_name]:.1f}s)")
+            except Exception as e:
+                failed.append(experiment_name)
+                print(f"  - Lỗi {experiment_name}: {e}")
 
     # Ghi thời gian chạy ra file
     with open(output_dir / "run_time.tsv", "w") as f:
         f.write("experiment\telapsed_time\n")
-        for exp, time_val in run_times:
-            f.write(f"{exp}\t{time_val}\n")
+        for experiment_dir in experiments:
+            if experiment_dir.name in run_times:
+                f.write(f"{experiment_dir.name}\t{run_times[experiment_dir.name]}\n")
 
+    if failed:
+        print(f"\nHoàn tất, {len(failed)} thí nghiệm lỗi: {', '.join(sorted(failed))}")
+        sys.exit(1)
     print("\nHoàn tất!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
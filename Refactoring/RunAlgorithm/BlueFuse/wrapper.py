@@ -1,6 +1,8 @@
 import os
+import argparse
 import shutil
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 # Độ dài chromosome cho GRCh37
@@ -13,29 +15,102 @@ CHROMOSOME_LENGTHS_GRCh37 = {
     "21": 48129895, "22": 51304566, "X": 155270560, "Y": 59373566,
 }
 
+# Số hàng metadata + header ở đầu tệp _processed.xls
+BINS_HEADER_ROWS = 49
+# Số hàng đọc mỗi lần ở chế độ streaming
+STREAM_CHUNK_SIZE = 200000
+
+
+def chromosome_length(chrom):
+    """Độ dài chromosome theo mã số 1-24 (23 = X, 24 = Y)."""
+    names = {'23': 'X', '24': 'Y'}
+    return CHROMOSOME_LENGTHS_GRCh37.get(names.get(str(chrom), str(chrom)))
+
+
+def _read_bins(input_path, chunksize=None):
+    # Cột 1: copyNumber, cột 2: chrom, cột 3: start
+    return pd.read_csv(input_path, sep='\t', header=None, skiprows=BINS_HEADER_ROWS,
+                       usecols=[1, 2, 3], chunksize=chunksize)
+
+
+def _prepare_bins(df):
+    """Chọn cột, lọc NST 1-24; giữ nguyên thứ tự hàng."""
+    df = df[[2, 3, 1]]
+    df.columns = ['chrom', 'chromStart', 'copyNumber']
+    chrom_numeric = pd.to_numeric(df['chrom'], errors='coerce')
+    df = df[chrom_numeric.between(1, 24)].copy()
+    df['chrom'] = chrom_numeric[df.index].astype(int).astype(str)
+    df['chromStart'] = df['chromStart'].astype('int64')
+    return df.reset_index(drop=True)
+
+
+def validate_bins(df, finished=None, source=""):
+    """
+    Kiểm tra mỗi chromosome là một khối liên tục và chromStart tăng dần nghiêm ngặt trong khối.
+    `finished`: các chromosome đã kết thúc ở phần trước (chế độ streaming).
+    """
+    finished = finished or set()
+    new_block = df['chrom'] != df['chrom'].shift()
+    block_chroms = df.loc[new_block, 'chrom']
+    repeated = block_chroms[block_chroms.duplicated() | block_chroms.isin(finished)]
+    if not repeated.empty:
+        raise ValueError(f"{source}: chromosome {repeated.iloc[0]} không liên tục (xuất hiện ở nhiều khối)")
+
+    not_increasing = ~new_block & (df['chromStart'].diff() <= 0)
+    if not_increasing.any():
+        row = df[not_increasing].iloc[0]
+        raise ValueError(f"{source}: vị trí không tăng dần trên chromosome {row['chrom']} tại chromStart = {row['chromStart']}")
+
+
+def add_chrom_end(df):
+    """chromEnd = chromStart của bin kế tiếp cùng chromosome, bin cuối dùng độ dài chromosome."""
+    next_start = df.groupby('chrom', sort=False)['chromStart'].shift(-1)
+    lengths = df['chrom'].map(chromosome_length)
+    fallback = lengths.fillna(df['chromStart'] + 1)  # Mặc định nếu không biết
+    df['chromEnd'] = next_start.fillna(fallback).astype('int64')
+    return df[['chrom', 'chromStart', 'chromEnd', 'copyNumber']]
+
+
 def convert_bins_file(input_path, output_path):
     """Chuyển đổi processed.xls thành bluefuse_bins.bed"""
-    df = pd.read_csv(input_path, sep='\t', header=None, skiprows=49)
-    df = df.iloc[:, [2, 3, 1]]  # chrom, start, copyNumber
-    df.columns = ['chrom', 'chromStart', 'copyNumber']
-    df['chrom'] = df['chrom'].astype(str)
-    df = df[df['chrom'].astype(int).between(1, 24)]
-    
-    # Thêm chromEnd
-    chromEnd_list = []
-    for i, row in df.iterrows():
-        chrom = row['chrom']
-        if i + 1 < len(df) and df.iloc[i+1]['chrom'] == chrom:
-            chromEnd_list.append(df.iloc[i+1]['chromStart'])
-        else:
-            chromEnd_list.append(CHROMOSOME_LENGTHS_GRCh37.get(chrom, row['chromStart'] + 1))  # Mặc định nếu không biết
-    df['chromEnd'] = chromEnd_list
-    df = df[['chrom', 'chromStart', 'chromEnd', 'copyNumber']]
-    
+    df = _prepare_bins(_read_bins(input_path))
+    validate_bins(df, source=str(input_path))
+    df = add_chrom_end(df)
+
     # Ghi tệp BED (tab-separated, với header)
     df.to_csv(output_path, sep='\t', index=False, header=True)
     print("Đã chuyển đổi tệp bins")
 
+
+def convert_bins_file_streaming(input_path, output_path, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Như convert_bins_file nhưng đọc và ghi theo từng chunk để giới hạn bộ nhớ với tệp lớn.
+    Hàng cuối của mỗi chunk được giữ lại đến chunk sau vì chromEnd của nó phụ thuộc hàng kế tiếp.
+    """
+    carry = None
+    finished = set()
+    header = True
+    with open(output_path, 'w') as out:
+        for chunk in _read_bins(input_path, chunksize=chunk_size):
+            df = _prepare_bins(chunk)
+            if carry is not None:
+                df = pd.concat([carry, df], ignore_index=True)
+            if df.empty:
+                continue
+            validate_bins(df, finished, source=str(input_path))
+
+            last_chrom = df['chrom'].iloc[-1]
+            finished.update(set(df['chrom']) - {last_chrom})
+            carry = df.iloc[[-1]]
+            add_chrom_end(df.copy()).iloc[:-1].to_csv(out, sep='\t', index=False, header=header)
+            header = False
+
+        if carry is not None:
+            add_chrom_end(carry.copy()).to_csv(out, sep='\t', index=False, header=header)
+        elif header:
+            out.write("chrom\tchromStart\tchromEnd\tcopyNumber\n")
+    print("Đã chuyển đổi tệp bins (streaming)")
+
 def convert_segments_file(input_path, output_path):
     """Chuyển đổi segments.txt thành bluefuse_segments.bed"""
     df = pd.read_csv(input_path, sep='\t')
@@ -48,7 +123,56 @@ def convert_segments_file(input_path, output_path):
     df.to_csv(output_path, sep='\t', index=False, header=True)
     print("Đã chuyển đổi tệp segments")
 
+def process_sample(experiment_name, sample_dir, output_dir, stream=False, chunk_size=STREAM_CHUNK_SIZE):
+    """Chuyển đổi bins, segments và ảnh của một mẫu."""
+    sample_id = sample_dir.name
+    print(f"  Đang xử lý mẫu: {experiment_name}/{sample_id}")
+
+    # Tạo thư mục đầu ra
+    sample_output_dir = output_dir / experiment_name / sample_id
+    sample_output_dir.mkdir(parents=True, exist_ok=True)
+
+    # Xác định đường dẫn tệp - tìm tệp động
+    bins_files = list(sample_dir.glob("*_processed.xls"))
+    bins_input = bins_files[0] if bins_files else None
+    bins_output = sample_output_dir / f"{sample_id}_bluefuse_bins.bed"
+
+    segments_input = sample_dir / f"{sample_id}_segments.txt"
+    segments_output = sample_output_dir / f"{sample_id}_bluefuse_segments.bed"
+
+    image_files = list(sample_dir.glob("*.jpg"))
+    image_input = image_files[0] if image_files else None
+    image_output = sample_output_dir / f"{sample_id}_bluefuse_scatterChart.jpg"
+
+    # Chuyển đổi tệp
+    if bins_input and bins_input.exists():
+        if stream:
+            convert_bins_file_streaming(bins_input, bins_output, chunk_size)
+        else:
+            convert_bins_file(bins_input, bins_output)
+    else:
+        print("Không tìm thấy tệp bins")
+
+    if segments_input.exists():
+        convert_segments_file(segments_input, segments_output)
+    else:
+        print("Không tìm thấy tệp segments")
+
+    if image_input and image_input.exists():
+        shutil.copy2(image_input, image_output)
+        print("Đã sao chép và đổi tên ảnh")
+    else:
+        print("Không tìm thấy tệp ảnh")
+    return sample_id
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Chuyển đổi kết quả BlueFuse sang BED")
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Số process xử lý song song các mẫu (1 = tuần tự)')
+    parser.add_argument('--stream', action='store_true', help='Đọc/ghi tệp bins theo chunk (tệp _processed.xls lớn)')
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE, help='Số hàng mỗi chunk ở chế độ streaming')
+    args = parser.parse_args()
+
     base_dir = Path(__file__).parent
     input_dir = base_dir / 'Input'
     output_dir = base_dir / 'Output'
@@ -61,51 +185,34 @@ def main():
     output_dir.mkdir(parents=True, exist_ok=True)
     
     # Quét các thí nghiệm
-    for experiment_dir in input_dir.iterdir():
+    jobs = []
+    for experiment_dir in sorted(input_dir.iterdir()):
         if not experiment_dir.is_dir():
             continue
-        experiment_name = experiment_dir.name
-        print(f"Đang xử lý thí nghiệm: {experiment_name}")
-        
-        for sample_dir in experiment_dir.iterdir():
-            if not sample_dir.is_dir():
-                continue
-            sample_id = sample_dir.name
-            print(f"  Đang xử lý mẫu: {sample_id}")
-            
-            # Tạo thư mục đầu ra
-            experiment_output_directory = output_dir / experiment_name
-            sample_output_dir = experiment_output_directory / sample_id
-            sample_output_dir.mkdir(parents=True, exist_ok=True)
-            
-            # Xác định đường dẫn tệp - tìm tệp động
-            bins_files = list(sample_dir.glob("*_processed.xls"))
-            bins_input = bins_files[0] if bins_files else None
-            bins_output = sample_output_dir / f"{sample_id}_bluefuse_bins.bed"
-            
-            segments_input = sample_dir / f"{sample_id}_segments.txt"
-            segments_output = sample_output_dir / f"{sample_id}_bluefuse_segments.bed"
-            
-            image_files = list(sample_dir.glob("*.jpg"))
-            image_input = image_files[0] if image_files else None
-            image_output = sample_output_dir / f"{sample_id}_bluefuse_scatterChart.jpg"
-            
-            # Chuyển đổi tệp
-            if bins_input and bins_input.exists():
-                convert_bins_file(bins_input, bins_output)
-            else:
-                print("Không tìm thấy tệp bins")
-            
-            if segments_input.exists():
-                convert_segments_file(segments_input, segments_output)
-            else:
-                print("Không tìm thấy tệp segments")
-            
-            if image_input and image_input.exists():
-                shutil.copy2(image_input, image_output)
-                print("Đã sao chép và đổi tên ảnh")
-            else:
-                print("Không tìm thấy tệp ảnh")
+        print(f"Đang xử lý thí nghiệm: {experiment_dir.name}")
+        for sample_dir in sorted(experiment_dir.iterdir()):
+            if sample_dir.is_dir():
+                jobs.append((experiment_dir.name, sample_dir))
+
+    if args.workers <= 1:
+        for experiment_name, sample_dir in jobs:
+            process_sample(experiment_name, sample_dir, output_dir, args.stream, args.chunk_size)
+        return
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(process_sample, experiment_name, sample_dir, output_dir, args.stream, args.chunk_size): (experiment_name, sample_dir.name)
+            for experiment_name, sample_dir in jobs
+        }
+        for future in as_completed(futures):
+            experiment_name, sample_id = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Lỗi xử lý mẫu {experiment_name}/{sample_id}: {e}")
+    print(f"Hoàn tất {len(jobs) - failed}/{len(jobs)} mẫu")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -28,9 +28,23 @@ def convert_bam_to_npz(bam_dir, output_dir):
         print(f"   - Chuyển đổi {bam_file.name} sang {output_npz.name}")
         run_command(command)
 
+def create_reference(train_bam_dir, train_npz_dir, reference_file):
+    if reference_file.exists():
+        print(f"   - Tệp reference đã tồn tại tại: {reference_file}. Bỏ qua bước tạo mới.")
+        return
+    convert_bam_to_npz(train_bam_dir, train_npz_dir)
+    npz_ref_files = list(train_npz_dir.glob("*.npz"))
+    if not npz_ref_files:
+        print(f"Lỗi: Không tìm thấy tệp .npz nào trong {train_npz_dir} để tạo reference", file=sys.stderr)
+        sys.exit(1)
+
+    command = ["WisecondorX", "newref"] + npz_ref_files + [reference_file] + ["--binsize", "400000"]
+    run_command(command)
+
 def main():
     parser = argparse.ArgumentParser(description="Pipeline của WisecondorX.")
     parser.add_argument("-o", "--work_dir", required=True, help="Root working directory")
+    parser.add_argument("--reference-only", action="store_true", help="Chỉ tạo Temporary/Reference.npz từ Input/Train rồi dừng")
     args = parser.parse_args()
 
     work_dir = Path(args.work_dir)
@@ -40,7 +54,13 @@ def main():
     output_dir = work_dir / "Output"
     test_npz_dir = work_dir / "Temporary" / "Test"
     train_npz_dir = work_dir / "Temporary" / "Train"
-    train_npz_dir.mkdir(exist_ok=True)
+    reference_file = reference_dir / "Reference.npz"
+
+    if args.reference_only:
+        print("\n>>> Tạo tệp Reference")
+        train_npz_dir.mkdir(parents=True, exist_ok=True)
+        create_reference(train_bam_dir, train_npz_dir, reference_file)
+        return
 
     # 1. Chuyển BAM sang NPZ
     print("\n>>> Bước 1: Chuyển đổi tệp BAM test sang định dạng .npz")
@@ -48,19 +68,8 @@ def main():
 
     # 2. Tạo tệp Reference
     print("\n>>> Bước 2: Kiểm tra và tạo tệp Reference")
-    reference_file = reference_dir / "Reference.npz"
-
-    if reference_file.exists():
-        print(f"   - Tệp reference đã tồn tại tại: {reference_file}. Bỏ qua bước tạo mới.")
-    else:
-        convert_bam_to_npz(train_bam_dir, train_npz_dir)
-        npz_ref_files = list(train_npz_dir.glob("*.npz"))
-        if not npz_ref_files:
-            print(f"Lỗi: Không tìm thấy tệp .npz nào trong {train_npz_dir} để tạo reference", file=sys.stderr)
-            sys.exit(1)
-
-        command = ["WisecondorX", "newref"] + npz_ref_files + [reference_file] + ["--binsize", "400000"]
-        run_command(command)
+    train_npz_dir.mkdir(exist_ok=True)
+    create_reference(train_bam_dir, train_npz_dir, reference_file)
 
     # 3. Chạy predict
     print("\n>>> Bước 3: Chạy WisecondorX predict cho từng mẫu test")
@@ -5,9 +5,18 @@ import subprocess
 import sys
 from pathlib import Path
 import pandas as pd
-import pysam
 import re
 import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# panel_cache.py và links.py nằm ở thư mục RunAlgorithm, dùng chung cho các wrapper
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from panel_cache import PanelCache  # noqa: E402
+from links import link_path, link_bam_files  # noqa: E402
+
+# Bin size cố định của wisecondorx.py (convert / newref)
+WISECONDORX_BIN_SIZE = 400000
 
 def standardize_chromosomes(df, chromosome_col):
     """
@@ -22,18 +31,18 @@ def standardize_chromosomes(df, chromosome_col):
     df_filtered = df_copy[(df_copy[chromosome_col] >= 1) & (df_copy[chromosome_col] <= 24)]
     return df_filtered
 
-def move_bam_files(src_dir, dst_dir):
-    """Di chuyển BAM và BAI từ src_dir sang dst_dir, tạo BAI nếu thiếu"""
-    for bam_file in src_dir.glob("*.bam"):
-        bam_dest = dst_dir / bam_file.name
-        shutil.move(bam_file, bam_dest)
-        bai_file = bam_file.with_suffix('.bam.bai')
-        bai_dest = bam_dest.with_suffix('.bam.bai')
-        if bai_file.exists():
-            shutil.move(bai_file, bai_dest)
-        else:
-            print(f"  - Tạo BAI cho {bam_file.name}")
-            pysam.index(str(bam_dest))
+def prepare_scratch(scratch_dir: Path, reference_dir: Path, experiment_dir: Path):
+    """
+    Thư mục làm việc riêng của một thí nghiệm: BAM test là symlink tới Input/{Experiment ID},
+    Reference.npz là symlink (chỉ đọc) tới entry cache reference_dir.
+    """
+    if scratch_dir.exists():
+        shutil.rmtree(scratch_dir)  # còn sót từ lần chạy bị ngắt
+    (scratch_dir / "Input" / "Test").mkdir(parents=True)
+    (scratch_dir / "Temporary" / "Test").mkdir(parents=True)
+    (scratch_dir / "Output").mkdir()
+    link_path(scratch_dir / "Temporary" / "Reference.npz", reference_dir / "Reference.npz")
+    link_bam_files(experiment_dir, scratch_dir / "Input" / "Test")
 
 def process_bed_file(bed_file, output_file):
     """Xử lý file BED (bins hoặc segments) và ghi ra định dạng chuẩn."""
@@ -71,73 +80,126 @@ def process_sample_outputs(run_output_dir, output_experiment_dir):
         shutil.copy2(scatter_src, scatter_dst)
         print(f"    - Sao chép {scatter_dst}")
 
+def build_reference(code_dir: Path, run_dir: Path, cache: PanelCache, rebuild: bool):
+    """
+    Entry cache chứa Reference.npz (WisecondorX newref) dựng từ Exe/Run/Input/Train;
+    khóa theo digest của BAM train, bin size và Exe/Code.
+    """
+    train_dir = run_dir / "Input" / "Train"
+    train_bam_list = sorted(train_dir.glob("*.bam"))
+    if not train_bam_list:
+        raise FileNotFoundError(f"Không có BAM train trong {train_dir}")
+
+    def builder(build_dir):
+        (build_dir / "Input").mkdir()
+        link_path(build_dir / "Input" / "Train", train_dir)
+        cmd = [sys.executable, str(code_dir / "wisecondorx.py"), "-o", str(build_dir), "--reference-only"]
+        print(f"  - Chạy: {' '.join(cmd)}")
+        subprocess.run(cmd, check=True)
+        (build_dir / "Temporary" / "Reference.npz").rename(build_dir / "Reference.npz")
+        for name in ("Input", "Temporary"):
+            shutil.rmtree(build_dir / name, ignore_errors=True)
+
+    return cache.get_or_build(
+        "wisecondorx", train_bam_list, {"binsize": WISECONDORX_BIN_SIZE}, builder, code_dir=code_dir, rebuild=rebuild
+    )
+
+def run_experiment(experiment_dir: Path, code_dir: Path, run_dir: Path, reference_dir: Path, output_dir: Path, keep_scratch: bool, log_to_file: bool):
+    """
+    Chạy WisecondorX cho một thí nghiệm trong thư mục scratch riêng. Kết quả được ghi vào
+    Output/.{Experiment ID}.partial rồi đổi tên, nên Output/{Experiment ID} luôn là kết quả hoàn chỉnh.
+    """
+    experiment_id = experiment_dir.name
+    scratch_dir = run_dir / "Experiments" / experiment_id
+    prepare_scratch(scratch_dir, reference_dir, experiment_dir)
+
+    start_time = time.perf_counter()
+    cmd = [sys.executable, str(code_dir / "wisecondorx.py"), "-o", str(scratch_dir)]
+    print(f"  - [{experiment_id}] Chạy: {' '.join(cmd)}")
+    if log_to_file:
+        with open(scratch_dir / "wisecondorx.log", "w") as log:
+            process = subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT)
+    else:
+        process = subprocess.run(cmd)
+    elapsed_time = time.perf_counter() - start_time
+    if process.returncode != 0:
+        raise RuntimeError(f"wisecondorx.py lỗi (mã {process.returncode}), xem {scratch_dir}")
+
+    partial_dir = output_dir / f".{experiment_id}.partial"
+    if partial_dir.exists():
+        shutil.rmtree(partial_dir)
+    partial_dir.mkdir(parents=True)
+    process_sample_outputs(scratch_dir / "Output", partial_dir)
+
+    experiment_output_dir = output_dir / experiment_id
+    if experiment_output_dir.exists():
+        shutil.rmtree(experiment_output_dir)
+    partial_dir.rename(experiment_output_dir)
+
+    if not keep_scratch:
+        shutil.rmtree(scratch_dir)
+    return elapsed_time
+
 def main():
+    parser = argparse.ArgumentParser(description="Chạy WisecondorX cho từng thí nghiệm trong Input/")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Số thí nghiệm chạy đồng thời')
+    parser.add_argument('--keep-scratch', action='store_true', help='Giữ Exe/Run/Experiments/{Experiment ID} sau khi chạy')
+    parser.add_argument('--cache-dir', default=None, help='Thư mục cache train panel (mặc định Exe/Cache); có thể dùng chung giữa nhiều bộ dữ liệu')
+    parser.add_argument('--rehash', action='store_true', help='Băm lại toàn bộ BAM train thay vì tin size/mtime đã ghi nhớ')
+    parser.add_argument('--rebuild-cache', action='store_true', help='Dựng lại entry cache của train panel hiện tại')
+    args = parser.parse_args()
+
     root_dir = Path(__file__).resolve().parent
     input_dir = root_dir / "Input"
     exe_dir = root_dir / "Exe"
     output_dir = root_dir / "Output"
     run_dir = exe_dir / "Run"
     code_dir = exe_dir / "Code"
-    test_dir = run_dir / "Input" / "Test"
-    temp_test_dir = run_dir / "Temporary" / "Test"
-    run_output_dir = run_dir / "Output"
 
     if not input_dir.exists():
         print("Không tìm thấy thư mục Input")
         return
 
-    experiments = [d for d in input_dir.iterdir() if d.is_dir()]
+    experiments = [d for d in sorted(input_dir.iterdir()) if d.is_dir()]
     if not experiments:
         print("Không có experiment nào trong Input")
         return
-
-    run_times = []
-
-    for i, experiment_dir in enumerate(experiments, 1):
-        experiment_id = experiment_dir.name
-        print(f"\033[1m\n=== XỬ LÝ THÍ NGHIỆM [{i}/{len(experiments)}]: {experiment_id} ===\033[0m")
-
-        # 1. Dọn dẹp thư mục tạm thời và đầu ra
-        print("  - Dọn dẹp thư mục run")
-        if temp_test_dir.exists():
-            shutil.rmtree(temp_test_dir)
-            temp_test_dir.mkdir(parents=True)
-        if run_output_dir.exists():
-            shutil.rmtree(run_output_dir)
-            run_output_dir.mkdir(parents=True)
-
-        # 2. Di chuyển file BAM vào test_dir và xử lý .bai
-        print("  - Chuyển BAM vào Test")
-        move_bam_files(experiment_dir, test_dir)
-
-        # 3. Chạy WisecondorX
-        start_time = time.perf_counter()
-        cmd = [sys.executable, str(code_dir / "wisecondorx.py"), "-o", str(run_dir)]
-        print(f"  - Chạy: {' '.join(cmd)}")
-        subprocess.run(cmd, check=True)
-        end_time = time.perf_counter()
-        elapsed_time = end_time - start_time
-        run_times.append((experiment_id, elapsed_time))
-
-        # 4. Tạo thư mục đầu ra cho thí nghiệm
-        experiment_output_dir = output_dir / experiment_id
-        experiment_output_dir.mkdir(parents=True, exist_ok=True)
-
-        # 5. Xử lý đầu ra cho mỗi mẫu
-        if run_output_dir.exists():
-            process_sample_outputs(run_output_dir, experiment_output_dir)
-
-        # 6. Khôi phục BAM
-        print("  - Khôi phục BAM về Input")
-        move_bam_files(test_dir, experiment_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # 1. Reference dùng chung, lấy từ cache theo digest của train panel
+    print("\033[1m\n=== REFERENCE DÙNG CHUNG ===\033[0m")
+    cache = PanelCache(Path(args.cache_dir) if args.cache_dir else exe_dir / "Cache", rehash=args.rehash)
+    reference_dir = build_reference(code_dir, run_dir, cache, args.rebuild_cache)
+
+    # 2. Chạy từng thí nghiệm trong scratch riêng, có thể đồng thời
+    run_times = {}
+    failed = []
+    jobs = max(1, args.jobs)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for i, experiment_dir in enumerate(experiments, 1):
+            print(f"\033[1m\n=== XỬ LÝ THÍ NGHIỆM [{i}/{len(experiments)}]: {experiment_dir.name} ===\033[0m")
+            futures[executor.submit(run_experiment, experiment_dir, code_dir, run_dir, reference_dir, output_dir, args.keep_scratch, jobs > 1)] = experiment_dir.name
+        for future in as_completed(futures):
+            experiment_id = futures[future]
+            try:
+                run_times[experiment_id] = future.result()
+                print(f"  - Xong {experiment_id} ({run_times[experiment_id]:.1f}s)")
+            except Exception as e:
+                failed.append(experiment_id)
+                print(f"  - Lỗi {experiment_id}: {e}")
 
     # Ghi thời gian chạy ra file
     with open(output_dir / "run_time.tsv", "w") as f:
         f.write("experiment\telapsed_time\n")
-        for exp, time_val in run_times:
-            f.write(f"{exp}\t{time_val}\n")
+        for experiment_dir in experiments:
+            if experiment_dir.name in run_times:
+                f.write(f"{experiment_dir.name}\t{run_times[experiment_dir.name]}\n")
 
+    if failed:
+        print(f"\nHoàn tất, {len(failed)} thí nghiệm lỗi: {', '.join(sorted(failed))}")
+        sys.exit(1)
     print("\nHoàn tất!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
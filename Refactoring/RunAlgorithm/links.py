@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Symlink dùng chung cho các wrapper: dựng scratch của thí nghiệm và entry cache từ Input mà không sao chép BAM.
+"""
+from pathlib import Path
+
+import pysam
+
+
+def link_path(link: Path, target: Path):
+    """Tạo symlink link -> target (đường dẫn tuyệt đối); bỏ qua nếu target không tồn tại."""
+    if not target.exists():
+        return
+    if link.is_symlink() or link.exists():
+        link.unlink()
+    link.symlink_to(target.resolve())
+
+
+def link_bam_files(src_dir, dst_dir):
+    """Symlink BAM và BAI từ src_dir sang dst_dir; BAI thiếu được tạo trong dst_dir, không ghi vào Input"""
+    for bam_file in sorted(src_dir.glob("*.bam")):
+        bam_dest = dst_dir / bam_file.name
+        link_path(bam_dest, bam_file)
+        bai_file = bam_file.with_suffix('.bam.bai')
+        bai_dest = bam_dest.with_suffix('.bam.bai')
+        if bai_file.exists():
+            link_path(bai_dest, bai_file)
+        else:
+            print(f"  - Tạo BAI cho {bam_file.name}")
+            pysam.index(str(bam_dest))
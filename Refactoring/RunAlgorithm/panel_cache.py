@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Cache dùng chung cho dữ liệu dựng từ train panel (reference, blacklist, count train...).
+
+Mỗi entry được định danh bởi khóa = SHA-256 của (nội dung các tệp đầu vào + tham số + mã nguồn dựng entry),
+nên khi BAM train, genome, tham số hay code (baseline.py, filter.py, estimate.py...) thay đổi thì khóa đổi
+và entry cũ không bao giờ được dùng lại. Entry được dựng trong
+thư mục tạm rồi đổi tên (không có entry dở dang) và mang manifest.json với digest của từng artifact;
+entry bị sửa hoặc thiếu tệp sẽ bị loại và dựng lại.
+
+Digest của tệp đầu vào lớn (BAM, FASTA) được ghi nhớ trong digests.json theo (size, mtime_ns) để không
+phải băm lại ở mỗi lần chạy; dùng rehash=True để luôn băm lại toàn bộ.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+MANIFEST_NAME = "manifest.json"
+DIGEST_INDEX_NAME = "digests.json"
+CHUNK_SIZE = 1 << 20
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_digest(code_dir):
+    """SHA-256 của mọi tệp mã nguồn trong code_dir (bỏ qua __pycache__), theo đường dẫn tương đối."""
+    code_dir = Path(code_dir)
+    digest = hashlib.sha256()
+    for path in sorted(p for p in code_dir.rglob("*") if p.is_file() and "__pycache__" not in p.parts):
+        digest.update(str(path.relative_to(code_dir)).encode() + b"\0")
+        digest.update(sha256_file(path).encode())
+    return digest.hexdigest()
+
+
+class PanelCache:
+    def __init__(self, cache_dir, rehash=False):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.rehash = rehash
+        self._index_file = self.cache_dir / DIGEST_INDEX_NAME
+
+    @contextmanager
+    def lock(self):
+        """Khóa độc quyền trên thư mục cache (nhiều wrapper có thể dùng chung một --cache-dir)."""
+        with open(self.cache_dir / ".lock", "w") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _load_index(self):
+        try:
+            with open(self._index_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index):
+        tmp_file = self._index_file.with_suffix(".tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(tmp_file, self._index_file)
+
+    def input_digests(self, files):
+        """{tên tệp: sha256} của các tệp đầu vào; chỉ băm lại tệp có size/mtime khác lần trước."""
+        index = self._load_index()
+        digests = {}
+        for path in sorted(Path(p) for p in files):
+            stat = path.stat()
+            resolved = str(path.resolve())
+            known = index.get(resolved)
+            if self.rehash or not known or known["size"] != stat.st_size or known["mtime_ns"] != stat.st_mtime_ns:
+                print(f"  - Tính digest {path.name}")
+                known = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256_file(path)}
+                index[resolved] = known
+            digests[path.name] = known["sha256"]
+        self._save_index(index)
+        return digests
+
+    @staticmethod
+    def make_key(kind, digests, params, code=None):
+        payload = json.dumps({"kind": kind, "inputs": digests, "params": params, "code": code}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    def entry_dir(self, kind, key):
+        return self.cache_dir / f"{kind}-{key}"
+
+    def validate(self, entry_dir):
+        """Entry hợp lệ khi manifest tồn tại và mọi artifact còn nguyên (size + sha256)."""
+        try:
+            with open(entry_dir / MANIFEST_NAME) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        for relpath, info in manifest["artifacts"].items():
+            path = entry_dir / relpath
+            if not path.is_file() or path.stat().st_size != info["size"] or sha256_file(path) != info["sha256"]:
+                print(f"  - Cache {entry_dir.name} không hợp lệ: {relpath}")
+                return False
+        return True
+
+    def get_or_build(self, kind, inputs, params, builder, code_dir=None, rebuild=False):
+        """
+        Trả về thư mục entry cho (inputs, params, code_dir). Nếu chưa có, không hợp lệ hoặc rebuild=True, gọi
+        builder(build_dir): builder ghi artifact vào build_dir và tự xóa symlink/tệp phụ của nó,
+        mọi tệp còn lại trong build_dir sau đó đều thuộc entry.
+        """
+        with self.lock():
+            digests = self.input_digests(inputs)
+            code = code_digest(code_dir) if code_dir is not None else None
+            key = self.make_key(kind, digests, params, code)
+            entry_dir = self.entry_dir(kind, key)
+            if entry_dir.exists():
+                if not rebuild and self.validate(entry_dir):
+                    print(f"  - Dùng lại cache {entry_dir}")
+                    return entry_dir
+                shutil.rmtree(entry_dir)
+
+            build_dir = self.cache_dir / f".{kind}-{key}.building"
+            if build_dir.exists():
+                shutil.rmtree(build_dir)  # còn sót từ lần dựng bị ngắt
+            build_dir.mkdir()
+            print(f"  - Dựng cache {entry_dir}")
+            builder(build_dir)
+
+            artifacts = {}
+            for path in sorted(p for p in build_dir.rglob("*") if p.is_file() and not p.is_symlink()):
+                artifacts[str(path.relative_to(build_dir))] = {"size": path.stat().st_size, "sha256": sha256_file(path)}
+            manifest = {
+                "kind": kind,
+                "key": key,
+                "params": params,
+                "inputs": digests,
+                "code": code,
+                "artifacts": artifacts,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            with open(build_dir / MANIFEST_NAME, "w") as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+            build_dir.rename(entry_dir)
+            return entry_dir
@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
 import os
 import sys
-import random
+import argparse
+import zlib
+import numpy as np
 import pysam
 import glob
 import shutil
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Số reads xử lý trong một lần tra region + rút ngẫu nhiên
+CHUNK_SIZE = 100000
 
 
 def parse_bed_file(bed_path):
@@ -54,21 +60,59 @@ def standardize_chromosomes(chrom_name):
     return chrom_str
 
 
-def read_overlaps_region(read, regions, ref_name):
-    """Xác định region của read, trả về region_id (0 nếu không thuộc region nào)."""
-    if read.is_unmapped:
-        return 0
-    
-    for region in regions:
-        norm_ref = standardize_chromosomes(ref_name)
-        norm_region = standardize_chromosomes(region['chrom'])
-        if norm_ref != norm_region:
-            continue
-        
-        if read.reference_start < region['end'] and read.reference_end > region['start']:
-            return region['region']
-    
-    return 0  # Không thuộc region nào
+class RegionIndex:
+    """
+    Chỉ mục interval theo từng chromosome (đã chuẩn hóa) để tra region của nhiều read cùng lúc.
+
+    Regions của mỗi chromosome được sắp theo start. Nếu chúng không chồng lấn thì ends cũng tăng
+    dần và các region giao với read [s, e) là đoạn [searchsorted(ends, s), searchsorted(starts, e)).
+    Khi có nhiều region cùng giao (read nằm vắt qua ranh giới hoặc region chồng lấn), chọn region
+    đứng trước trong file BED, giống hành vi quét tuần tự trước đây.
+    """
+
+    def __init__(self, regions):
+        self.chromosomes = {}
+        grouped = defaultdict(list)
+        for order, region in enumerate(regions):
+            grouped[standardize_chromosomes(region['chrom'])].append((region['start'], region['end'], order, region['region']))
+
+        for chrom, items in grouped.items():
+            items.sort()
+            starts = np.array([item[0] for item in items], dtype=np.int64)
+            ends = np.array([item[1] for item in items], dtype=np.int64)
+            self.chromosomes[chrom] = {
+                'starts': starts,
+                'ends': ends,
+                'order': np.array([item[2] for item in items], dtype=np.int64),
+                'ids': np.array([item[3] for item in items], dtype=np.int64),
+                'disjoint': bool(np.all(starts[1:] >= ends[:-1])),
+            }
+
+    def lookup(self, chrom, read_starts, read_ends):
+        """Region ID cho từng read [start, end) trên chrom (0 nếu không thuộc region nào)."""
+        result = np.zeros(len(read_starts), dtype=np.int64)
+        index = self.chromosomes.get(standardize_chromosomes(chrom))
+        if index is None or len(read_starts) == 0:
+            return result
+
+        if index['disjoint']:
+            low = np.searchsorted(index['ends'], read_starts, side='right')
+            high = np.searchsorted(index['starts'], read_ends, side='left')
+            hit = high > low
+            result[hit] = index['ids'][low[hit]]
+            # Read giao nhiều region: lấy region đứng trước trong BED
+            for i in np.flatnonzero(high - low > 1):
+                candidates = np.arange(low[i], high[i])
+                result[i] = index['ids'][candidates[np.argmin(index['order'][candidates])]]
+            return result
+
+        # Region chồng lấn: so khớp trực tiếp với các region (thường rất ít) của chromosome này
+        overlap = (read_starts[:, None] < index['ends'][None, :]) & (read_ends[:, None] > index['starts'][None, :])
+        rank = np.where(overlap, index['order'][None, :], np.iinfo(np.int64).max)
+        first = np.argmin(rank, axis=1)
+        hit = overlap.any(axis=1)
+        result[hit] = index['ids'][first[hit]]
+        return result
 
 
 def calculate_expected_copy_number(regions):
@@ -93,38 +137,72 @@ def calculate_expected_copy_number(regions):
     return expected_copy_number
 
 
-def simulate_sample(bam_path, regions, keep_probs, exp_name):
+def sample_seed(seed, experiment_name, bam_filename):
+    """Seed cố định cho từng (experiment, sample) để kết quả không phụ thuộc thứ tự hay số worker."""
+    return np.random.SeedSequence([seed, zlib.crc32(experiment_name.encode()), zlib.crc32(bam_filename.encode())])
+
+
+def simulate_sample(bam_path, regions, keep_probs, exp_name, seed=0, chunk_size=CHUNK_SIZE):
     """
     Mô phỏng CNV cho một BAM file.
+
+    Reads được đọc theo từng chunk từ fetch(); region của cả chunk được tra bằng RegionIndex
+    và quyết định giữ/bỏ bằng một lần rút ngẫu nhiên NumPy cho cả chunk.
     """
-    # Khởi tạo stats cho tất cả regions
-    stats = defaultdict(lambda: {'original': 0, 'kept': 0})
-    
+    region_index = RegionIndex(regions)
+    max_region = max([0] + [region['region'] for region in regions])
+    keep_table = np.zeros(max_region + 1)
+    for region_id, keep_prob in keep_probs.items():
+        keep_table[region_id] = keep_prob
+
     # Tạo đường dẫn output
     bam_filename = os.path.basename(bam_path)
     out_dir = f'Output/{exp_name}'
     os.makedirs(out_dir, exist_ok=True)
     out_path = os.path.join(out_dir, bam_filename)
-    
+
+    rng = np.random.default_rng(sample_seed(seed, exp_name, bam_filename))
+    original = np.zeros(max_region + 1, dtype=np.int64)
+    kept = np.zeros(max_region + 1, dtype=np.int64)
+
     # Mở BAM input và output
     with pysam.AlignmentFile(bam_path, "rb") as fin:
         with pysam.AlignmentFile(out_path, "wb", header=fin.header) as fout:
+            reference_names = fin.references
+            chunk = []
+
+            def flush(chunk):
+                region_ids = np.zeros(len(chunk), dtype=np.int64)
+                reference_ids = np.array([-1 if read.is_unmapped else read.reference_id for read in chunk], dtype=np.int64)
+                read_starts = np.array([read.reference_start for read in chunk], dtype=np.int64)
+                read_ends = np.array([read.reference_end or read.reference_start + 1 for read in chunk], dtype=np.int64)
+                for reference_id in np.unique(reference_ids):
+                    if reference_id < 0:
+                        continue
+                    selected = reference_ids == reference_id
+                    region_ids[selected] = region_index.lookup(reference_names[reference_id], read_starts[selected], read_ends[selected])
+
+                keep = rng.random(len(chunk)) < keep_table[region_ids]
+                original[:] += np.bincount(region_ids, minlength=max_region + 1)
+                kept[:] += np.bincount(region_ids[keep], minlength=max_region + 1)
+                for i in np.flatnonzero(keep):
+                    fout.write(chunk[i])
+
             for read in fin.fetch(until_eof=True):
-                if read.is_unmapped:
-                    region_id = 0
-                else:
-                    ref_name = fin.get_reference_name(read.reference_id)
-                    region_id = read_overlaps_region(read, regions, ref_name)
-                
-                stats[region_id]['original'] += 1                
-                if random.random() < keep_probs[region_id]:
-                    fout.write(read)
-                    stats[region_id]['kept'] += 1
-    
+                chunk.append(read)
+                if len(chunk) >= chunk_size:
+                    flush(chunk)
+                    chunk = []
+            if chunk:
+                flush(chunk)
+
     # Tạo index cho BAM output
     pysam.index(out_path)
-    
-    return dict(stats)
+
+    return {
+        int(region_id): {'original': int(original[region_id]), 'kept': int(kept[region_id])}
+        for region_id in np.flatnonzero(original)
+    }
 
 
 def calculate_scale_ratios(all_stats):
@@ -182,66 +260,128 @@ def export_tsv(experiment_name, scale_ratios):
             f.write('\t'.join(row) + '\n')
 
 
-def process_experiment(experiment_name, bed_path):
+def prepare_experiment(bed_path):
     """
-    Xử lý một experiment.
+    Đọc BED và tính keep_probability cho k+1 vùng; trả về (regions, keep_probs) hoặc None nếu BED rỗng.
     """
-    # 1. Parse BED file
-    regions = parse_bed_file(bed_path)    
+    regions = parse_bed_file(bed_path)
     if len(regions) == 0:
         print(f"  Cảnh báo: Không tìm thấy regions trong {bed_path}, bỏ qua...")
-        return
-    
-    # 2. Tính keep_probability cho k+1 vùng
+        return None
+
     expected_copy_number = calculate_expected_copy_number(regions)
     denominator = max(expected_copy_number.values())
     keep_probs = {}
     for region_id, copy_number in sorted(expected_copy_number.items()):
         keep_probs[region_id] = copy_number / denominator
-    
-    # 3. Lấy danh sách BAM files
-    bam_files = glob.glob('Input/Original/*.bam')
-    bam_files.sort()
+    return regions, keep_probs
+
+
+def sample_name_of(bam_path):
+    sample_name = os.path.basename(bam_path).replace('.bam', '')
+    if '_' in sample_name:
+        sample_name = sample_name.split('_')[0]
+    return sample_name
+
+
+def export_experiment(experiment_name, bed_path, all_stats):
+    """Xuất metadata của một experiment: bảng scale_ratio và bản sao BED."""
+    scale_ratios = calculate_scale_ratios(all_stats)
+    export_tsv(experiment_name, scale_ratios)
+    output_path = f'Output/Metadata/{experiment_name}.bed'
+    shutil.copy2(bed_path, output_path)
+
+
+def process_experiment(experiment_name, bed_path, seed=0, chunk_size=CHUNK_SIZE):
+    """
+    Xử lý một experiment trong process hiện tại.
+    """
+    prepared = prepare_experiment(bed_path)
+    if prepared is None:
+        return
+    regions, keep_probs = prepared
+
+    bam_files = sorted(glob.glob('Input/Original/*.bam'))
     if len(bam_files) == 0:
         print(f"  Lỗi: Không tìm thấy file BAM nào trong Input/Original/")
         return
-    
-    # 4. Xử lý từng BAM file
+
     all_stats = {}
-    
     for i, bam_path in enumerate(bam_files, 1):
-        bam_filename = os.path.basename(bam_path)
-        sample_name = bam_filename.replace('.bam', '')
-        if '_' in sample_name:
-            sample_name = sample_name.split('_')[0]
-        print(f"\n   Đang xử lý mẫu [{i}/{len(bam_files)}]: {bam_filename}")
-        
-        sample_stats = simulate_sample(bam_path, regions, keep_probs, experiment_name)
-        all_stats[sample_name] = sample_stats
-    
-    # 5. Xuất metadata
-    scale_ratios = calculate_scale_ratios(all_stats)
-    export_tsv(experiment_name, scale_ratios)
-    output_path = f'Output/Metadata/{experiment_name}.bed'
-    shutil.copy2(bed_path, output_path)
-    
+        print(f"\n   Đang xử lý mẫu [{i}/{len(bam_files)}]: {os.path.basename(bam_path)}")
+        all_stats[sample_name_of(bam_path)] = simulate_sample(bam_path, regions, keep_probs, experiment_name, seed, chunk_size)
+
+    export_experiment(experiment_name, bed_path, all_stats)
+
+
+def process_experiments_parallel(bed_files, workers, seed=0, chunk_size=CHUNK_SIZE):
+    """
+    Chạy mọi cặp (experiment, BAM) trên một process pool; mỗi experiment được xuất metadata
+    ngay khi tất cả mẫu của nó xong. Seed theo từng mẫu nên kết quả giống khi chạy tuần tự.
+    """
+    bam_files = sorted(glob.glob('Input/Original/*.bam'))
+    if len(bam_files) == 0:
+        print(f"  Lỗi: Không tìm thấy file BAM nào trong Input/Original/")
+        return
+
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for bed_file in bed_files:
+            experiment_name = os.path.splitext(os.path.basename(bed_file))[0]
+            try:
+                prepared = prepare_experiment(bed_file)
+            except Exception as e:
+                print(f"\nLỗi xử lý experiment '{experiment_name}': {e}")
+                continue
+            if prepared is None:
+                continue
+            regions, keep_probs = prepared
+            pending[experiment_name] = {'bed': bed_file, 'remaining': len(bam_files), 'stats': {}, 'failed': False}
+            for bam_path in bam_files:
+                future = executor.submit(simulate_sample, bam_path, regions, keep_probs, experiment_name, seed, chunk_size)
+                futures[future] = (experiment_name, bam_path)
+
+        for future in as_completed(futures):
+            experiment_name, bam_path = futures[future]
+            experiment = pending[experiment_name]
+            experiment['remaining'] -= 1
+            try:
+                experiment['stats'][sample_name_of(bam_path)] = future.result()
+                print(f"   Xong {experiment_name}: {os.path.basename(bam_path)}")
+            except Exception as e:
+                experiment['failed'] = True
+                print(f"\nLỗi xử lý experiment '{experiment_name}' ({os.path.basename(bam_path)}): {e}")
+            if experiment['remaining'] == 0 and not experiment['failed']:
+                export_experiment(experiment_name, experiment['bed'], experiment['stats'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mô phỏng CNV (G/L mosaic) bằng cách down-sample reads theo vùng BED")
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Số process chạy song song các BAM (1 = tuần tự)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed gốc; mỗi (experiment, sample) có seed riêng suy ra từ seed này')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Số reads xử lý mỗi lần')
+    args = parser.parse_args()
 
-def main():    
     # Đảm bảo cấu trúc thư mục tồn tại
     os.makedirs('Output/Metadata', exist_ok=True)
-    
+
     # Lấy tất cả file BED
-    bed_files = glob.glob('Input/Metadata/*.bed')
+    bed_files = sorted(glob.glob('Input/Metadata/*.bed'))
     if len(bed_files) == 0:
         sys.exit(1)
-    
+
+    if args.workers > 1:
+        process_experiments_parallel(bed_files, args.workers, args.seed, args.chunk_size)
+        return
+
     # Xử lý từng experiment
     for i, bed_file in enumerate(bed_files, 1):
         experiment_name = os.path.splitext(os.path.basename(bed_file))[0]
         print(f"Đang xử lý experiment [{i}/{len(bed_files)}]: {experiment_name}")
-        
+
         try:
-            process_experiment(experiment_name, bed_file)
+            process_experiment(experiment_name, bed_file, args.seed, args.chunk_size)
         except Exception as e:
             print(f"\nLỗi xử lý experiment '{experiment_name}': {e}")
             import traceback
@@ -249,4 +389,4 @@ def main():
             continue
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Mô phỏng CNV trực tiếp trên count theo bin, không ghi lại BAM.
+
+Dùng cùng file BED và cùng Metadata/*.tsv như simulate.py, cho các thuật toán đọc count theo bin:
+- Baseline: {Sample}_rawCount.npz (key '1'..'22', 'X', 'Y'; bin size theo --bin-size).
+- WisecondorX: npz của `WisecondorX convert` (binsize, sample = {'1'..'24': counts}, quality).
+
+Vùng Loss dùng binomial thinning (giữ mỗi read với xác suất CN/2), vùng Gain dùng Poisson
+up-sampling (thêm Poisson(n * (CN/2 - 1)) reads); bin chỉ giao một phần với vùng được áp dụng theo
+tỷ lệ giao. Vùng 0 (bình thường) giữ nguyên nên scale_ratio = kept / original của từng vùng.
+"""
+import os
+import sys
+import glob
+import shutil
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from simulate import (
+    calculate_expected_copy_number,
+    calculate_scale_ratios,
+    export_tsv,
+    parse_bed_file,
+    sample_seed,
+    standardize_chromosomes,
+)
+
+
+def load_counts(npz_path, bin_size):
+    """
+    Đọc count theo bin; trả về (format, bin_size, counts, extra) với counts theo chromosome chuẩn hóa ('1'..'24').
+    """
+    data = np.load(npz_path, allow_pickle=True)
+    if 'sample' in data.files and 'binsize' in data.files:
+        sample = data['sample'].item()
+        counts = {standardize_chromosomes(chrom): np.asarray(values) for chrom, values in sample.items()}
+        extra = {key: data[key] for key in data.files if key not in ('sample', 'binsize')}
+        return 'wisecondorx', int(data['binsize']), counts, extra
+    counts = {standardize_chromosomes(chrom): data[chrom] for chrom in data.files}
+    return 'baseline', bin_size, counts, {}
+
+
+def save_counts(npz_path, fmt, bin_size, counts, extra):
+    """Ghi count theo đúng định dạng đầu vào."""
+    if fmt == 'wisecondorx':
+        np.savez_compressed(npz_path, binsize=bin_size, sample=counts, **extra)
+        return
+    names = {'23': 'X', '24': 'Y'}
+    np.savez_compressed(npz_path, **{names.get(chrom, chrom): values for chrom, values in counts.items()})
+
+
+def region_bins(regions, chrom, num_bins, bin_size):
+    """
+    Region ID và tỷ lệ giao của từng bin trên chrom. Bin giao nhiều region thuộc về region
+    giao nhiều nhất (region đứng trước trong BED nếu bằng nhau).
+    """
+    region_ids = np.zeros(num_bins, dtype=np.int64)
+    fractions = np.zeros(num_bins)
+    for region in regions:
+        if standardize_chromosomes(region['chrom']) != chrom:
+            continue
+        first = max(0, region['start'] // bin_size)
+        last = min(num_bins - 1, (region['end'] - 1) // bin_size)
+        if last < first:
+            continue
+        bins = np.arange(first, last + 1)
+        overlap = np.minimum(region['end'], (bins + 1) * bin_size) - np.maximum(region['start'], bins * bin_size)
+        overlap = overlap / bin_size
+        better = overlap > fractions[bins]
+        region_ids[bins[better]] = region['region']
+        fractions[bins[better]] = overlap[better]
+    return region_ids, fractions
+
+
+def simulate_counts(counts, regions, expected_copy_number, bin_size, rng):
+    """
+    Áp dụng các vùng G/L lên count của một mẫu; trả về (counts mới, stats theo region).
+    """
+    max_region = max(expected_copy_number)
+    original = np.zeros(max_region + 1)
+    kept = np.zeros(max_region + 1)
+    factor_table = np.array([expected_copy_number.get(i, 2.0) / 2.0 for i in range(max_region + 1)])
+
+    simulated = {}
+    for chrom, values in counts.items():
+        n = np.rint(np.asarray(values, dtype=float)).clip(min=0).astype(np.int64)
+        region_ids, fractions = region_bins(regions, chrom, len(n), bin_size)
+        factor = 1.0 + fractions * (factor_table[region_ids] - 1.0)
+
+        out = n.copy()
+        loss = factor < 1.0
+        gain = factor > 1.0
+        out[loss] = rng.binomial(n[loss], factor[loss])
+        out[gain] = n[gain] + rng.poisson(n[gain] * (factor[gain] - 1.0))
+
+        original += np.bincount(region_ids, weights=n, minlength=max_region + 1)
+        kept += np.bincount(region_ids, weights=out, minlength=max_region + 1)
+        simulated[chrom] = out.astype(np.asarray(values).dtype, copy=False)
+
+    stats = {
+        int(region_id): {'original': int(original[region_id]), 'kept': int(kept[region_id])}
+        for region_id in np.flatnonzero(original)
+    }
+    return simulated, stats
+
+
+def sample_name_of(count_path):
+    """Tên mẫu giống simulate.py: bỏ đuôi, lấy phần trước '_' đầu tiên."""
+    sample_name = os.path.basename(count_path).replace('.npz', '').replace('_rawCount', '')
+    return sample_name.split('_')[0]
+
+
+def replicate_path(count_path, replicate):
+    """Tên file của bản sao thứ `replicate`: hậu tố -r{k} gắn vào tên mẫu (trước '_' đầu tiên)."""
+    filename = os.path.basename(count_path)
+    head, sep, tail = filename.partition('_')
+    if not sep:
+        head, tail = filename.replace('.npz', ''), 'npz'
+        return f"{head}-r{replicate}.{tail}"
+    return f"{head}-r{replicate}{sep}{tail}"
+
+
+def simulate_file(count_path, regions, expected_copy_number, exp_name, bin_size, seed=0, replicates=1):
+    """Mô phỏng một file count (và các bản sao); trả về {sample_name: stats}."""
+    fmt, bin_size, counts, extra = load_counts(count_path, bin_size)
+    out_dir = f'Output/{exp_name}'
+    os.makedirs(out_dir, exist_ok=True)
+
+    all_stats = {}
+    for replicate in range(replicates):
+        filename = os.path.basename(count_path) if replicates == 1 else replicate_path(count_path, replicate + 1)
+        rng = np.random.default_rng(sample_seed(seed, exp_name, filename))
+        simulated, stats = simulate_counts(counts, regions, expected_copy_number, bin_size, rng)
+        save_counts(os.path.join(out_dir, filename), fmt, bin_size, simulated, extra)
+        all_stats[sample_name_of(filename)] = stats
+    return all_stats
+
+
+def process_experiment(experiment_name, bed_path, count_files, bin_size, seed=0, replicates=1, executor=None):
+    """
+    Xử lý một experiment: mô phỏng mọi file count rồi xuất Metadata/{experiment}.tsv và .bed.
+    """
+    regions = parse_bed_file(bed_path)
+    if len(regions) == 0:
+        print(f"  Cảnh báo: Không tìm thấy regions trong {bed_path}, bỏ qua...")
+        return
+    expected_copy_number = calculate_expected_copy_number(regions)
+
+    all_stats = {}
+    if executor is None:
+        for count_path in count_files:
+            all_stats.update(simulate_file(count_path, regions, expected_copy_number, experiment_name, bin_size, seed, replicates))
+    else:
+        futures = [
+            executor.submit(simulate_file, count_path, regions, expected_copy_number, experiment_name, bin_size, seed, replicates)
+            for count_path in count_files
+        ]
+        for future in as_completed(futures):
+            all_stats.update(future.result())
+
+    scale_ratios = calculate_scale_ratios(all_stats)
+    export_tsv(experiment_name, scale_ratios)
+    shutil.copy2(bed_path, f'Output/Metadata/{experiment_name}.bed')
+    print(f"   {experiment_name}: {len(all_stats)} mẫu")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mô phỏng CNV (G/L mosaic) trực tiếp trên count theo bin")
+    parser.add_argument('-i', '--input-dir', default='Input/Counts', help='Thư mục chứa *_rawCount.npz (Baseline) hoặc npz của WisecondorX convert')
+    parser.add_argument('--bin-size', type=int, default=400000, help='Bin size của *_rawCount.npz (npz WisecondorX tự mang binsize)')
+    parser.add_argument('-r', '--replicates', type=int, default=1, help='Số bản mô phỏng độc lập cho mỗi mẫu')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='Số process chạy song song (1 = tuần tự)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed gốc; mỗi (experiment, mẫu, bản sao) có seed riêng')
+    args = parser.parse_args()
+
+    os.makedirs('Output/Metadata', exist_ok=True)
+
+    bed_files = sorted(glob.glob('Input/Metadata/*.bed'))
+    count_files = sorted(glob.glob(os.path.join(args.input_dir, '*.npz')))
+    if len(bed_files) == 0 or len(count_files) == 0:
+        print(f"Lỗi: cần file BED trong Input/Metadata/ và file count trong {args.input_dir}/")
+        sys.exit(1)
+
+    executor = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    try:
+        for i, bed_file in enumerate(bed_files, 1):
+            experiment_name = os.path.splitext(os.path.basename(bed_file))[0]
+            print(f"Đang xử lý experiment [{i}/{len(bed_files)}]: {experiment_name}")
+            try:
+                process_experiment(experiment_name, bed_file, count_files, args.bin_size, args.seed, max(1, args.replicates), executor)
+            except Exception as e:
+                print(f"\nLỗi xử lý experiment '{experiment_name}': {e}")
+                import traceback
+                traceback.print_exc()
+                continue
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()